@@ -0,0 +1,319 @@
+"""Command benchmark.
+
+Runs the CLI commands against the mock of the Notelist API (see the "mockapi"
+module) with a notebook of 1000, 10000 and 100000 notes, and measures the
+end-to-end time of each command (start-up included) and the throughput
+(notes per second) of the bulk commands (import, export, sync and bulk
+changes). Each command runs in a new process with a temporary home directory,
+so the settings, the cache and the mirror of the benchmark don't affect the
+ones of the user.
+
+The commands that are measured several times are run once before, as a
+warm-up (e.g. to compile the modules), and the median time of the runs is
+kept.
+
+The results are compared with the baseline results of the "baseline.json"
+file. A command is a regression if its time is over the baseline time by more
+than the tolerance and by more than a noise floor, as the times of the fast
+commands vary by some milliseconds between runs.
+
+Usage (from the repository root):
+
+    python benchmarks/bench.py [--sizes N,N...] [--runs N] [--latency SECONDS]
+        [--tolerance PERCENT] [--save] [--baseline FILE]
+
+With "--save", the results are written to the baseline file instead of being
+compared. The exit status is 1 if there is any regression.
+"""
+
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+from os.path import abspath, dirname, exists, join
+from statistics import median
+from threading import Thread
+from typing import Optional
+
+from mockapi import create_server
+
+
+# Directories
+bench_dir = dirname(abspath(__file__))
+src_dir = join(dirname(bench_dir), "src")
+
+# Default values
+def_baseline = join(bench_dir, "baseline.json")
+def_sizes = "1000,10000,100000"
+def_runs = 5
+def_tolerance = 25.0
+
+# Minimum time increase (seconds) of a regression
+noise_floor = 0.05
+
+# Commands measured several times (the median time is kept). "{nid}" is the
+# notebook with the notes and "{id}" is one of its notes.
+commands = [
+    ("help", ["--help"]),
+    ("user get", ["user", "get"]),
+    ("notebook ls", ["notebook", "ls"]),
+    ("notebook get", ["notebook", "get", "--id", "{nid}"]),
+    ("note ls", ["note", "ls", "--nid", "{nid}"]),
+    ("note ls json", ["--format", "json", "note", "ls", "--nid", "{nid}"]),
+    ("note get", ["note", "get", "--id", "{id}"]),
+    ("search", ["search", "--s", "note 1"])
+]
+
+# Commands measured after synchronizing the mirror
+local_commands = [
+    ("note ls local", ["note", "ls", "--nid", "{nid}", "--local"]),
+    ("search local", ["search", "--s", "note 1", "--local"])
+]
+
+
+class Bench:
+    """CLI runner with a temporary home directory and a mock API."""
+
+    def __init__(self, size: int, latency: float):
+        """Initialize the instance.
+
+        :param size: Number of notes of the notebook.
+        :param latency: Delay (seconds) of the API before each request.
+        """
+        self.size = size
+        self.tmp = tempfile.TemporaryDirectory(prefix="notelist_bench_")
+        self.env = dict(os.environ, HOME=self.tmp.name, PYTHONPATH=src_dir)
+
+        self.server = create_server(0, 1, size, latency)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+
+        store = self.server.RequestHandlerClass.store
+        self.nid = next(iter(store.notebooks))
+        self.id = next(iter(store.notes[self.nid]), None)
+
+        # Empty notebook to import the notes to
+        uid = next(iter(store.users))
+        self.import_nid = store.add_notebook(uid, {"name": "Import"})
+
+        url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.run(["config", "--apiurl", url])
+        self.run([
+            "auth", "login", "--username", "admin", "--password", "admin"
+        ])
+
+    def close(self):
+        """Stop the API and delete the home directory."""
+        self.server.shutdown()
+        self.server.server_close()
+        self.tmp.cleanup()
+
+    def path(self, name: str) -> str:
+        """Get the path of a file of the home directory.
+
+        :param name: File name.
+        :returns: Path.
+        """
+        return join(self.tmp.name, name)
+
+    def run(self, args: list[str]) -> float:
+        """Run a CLI command.
+
+        :param args: Command arguments. "{nid}" and "{id}" are replaced by the
+        notebook ID and the note ID.
+        :returns: Time (seconds).
+        """
+        args = [a.format(nid=self.nid, id=self.id) for a in args]
+        cmd = [sys.executable, "-m", "notelist_cli"] + args
+
+        t = time.perf_counter()
+
+        p = subprocess.run(
+            cmd, env=self.env, stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE, text=True
+        )
+
+        t = time.perf_counter() - t
+
+        if p.returncode != 0:
+            raise Exception(f"Command failed: {' '.join(args)}\n{p.stderr}")
+
+        return t
+
+    def write_import_file(self) -> str:
+        """Write a JSONL file with notes to import.
+
+        :returns: File path.
+        """
+        path = self.path("import.jsonl")
+
+        with open(path, "w", encoding="utf-8") as f:
+            for i in range(self.size):
+                n = {
+                    "notebook_id": self.import_nid, "title": f"Imported {i}",
+                    "body": f"Imported body {i} " * 20, "tags": [f"t{i % 3}"]
+                }
+
+                f.write(json.dumps(n) + "\n")
+
+        return path
+
+
+def result(seconds: float, notes: Optional[int] = None) -> dict:
+    """Make the result of a command.
+
+    :param seconds: Time.
+    :param notes: Number of notes processed by the command.
+    :returns: Result.
+    """
+    r = {"seconds": round(seconds, 4)}
+
+    if notes is not None:
+        r["notes_per_second"] = round(notes / seconds, 1)
+
+    return r
+
+
+def run_size(size: int, runs: int, latency: float) -> dict[str, dict]:
+    """Run the benchmark for a number of notes.
+
+    :param size: Number of notes.
+    :param runs: Number of runs of the repeated commands.
+    :param latency: Delay (seconds) of the API before each request.
+    :returns: Result of each command.
+    """
+    b = Bench(size, latency)
+    res = {}
+
+    def report(name: str, r: dict):
+        res[name] = r
+        tp = r.get("notes_per_second")
+        tp = f"{tp:12.1f} notes/s" if tp is not None else ""
+        print(f"{size:>7} {name:20} {r['seconds']:10.3f} s{tp}")
+
+    def repeat(cases: list[tuple[str, list[str]]]):
+        for name, args in cases:
+            b.run(args)
+            report(name, result(median(b.run(args) for _ in range(runs))))
+
+    try:
+        repeat(commands)
+
+        path = b.write_import_file()
+        t = b.run(["note", "import", "--file", path])
+        report("note import", result(t, size))
+
+        path = b.path("export.jsonl")
+        t = b.run(["notebook", "export", "--id", "{nid}", "--output", path])
+        report("notebook export", result(t, size))
+
+        # The import notebook has the imported notes too
+        report("sync full", result(b.run(["sync", "--full"]), size * 2))
+        report("sync", result(b.run(["sync"])))
+        repeat(local_commands)
+
+        bulk = ["--nid", b.import_nid, "--yes"]
+        t = b.run(["note", "bulk", "archive"] + bulk)
+        report("note bulk archive", result(t, size))
+
+        t = b.run(["note", "bulk", "delete"] + bulk)
+        report("note bulk delete", result(t, size))
+    finally:
+        b.close()
+
+    return res
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    """Compare some results with the baseline results.
+
+    :param results: Results.
+    :param baseline: Baseline results.
+    :param tolerance: Maximum time increase (percentage).
+    :returns: Number of regressions.
+    """
+    regressions = 0
+    print()
+
+    for size, cases in results.items():
+        base = baseline.get(size, {})
+
+        for name, r in cases.items():
+            if name not in base:
+                continue
+
+            b = base[name]["seconds"]
+            change = (r["seconds"] - b) / b * 100
+            status = "OK"
+
+            if change > tolerance and r["seconds"] - b > noise_floor:
+                status = "FAIL"
+                regressions += 1
+
+            print(
+                f"{status:4} {size:>7} {name:20} {b:10.3f} s -> "
+                f"{r['seconds']:10.3f} s ({change:+.1f}%)"
+            )
+
+    print(f"Tolerance: {tolerance:.1f}% (noise floor {noise_floor:.3f} s)")
+    return regressions
+
+
+def main() -> int:
+    """Run the benchmark.
+
+    :returns: Exit status.
+    """
+    parser = ArgumentParser(description="CLI command benchmark.")
+    parser.add_argument("--sizes", default=def_sizes)
+    parser.add_argument("--runs", type=int, default=def_runs)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tolerance", type=float, default=def_tolerance)
+    parser.add_argument("--save", action="store_true")
+    parser.add_argument("--baseline", default=def_baseline)
+    a = parser.parse_args()
+
+    sizes = [int(s) for s in a.sizes.split(",")]
+    results = {str(s): run_size(s, a.runs, a.latency) for s in sizes}
+
+    data = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": a.runs,
+        "latency": a.latency,
+        "results": results
+    }
+
+    if a.save:
+        if exists(a.baseline):
+            # Keep the baseline results of the sizes that weren't run
+            with open(a.baseline, "r", encoding="utf-8") as f:
+                old = json.load(f)["results"]
+
+            data["results"] = dict(old, **results)
+
+        with open(a.baseline, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+            f.write("\n")
+
+        print(f"Baseline saved to {a.baseline}")
+        return 0
+
+    if not exists(a.baseline):
+        print(f"Baseline file not found: {a.baseline}")
+        return 0
+
+    with open(a.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+
+    if baseline.get("latency") != a.latency:
+        print("Warning: the baseline was measured with a different latency.")
+
+    return 1 if compare(results, baseline["results"], a.tolerance) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
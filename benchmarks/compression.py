@@ -0,0 +1,180 @@
+"""Compression benchmark.
+
+Runs the bulk commands against the mock of the Notelist API (see the "mockapi"
+module) with and without compression and shows the bytes sent and received
+and the time of each command. The notes have bodies of natural text of a
+given size, so they compress like real notes.
+
+The modes are "none" (no compressed requests and no compressed responses),
+"responses" (only compressed responses, the default configuration), "gzip"
+and "deflate" (compressed requests and responses). The bytes are the bytes of
+the request and response bodies, as received and sent by the API, without the
+headers.
+
+Usage (from the repository root):
+
+    python benchmarks/compression.py [--notes N] [--bodysize BYTES]
+        [--latency SECONDS]
+"""
+
+import json
+import random
+import sys
+from argparse import ArgumentParser
+
+from bench import Bench
+
+
+# Default values
+def_notes = 2000
+def_body_size = 4096
+
+# Settings ("config" command options) of each mode
+modes = {
+    "none": ["--compress", "none", "--acceptencoding", "false"],
+    "responses": ["--compress", "none", "--acceptencoding", "true"],
+    "gzip": ["--compress", "gzip", "--acceptencoding", "true"],
+    "deflate": ["--compress", "deflate", "--acceptencoding", "true"]
+}
+
+# Words of the note bodies
+words = (
+    "the of and to in is that for it as was with be by on not he this are or "
+    "his from at which but have an they you were her she there been one all "
+    "would their we him more when will if no out so said what up its about "
+    "into than them can only other new some could time these two may then do "
+    "first any my now such like our over man me even most made after also "
+    "notebook note meeting project list idea review draft task plan budget"
+).split()
+
+
+def get_body(size: int, rnd: random.Random) -> str:
+    """Get a note body of natural text.
+
+    :param size: Body size (characters).
+    :param rnd: Random number generator.
+    :returns: Body.
+    """
+    text = []
+    n = 0
+
+    while n < size:
+        w = rnd.choice(words)
+        text.append(w)
+        n += len(w) + 1
+
+    return " ".join(text)[:size]
+
+
+def write_import_file(b: Bench, notes: int, body_size: int) -> str:
+    """Write a JSONL file with notes to import.
+
+    The bodies are the same in all the modes.
+
+    :param b: Benchmark runner.
+    :param notes: Number of notes.
+    :param body_size: Body size of each note.
+    :returns: File path.
+    """
+    rnd = random.Random(0)
+    path = b.path("import.jsonl")
+
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(notes):
+            n = {
+                "notebook_id": b.import_nid, "title": f"Note {i}",
+                "body": get_body(body_size, rnd), "tags": [f"t{i % 3}"]
+            }
+
+            f.write(json.dumps(n) + "\n")
+
+    return path
+
+
+def measure(b: Bench, args: list[str]) -> tuple[float, int, int]:
+    """Run a command and get the bytes sent and received.
+
+    :param b: Benchmark runner.
+    :param args: Command arguments.
+    :returns: Tuple containing the time (seconds), the bytes sent and the
+    bytes received.
+    """
+    store = b.server.RequestHandlerClass.store
+
+    with store.lock:
+        store.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+
+    t = b.run(args)
+
+    with store.lock:
+        return t, store.stats["bytes_in"], store.stats["bytes_out"]
+
+
+def run_mode(
+    mode: str, notes: int, body_size: int, latency: float
+) -> dict[str, tuple[float, int, int]]:
+    """Run the commands in a mode.
+
+    :param mode: Mode.
+    :param notes: Number of notes to import.
+    :param body_size: Body size of each note.
+    :param latency: Delay (seconds) of the API before each request.
+    :returns: Time, bytes sent and bytes received of each command.
+    """
+    b = Bench(0, latency)
+    res = {}
+
+    try:
+        b.run(["config"] + modes[mode])
+        path = write_import_file(b, notes, body_size)
+        out = b.path("export.jsonl")
+        nid = b.import_nid
+
+        res["note import"] = measure(b, ["note", "import", "--file", path])
+
+        res["notebook export"] = measure(
+            b, ["notebook", "export", "--id", nid, "--output", out]
+        )
+
+        res["note ls"] = measure(b, ["note", "ls", "--nid", nid])
+        res["sync full"] = measure(b, ["sync", "--full"])
+    finally:
+        b.close()
+
+    return res
+
+
+def main() -> int:
+    """Run the benchmark.
+
+    :returns: Exit status.
+    """
+    parser = ArgumentParser(description="Compression benchmark.")
+    parser.add_argument("--notes", type=int, default=def_notes)
+    parser.add_argument("--bodysize", type=int, default=def_body_size)
+    parser.add_argument("--latency", type=float, default=0.0)
+    a = parser.parse_args()
+
+    results = {m: run_mode(m, a.notes, a.bodysize, a.latency) for m in modes}
+    base = results["none"]
+
+    print(
+        f"{'Mode':10} {'Command':16} {'Time':>9} {'Sent':>11} "
+        f"{'Received':>11} {'Saved':>7}"
+    )
+
+    for m, res in results.items():
+        for cmd, (t, sent, received) in res.items():
+            total = base[cmd][1] + base[cmd][2]
+            saved = (1 - (sent + received) / total) * 100
+
+            print(
+                f"{m:10} {cmd:16} {t:8.2f}s {sent / 1024:8.1f} KB "
+                f"{received / 1024:8.1f} KB {saved:6.1f}%"
+            )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Start-up time benchmark.
+
+Runs some CLI commands with "python -X importtime" and checks that the import
+time of the "notelist_cli" package, its "client" module (imported on every
+start to forward the command to the agent) and its "app" module (the main
+group of the commands) is within a budget and that the commands that don't
+make requests don't import the heavy dependencies.
+
+Usage (from the repository root):
+
+    python benchmarks/importtime.py [--runs N] [--budget MS]
+
+The exit status is 1 if any check fails.
+"""
+
+import os
+import subprocess
+import sys
+from argparse import ArgumentParser
+from os.path import abspath, dirname, join
+from statistics import median
+
+
+# Source directory
+src_dir = join(dirname(dirname(abspath(__file__))), "src")
+
+# Commands to check and modules that they must not import
+cases = [
+    (["--help"], ["requests", "urllib3", "notelist_cli.auth"]),
+    (["config", "--help"], ["requests", "urllib3", "notelist_cli.auth"])
+]
+
+# Modules whose import time is checked
+modules = ["notelist_cli", "notelist_cli.client", "notelist_cli.app"]
+
+# Default import time budget of the modules (milliseconds)
+def_budget = 60.0
+
+# Default number of runs of each command
+def_runs = 5
+
+
+def run_command(args: list[str]) -> dict[str, int]:
+    """Run a CLI command with "-X importtime".
+
+    :param args: Command arguments.
+    :returns: Cumulative import time (microseconds) of each imported module.
+    """
+    env = dict(os.environ, PYTHONPATH=src_dir)
+    cmd = [sys.executable, "-X", "importtime", "-m", "notelist_cli"] + args
+    p = subprocess.run(cmd, env=env, capture_output=True, text=True)
+
+    if p.returncode != 0:
+        raise Exception(f"Command failed: {' '.join(args)}\n{p.stderr}")
+
+    times = {}
+
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+
+        _, cum, mod = line[12:].split("|")
+        times[mod.strip()] = int(cum)
+
+    return times
+
+
+def main() -> int:
+    """Run the benchmark.
+
+    :returns: Exit status.
+    """
+    parser = ArgumentParser(description="CLI start-up time benchmark.")
+    parser.add_argument("--runs", type=int, default=def_runs)
+    parser.add_argument("--budget", type=float, default=def_budget)
+    a = parser.parse_args()
+
+    ok = True
+
+    for args, forbidden in cases:
+        runs = [run_command(args) for _ in range(a.runs)]
+        ms = median(sum(r.get(m, 0) for m in modules) for r in runs) / 1000
+        imported = [m for m in forbidden if m in runs[0]]
+
+        status = "OK"
+
+        if ms > a.budget or len(imported) > 0:
+            status = "FAIL"
+            ok = False
+
+        cmd = " ".join(args)
+        print(f"{status:4} notelist-cli {cmd:20} {ms:8.1f} ms", end="")
+
+        if len(imported) > 0:
+            print(f"  (imports {', '.join(imported)})", end="")
+
+        print()
+
+    print(f"Budget: {a.budget:.1f} ms")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
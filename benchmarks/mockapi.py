@@ -0,0 +1,642 @@
+"""Mock of the Notelist API.
+
+In-memory implementation of the Notelist API 0.7.0 endpoints used by the CLI
+(authentication, users, notebooks, notes and search), for benchmarks and
+manual tests. The access tokens are unsigned JWT tokens with an expiration
+time. The API can simulate network latency and a limited capacity (requests
+over the capacity get a 503 response). Like the CLI, it supports compressed
+(gzip or deflate) and chunked request data, and it compresses the large
+responses with gzip.
+
+Usage:
+
+    python benchmarks/mockapi.py [--port PORT] [--notebooks N] [--notes N]
+        [--latency SECONDS] [--ttl SECONDS] [--capacity N]
+
+The user is "admin" and the password is "admin". The "/_stats" endpoint
+returns the number of requests received by endpoint and the number of bytes
+received and sent.
+"""
+
+import base64
+import gzip
+import json
+import time
+import uuid
+import zlib
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import RLock
+from typing import Any, Optional
+from urllib.parse import unquote
+
+
+# Default values
+def_port = 5055
+def_notebooks = 3
+def_notes = 10
+def_ttl = 900
+
+# Minimum response size (bytes) to compress the response with gzip
+min_gzip_size = 1024
+
+
+def now() -> str:
+    """Get the current date-time in the API format.
+
+    :returns: Date-time.
+    """
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def b64(data: dict) -> str:
+    """Encode a dictionary as URL-safe Base64 JSON without padding.
+
+    :param data: Data.
+    :returns: Encoded data.
+    """
+    d = json.dumps(data).encode()
+    return base64.urlsafe_b64encode(d).rstrip(b"=").decode()
+
+
+def without(record: dict, *keys: str) -> dict:
+    """Get a copy of a record without some keys.
+
+    :param record: Record.
+    :param keys: Keys.
+    :returns: Record copy.
+    """
+    return {k: v for k, v in record.items() if k not in keys}
+
+
+class Store:
+    """In-memory data of the API."""
+
+    def __init__(self, notebooks: int, notes: int, ttl: int):
+        """Initialize the instance.
+
+        :param notebooks: Number of notebooks to create.
+        :param notes: Number of notes to create in each notebook.
+        :param ttl: Access token expiration time in seconds.
+        """
+        self.lock = RLock()
+        self.ttl = ttl
+        self.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0}
+        self.users = {}
+        self.notebooks = {}
+
+        # Notes by notebook ID and note ID
+        self.notes = {}
+
+        # Notebook ID of each note
+        self.note_nb = {}
+
+        uid = uuid.uuid4().hex
+        t = now()
+
+        self.users[uid] = {
+            "id": uid, "username": "admin", "password": "admin",
+            "admin": True, "enabled": True, "name": "Admin",
+            "email": "admin@example.com", "created": t, "last_modified": t
+        }
+
+        for i in range(notebooks):
+            nid = self.add_notebook(uid, {
+                "name": f"Notebook {i}", "tag_colors": {"t1": "red"}
+            })
+
+            for j in range(notes):
+                self.add_note({
+                    "notebook_id": nid, "archived": j % 5 == 0,
+                    "title": f"Note {j} of notebook {i}",
+                    "body": f"Body {j} " * 20,
+                    "tags": [f"t{j % 3}"] if j % 4 else []
+                })
+
+    def token(self, uid: str, kind: str) -> str:
+        """Create a token.
+
+        :param uid: User ID.
+        :param kind: Token kind ("access" or "refresh").
+        :returns: Token.
+        """
+        ttl = self.ttl if kind == "access" else 86400
+        header = b64({"alg": "none", "typ": "JWT"})
+        claims = b64({"sub": uid, "type": kind, "exp": int(time.time()) + ttl})
+
+        return f"{header}.{claims}.sig"
+
+    def add_notebook(self, uid: str, data: dict) -> str:
+        """Create a notebook.
+
+        :param uid: User ID.
+        :param data: Notebook data.
+        :returns: Notebook ID.
+        """
+        i = uuid.uuid4().hex
+        t = now()
+
+        self.notebooks[i] = dict(
+            data, id=i, user_id=uid, created=t, last_modified=t
+        )
+
+        self.notes[i] = {}
+        return i
+
+    def add_note(self, data: dict) -> str:
+        """Create a note.
+
+        :param data: Note data.
+        :returns: Note ID.
+        """
+        i = uuid.uuid4().hex
+        t = now()
+        n = {"archived": False, "tags": []}
+        n.update(data, id=i, created=t, last_modified=t)
+
+        self.notes[n["notebook_id"]][i] = n
+        self.note_nb[i] = n["notebook_id"]
+
+        return i
+
+    def get_note(self, _id: str) -> Optional[dict]:
+        """Get a note.
+
+        :param _id: Note ID.
+        :returns: Note or `None` if it isn't found.
+        """
+        nid = self.note_nb.get(_id)
+        return None if nid is None else self.notes[nid][_id]
+
+    def delete_note(self, _id: str):
+        """Delete a note.
+
+        :param _id: Note ID.
+        """
+        nid = self.note_nb.pop(_id)
+        del self.notes[nid][_id]
+
+
+class Handler(BaseHTTPRequestHandler):
+    """Request handler."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    store: Store = None
+    latency = 0.0
+    capacity = 0
+    active = 0
+
+    def log_message(self, *args):
+        """Don't log the requests."""
+        pass
+
+    def count(self, key: str, value: int = 1):
+        """Increase a statistic.
+
+        :param key: Statistic key.
+        :param value: Value to add.
+        """
+        with self.store.lock:
+            self.store.stats[key] = self.store.stats.get(key, 0) + value
+
+    def send(
+        self, code: int, message: str, message_type: str = "ok",
+        result: Any = None
+    ):
+        """Send a response.
+
+        The response is compressed with gzip if it's large enough and the
+        client accepts it.
+
+        :param code: Status code.
+        :param message: Message.
+        :param message_type: Message type.
+        :param result: Result.
+        """
+        d = {"message": message, "message_type": message_type}
+
+        if result is not None:
+            d["result"] = result
+
+        body = json.dumps(d).encode()
+        gz = "gzip" in self.headers.get("Accept-Encoding", "")
+
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+
+        if gz and len(body) > min_gzip_size:
+            body = gzip.compress(body, 1)
+            self.send_header("Content-Encoding", "gzip")
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        self.count("bytes_out", len(body))
+
+    def read_body(self) -> dict:
+        """Read the request data.
+
+        The data can be sent with chunked transfer encoding and compressed
+        with gzip or deflate.
+
+        :returns: Request data.
+        """
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            raw = b""
+
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+
+                if size == 0:
+                    self.rfile.readline()
+                    break
+
+                raw += self.rfile.read(size)
+                self.rfile.readline()
+        else:
+            n = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(n) if n > 0 else b""
+
+        self.count("bytes_in", len(raw))
+        enc = self.headers.get("Content-Encoding")
+
+        if enc == "gzip":
+            raw = gzip.decompress(raw)
+        elif enc == "deflate":
+            raw = zlib.decompress(raw)
+
+        return json.loads(raw) if raw else {}
+
+    def authenticate(self, refresh: bool = False) -> Optional[str]:
+        """Check the token of the request.
+
+        An error response is sent if the token is invalid.
+
+        :param refresh: Whether the token must be a refresh token or not.
+        :returns: User ID or `None` if the token is invalid.
+        """
+        h = self.headers.get("Authorization", "")
+
+        if not h.startswith("Bearer "):
+            self.send(401, "Missing token", "error_missing_token")
+            return None
+
+        try:
+            p = h[7:].split(".")[1]
+            p += "=" * (-len(p) % 4)
+            c = json.loads(base64.urlsafe_b64decode(p))
+        except (IndexError, ValueError):
+            self.send(401, "Invalid token", "error_invalid_token")
+            return None
+
+        if (c["type"] == "refresh") != refresh:
+            self.send(401, "Invalid token", "error_invalid_token")
+            return None
+
+        if c["exp"] < time.time():
+            self.send(401, "Expired token", "error_expired_token")
+            return None
+
+        return c["sub"]
+
+    def handle_method(self, method: str):
+        """Handle a request.
+
+        :param method: Request method.
+        """
+        over = False
+
+        with self.store.lock:
+            Handler.active += 1
+            over = self.capacity > 0 and Handler.active > self.capacity
+
+        try:
+            parts = [unquote(p) for p in self.path.strip("/").split("/")]
+            data = self.read_body() if method in ("POST", "PUT") else {}
+
+            self.count("requests")
+            self.count("/".join(parts[:2]))
+
+            if over:
+                self.count("overloaded")
+                return self.send(503, "Service unavailable", "error")
+
+            if self.latency > 0:
+                time.sleep(self.latency)
+
+            with self.store.lock:
+                self.route(method, parts, data)
+        finally:
+            with self.store.lock:
+                Handler.active -= 1
+
+    def route(self, method: str, parts: list[str], data: dict):
+        """Run the endpoint of a request.
+
+        :param method: Request method.
+        :param parts: URL path parts.
+        :param data: Request data.
+        """
+        s = self.store
+
+        if parts == ["_stats"]:
+            return self.send(200, "Stats", "ok", dict(s.stats))
+
+        if parts == ["auth", "login"]:
+            for u in s.users.values():
+                if (
+                    u["username"] == data.get("username") and
+                    u["password"] == data.get("password")
+                ):
+                    return self.send(200, "User logged in", "ok", {
+                        "user_id": u["id"],
+                        "access_token": s.token(u["id"], "access"),
+                        "refresh_token": s.token(u["id"], "refresh")
+                    })
+
+            return self.send(401, "Invalid credentials", "error_invalid")
+
+        if parts == ["auth", "refresh"]:
+            uid = self.authenticate(True)
+
+            if uid is not None:
+                self.send(
+                    200, "Token refreshed", "ok",
+                    {"access_token": s.token(uid, "access")}
+                )
+
+            return
+
+        uid = self.authenticate()
+
+        if uid is None:
+            return
+
+        if parts == ["auth", "logout"]:
+            return self.send(200, "User logged out")
+
+        if parts[0] == "users":
+            return self.route_users(method, parts, data)
+
+        if parts[0] == "notebooks":
+            return self.route_notebooks(method, parts, data, uid)
+
+        if parts[0] == "notes":
+            return self.route_notes(method, parts, data)
+
+        if parts[0] == "search" and len(parts) == 2:
+            q = parts[1].lower()
+
+            notebooks = [
+                without(n, "user_id") for n in s.notebooks.values()
+                if n["user_id"] == uid and q in n["name"].lower()
+            ]
+
+            notes = [
+                without(n, "body") for nb in s.notes.values()
+                for n in nb.values()
+                if q in (n.get("title") or "").lower() or
+                q in (n.get("body") or "").lower() or
+                any(q in t.lower() for t in n["tags"])
+            ]
+
+            return self.send(
+                200, "Search", "ok", {"notebooks": notebooks, "notes": notes}
+            )
+
+        self.send(404, "Not found", "error_not_found")
+
+    def route_users(self, method: str, parts: list[str], data: dict):
+        """Run a user endpoint.
+
+        :param method: Request method.
+        :param parts: URL path parts.
+        :param data: Request data.
+        """
+        s = self.store
+
+        if parts == ["users", "users"]:
+            users = [without(u, "password") for u in s.users.values()]
+            return self.send(200, "Users retrieved", "ok", users)
+
+        if parts[1] != "user":
+            return self.send(404, "Not found", "error_not_found")
+
+        if method == "POST":
+            i = uuid.uuid4().hex
+            t = now()
+            s.users[i] = dict(data, id=i, created=t, last_modified=t)
+
+            return self.send(201, "User created", "ok", {"id": i})
+
+        u = s.users.get(parts[2]) if len(parts) > 2 else None
+
+        if u is None:
+            return self.send(404, "User not found", "error_not_found")
+
+        if method == "GET":
+            return self.send(
+                200, "User retrieved", "ok", without(u, "password")
+            )
+
+        if method == "PUT":
+            u.update(data, last_modified=now())
+            return self.send(200, "User updated")
+
+        del s.users[u["id"]]
+        self.send(200, "User deleted")
+
+    def route_notebooks(
+        self, method: str, parts: list[str], data: dict, uid: str
+    ):
+        """Run a notebook endpoint.
+
+        :param method: Request method.
+        :param parts: URL path parts.
+        :param data: Request data.
+        :param uid: User ID.
+        """
+        s = self.store
+
+        if parts == ["notebooks", "notebooks"]:
+            notebooks = [
+                without(n, "user_id") for n in s.notebooks.values()
+                if n["user_id"] == uid
+            ]
+
+            return self.send(200, "Notebooks retrieved", "ok", notebooks)
+
+        if parts[1] != "notebook":
+            return self.send(404, "Not found", "error_not_found")
+
+        if method == "POST":
+            i = s.add_notebook(uid, data)
+            return self.send(201, "Notebook created", "ok", {"id": i})
+
+        n = s.notebooks.get(parts[2]) if len(parts) > 2 else None
+
+        if n is None:
+            return self.send(404, "Notebook not found", "error_not_found")
+
+        if method == "GET":
+            return self.send(
+                200, "Notebook retrieved", "ok", without(n, "user_id")
+            )
+
+        if method == "PUT":
+            n.pop("tag_colors", None)
+            n.update(data, last_modified=now())
+
+            return self.send(200, "Notebook updated")
+
+        for i in s.notes.pop(n["id"]):
+            del s.note_nb[i]
+
+        del s.notebooks[n["id"]]
+        self.send(200, "Notebook deleted")
+
+    def route_notes(self, method: str, parts: list[str], data: dict):
+        """Run a note endpoint.
+
+        :param method: Request method.
+        :param parts: URL path parts.
+        :param data: Request data.
+        """
+        s = self.store
+
+        if parts[1] == "notes" and len(parts) == 3:
+            notes = s.notes.get(parts[2])
+
+            if notes is None:
+                return self.send(404, "Notebook not found", "error_not_found")
+
+            res = list(notes.values())
+
+            if "archived" in data:
+                res = [n for n in res if n["archived"] == data["archived"]]
+
+            if "tags" in data:
+                t = set(data["tags"])
+
+                res = [
+                    n for n in res
+                    if t.intersection(n["tags"]) or
+                    (data.get("no_tags") and len(n["tags"]) == 0)
+                ]
+
+            k = "last_modified" if data.get("last_mod") else "created"
+            res.sort(key=lambda n: n[k], reverse=not data.get("asc"))
+            res = [without(n, "body") for n in res]
+
+            return self.send(200, "Notes retrieved", "ok", res)
+
+        if parts[1] != "note":
+            return self.send(404, "Not found", "error_not_found")
+
+        if method == "POST":
+            if data.get("notebook_id") not in s.notes:
+                return self.send(404, "Notebook not found", "error_not_found")
+
+            i = s.add_note(data)
+            return self.send(201, "Note created", "ok", {"id": i})
+
+        n = s.get_note(parts[2]) if len(parts) > 2 else None
+
+        if n is None:
+            return self.send(404, "Note not found", "error_not_found")
+
+        if method == "GET":
+            return self.send(200, "Note retrieved", "ok", n)
+
+        if method == "PUT":
+            nid = data.get("notebook_id", n["notebook_id"])
+
+            if nid not in s.notes:
+                return self.send(404, "Notebook not found", "error_not_found")
+
+            s.delete_note(n["id"])
+
+            for k in ("title", "body"):
+                n.pop(k, None)
+
+            n.update(data, last_modified=now())
+            s.notes[nid][n["id"]] = n
+            s.note_nb[n["id"]] = nid
+
+            return self.send(200, "Note updated")
+
+        s.delete_note(n["id"])
+        self.send(200, "Note deleted")
+
+    def do_GET(self):
+        """Handle a GET request."""
+        self.handle_method("GET")
+
+    def do_POST(self):
+        """Handle a POST request."""
+        self.handle_method("POST")
+
+    def do_PUT(self):
+        """Handle a PUT request."""
+        self.handle_method("PUT")
+
+    def do_DELETE(self):
+        """Handle a DELETE request."""
+        self.handle_method("DELETE")
+
+
+def create_server(
+    port: int = def_port, notebooks: int = def_notebooks,
+    notes: int = def_notes, latency: float = 0.0, ttl: int = def_ttl,
+    capacity: int = 0
+) -> ThreadingHTTPServer:
+    """Create the API server.
+
+    :param port: Port. If it's 0, a free port is used.
+    :param notebooks: Number of notebooks to create.
+    :param notes: Number of notes to create in each notebook.
+    :param latency: Delay (seconds) before handling each request.
+    :param ttl: Access token expiration time in seconds.
+    :param capacity: Maximum number of concurrent requests (0 for no limit).
+    :returns: Server.
+    """
+    store = Store(notebooks, notes, ttl)
+
+    handler = type("Handler", (Handler,), {
+        "store": store, "latency": latency, "capacity": capacity
+    })
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+
+    return server
+
+
+def main():
+    """Run the API server."""
+    p = ArgumentParser(description="Mock of the Notelist API.")
+    p.add_argument("--port", type=int, default=def_port)
+    p.add_argument("--notebooks", type=int, default=def_notebooks)
+    p.add_argument("--notes", type=int, default=def_notes)
+    p.add_argument("--latency", type=float, default=0.0)
+    p.add_argument("--ttl", type=int, default=def_ttl)
+    p.add_argument("--capacity", type=int, default=0)
+    a = p.parse_args()
+
+    server = create_server(
+        a.port, a.notebooks, a.notes, a.latency, a.ttl, a.capacity
+    )
+
+    print(f"Listening on http://127.0.0.1:{server.server_address[1]}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -25,8 +25,7 @@ if __name__ == "__main__":
         python_requires=">=3.9.0",
         install_requires=[
             "click==8.0.3",
-            "requests==2.26.0",
-            "userconf==0.4.0"
+            "requests==2.26.0"
         ],
         packages=[
             "notelist_cli"
@@ -3,38 +3,25 @@
 Notelist CLI is a command line interface for the Notelist API.
 """
 
-from click import group
-
-from notelist_cli.config import config
-from notelist_cli.admin import admin
-from notelist_cli.auth import auth
-from notelist_cli.user import user
-from notelist_cli.notebook import notebook
-from notelist_cli.note import note
-from notelist_cli.search import search
+import sys
 
 
 __version__ = "0.3.0"
 
 
-@group()
-def cli():
-    """Welcome to Notelist CLI 0.3.0.
+def main():
+    """Run the application.
 
-    Notelist CLI is a command line interface for the Notelist API.
+    If the background agent is running, the command is forwarded to it and
+    run there (see the "client" and "agent" modules). Otherwise, or if the
+    agent can't run the command, the command is run in this process.
     """
-    pass
+    from notelist_cli import client
 
+    status = client.forward(sys.argv[1:])
 
-cli.add_command(config)
-cli.add_command(admin)
-cli.add_command(auth)
-cli.add_command(user)
-cli.add_command(notebook)
-cli.add_command(note)
-cli.add_command(search)
+    if status is not None:
+        sys.exit(status)
 
-
-def main():
-    """Run the application."""
+    from notelist_cli.app import cli
     cli()
@@ -1,11 +1,19 @@
 """Administration module."""
 
 import sys
+from datetime import datetime
 from typing import Optional
 
-from click import group, option, confirmation_option, echo
+from click import (
+    group, option, confirmation_option, echo, Choice, DateTime
+)
 
+from notelist_cli import cache, output
 from notelist_cli.auth import request, check_response
+from notelist_cli.models import User, to_records
+from notelist_cli.output import (
+    Column, print_record, print_records, print_table, user_fields
+)
 
 
 # Endpoints
@@ -37,29 +45,13 @@ def get_ls_header() -> str:
     )
 
 
-def get_ls_user_line(user: dict) -> str:
-    """Get a string representing a user in the User Ls command.
-
-    :param user: User data.
-    :returns: User string.
-    """
-    line = user["id"] + " | "
-    username = user["username"]
-    c = len(username)
-
-    if c <= 20:
-        username = username + (" " * (20 - c))
-    else:
-        username = f"{username[:17]}..."
-
-    admin = "Yes" if user["admin"] else "No "
-    enabled = "Yes" if user["enabled"] else "No "
-
-    line += username + " | "
-    line += admin + (" " * 11) + "| "
-    line += enabled
-
-    return line
+# User Ls command columns
+ls_columns = [
+    Column(lambda u: u["id"]),
+    Column(lambda u: u["username"], 20),
+    Column(lambda u: "Yes" if u["admin"] else "No", 13),
+    Column(lambda u: "Yes" if u["enabled"] else "No ")
+]
 
 
 @group()
@@ -81,20 +73,21 @@ def ls():
         r = request("GET", users_ep, True)
         check_response(r)
 
-        d = r.json()
-        users = d.get("result")
+        users = r.result
 
         if users is None:
             raise Exception("Data not received.")
 
-        c = len(users)
+        to_records(User, users)
+        cache.validate("user", users)
 
-        if c > 0:
-            echo(get_ls_header())
+        if output.fmt != "table":
+            print_records(users, user_fields)
+            return
 
-            for u in users:
-                echo(get_ls_user_line(u))
+        c = print_table(get_ls_header(), ls_columns, users)
 
+        if c > 0:
             echo()
 
         s = "s" if c != 1 else ""
@@ -112,12 +105,18 @@ def get(id: str):
         r = request("GET", ep, True)
         check_response(r)
 
-        d = r.json()
-        res = d.get("result")
+        res = r.result
 
         if res is None:
             raise Exception("Data not received.")
 
+        res = User(res)
+        cache.put("user", res)
+
+        if output.fmt != "table":
+            print_record(res, user_fields)
+            return
+
         # User data
         _id = res["id"]
         username = res["username"]
@@ -181,7 +180,7 @@ def create(
         r = request("POST", user_ep, True, data)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -192,7 +191,9 @@ def create(
 def put_user(
     _id: str, username: Optional[str] = None, password: Optional[str] = None,
     admin: Optional[bool] = None, enabled: Optional[bool] = None,
-    name: Optional[str] = None, email: Optional[str] = None
+    name: Optional[str] = None, email: Optional[str] = None,
+    since: Optional[datetime] = None, on_conflict: Optional[str] = None,
+    use_cache: bool = False
 ):
     """Put/update a user.
 
@@ -203,6 +204,12 @@ def put_user(
     :param enabled: Whether the user is enabled or not.
     :param name: Name.
     :param email: E-mail.
+    :param since: If it's not `None`, the update is cancelled if the user has
+    been modified after this date-time.
+    :param on_conflict: If it's not `None`, conflict strategy ("fail" or
+    "merge") to use if the user has been modified since the last version seen.
+    :param use_cache: Whether to use the cached user as the current data of
+    the user or not.
     """
     data = {}
 
@@ -231,12 +238,9 @@ def put_user(
         # Get current data
         ep = f"{user_ep}/{_id}"
 
-        r = request("GET", ep, True)
-        check_response(r)
-        user = r.json().get("result")
-
-        if user is None:
-            raise Exception("Data not received.")
+        user = cache.fetch_for_update(
+            "user", _id, since, on_conflict, data, use_cache
+        )
 
         # Get the fields that won't be updated except the password. For the API
         # update request, all fields except the password are required. The
@@ -249,9 +253,10 @@ def put_user(
 
         # Update user
         r = request("PUT", ep, True, data)
+        cache.delete("user", _id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -266,14 +271,26 @@ def put_user(
 @option("--enabled", type=bool, help=des_enabled)
 @option("--name", help=des_name)
 @option("--email", help=des_email)
+@option(
+    "--ifunmodsince", type=DateTime(cache.since_formats),
+    help=cache.des_if_unmod_since
+)
+@option(
+    "--onconflict", type=Choice(cache.conflict_strategies),
+    help=cache.des_on_conflict
+)
+@option("--usecache", is_flag=True, help=cache.des_use_cache)
 def update(
     id: str, username: Optional[str], admin: Optional[bool],
-    enabled: Optional[bool], name: Optional[str], email: Optional[str]
+    enabled: Optional[bool], name: Optional[str], email: Optional[str],
+    ifunmodsince: Optional[datetime], onconflict: Optional[str],
+    usecache: bool
 ):
     """Update a user."""
     put_user(
         id, username=username, admin=admin, enabled=enabled, name=name,
-        email=email
+        email=email, since=ifunmodsince, on_conflict=onconflict,
+        use_cache=usecache
     )
 
 
@@ -295,9 +312,10 @@ def delete(id: str):
     try:
         ep = f"{user_ep}/{id}"
         r = request("DELETE", ep, True)
+        cache.delete("user", id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -0,0 +1,618 @@
+"""Agent module.
+
+The agent is an optional background process that runs the commands forwarded
+by the client (see the "client" module). The agent keeps its state between
+commands: the imported modules, the settings, the shared session with its
+pool of keep-alive connections (see the "transport" module) and the access
+token. This way, the commands run in a tight loop (e.g. by a script) don't pay
+the start-up time of the application and the connection and TLS handshakes
+on each command.
+
+The agent runs one command at a time, in the working directory of the client.
+The output of the command is sent to the client while it's run. If the
+command reads hidden input (e.g. a password prompt), or any input (e.g. a
+file read from the standard input) before it has sent any output or API
+request, the client runs the command locally instead. Otherwise (e.g. a
+confirmation after getting the notes to change), the input is read by the
+client and sent to the agent. If the client is interrupted, the agent stops
+the command.
+
+If the settings file changes (e.g. after a "config" or "auth login" command
+run locally), the agent reads it again and the session, the limiters and the
+retry policy are created again with the new settings.
+
+The agent listens on a Unix socket in the application directory, which is
+only accessible by the user, and it stops after some time without commands.
+"""
+
+import _thread
+import getpass
+import io
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from threading import Lock, Thread
+from os.path import exists, join
+from typing import Optional
+
+from click import group, option, echo
+
+from notelist_cli import client, output, settings
+from notelist_cli.client import (
+    send_frame, recv_frame, request_frame, stdout_frame, stderr_frame,
+    exit_frame, fallback_frame, response_frame, input_frame, data_frame,
+    interrupt_frame
+)
+
+
+# Log file of the agent process
+log_path = join(settings.app_dir, "agent.log")
+
+# Default idle time (minutes) after which the agent stops
+def_idle = 60
+
+# Maximum time (seconds) to wait for the agent to start
+start_timeout = 10.0
+
+# Size of the output buffer of a command. The standard output is sent to the
+# client when the buffer is full, before reading the input and at the end of
+# the command. The standard error data (e.g. progress and error messages) is
+# sent at once.
+output_size = 65536
+
+# Option descriptions
+des_idle = (
+    "Minutes without commands after which the agent stops (0 for no limit)."
+)
+
+# Messages
+not_running = "The agent isn't running."
+
+_log = logging.getLogger(__name__)
+
+
+class NeedsInput(BaseException):
+    """Exception raised when a command reads the input before doing anything.
+
+    It's also raised when a command reads hidden input (e.g. a password). The
+    client runs the command locally instead. It's not an `Exception`
+    subclass, so the error handlers of the commands don't catch it.
+    """
+
+
+class _Watcher(Thread):
+    """Thread that reads the frames sent by the client while a command runs.
+
+    The input data is queued for the standard input of the command. If the
+    client sends an interrupt frame or closes the connection, the command is
+    interrupted with a `KeyboardInterrupt` exception in the main thread.
+    """
+
+    def __init__(self, conn: socket.socket):
+        """Initialize the instance.
+
+        :param conn: Client connection.
+        """
+        super().__init__(daemon=True)
+        self._conn = conn
+        self._lock = Lock()
+        self._running = True
+
+        # Input data received (`None` if the connection was closed)
+        self.inputs = queue.Queue()
+
+    def run(self):
+        """Read the frames until the connection is closed or interrupted."""
+        while True:
+            try:
+                f = recv_frame(self._conn)
+            except OSError:
+                f = None
+
+            if f is not None and f[0] == data_frame:
+                self.inputs.put(f[1])
+                continue
+
+            with self._lock:
+                if self._running:
+                    _thread.interrupt_main()
+
+            self.inputs.put(None)
+            return
+
+    def stop(self):
+        """Stop interrupting the command.
+
+        An interrupt that was being raised when this method was called is
+        discarded.
+        """
+        try:
+            with self._lock:
+                self._running = False
+        except KeyboardInterrupt:
+            pass
+
+
+class _Input(io.RawIOBase):
+    """Standard input of the commands run by the agent."""
+
+    def __init__(self, out: "_Output", watcher: _Watcher, tty: bool):
+        """Initialize the instance.
+
+        :param out: Command output.
+        :param watcher: Client frame reader.
+        :param tty: Whether the standard input of the client is a terminal.
+        """
+        super().__init__()
+        self._out = out
+        self._watcher = watcher
+        self._tty = tty
+        self._requests = _get_request_count()
+
+    def readable(self) -> bool:
+        """Return whether the stream can be read or not.
+
+        :returns: `True`.
+        """
+        return True
+
+    def isatty(self) -> bool:
+        """Return whether the stream is a terminal or not.
+
+        :returns: Whether the standard input of the client is a terminal.
+        """
+        return self._tty
+
+    def readinto(self, b: bytearray) -> int:
+        """Read data from the standard input of the client.
+
+        If the command hasn't sent any output or API request yet, a
+        `NeedsInput` exception is raised instead. Otherwise, the pending
+        output (e.g. a prompt) is sent before.
+
+        :param b: Buffer.
+        :returns: Number of bytes read (0 at the end of the input).
+        """
+        if not self._out.sent and _get_request_count() == self._requests:
+            raise NeedsInput()
+
+        sys.stdout.flush()
+        sys.stderr.flush()
+        self._out.send()
+        send_frame(self._out.conn, input_frame, str(len(b)).encode())
+
+        data = self._watcher.inputs.get()
+
+        if data is None:
+            return 0
+
+        n = len(data)
+        b[:n] = data
+
+        return n
+
+
+class _Output:
+    """Output of a command run by the agent.
+
+    The standard output and standard error data are buffered together, in
+    order, and they are sent to the client as frames when the buffer is full
+    or when standard error data is added.
+    """
+
+    def __init__(self, conn: socket.socket):
+        """Initialize the instance.
+
+        :param conn: Client connection.
+        """
+        self.conn = conn
+        self._frames = []
+        self._size = 0
+
+        # Whether any output has been sent to the client or not
+        self.sent = False
+
+    def add(self, kind: bytes, data: bytes):
+        """Add data to the buffer.
+
+        :param kind: Frame type (standard output or standard error).
+        :param data: Data.
+        """
+        if len(self._frames) > 0 and self._frames[-1][0] == kind:
+            self._frames[-1][1].extend(data)
+        else:
+            self._frames.append((kind, bytearray(data)))
+
+        self._size += len(data)
+
+        if self._size >= output_size or kind == stderr_frame:
+            self.send()
+
+    def send(self):
+        """Send the buffered data to the client."""
+        for kind, data in self._frames:
+            send_frame(self.conn, kind, bytes(data))
+            self.sent = True
+
+        self._frames.clear()
+        self._size = 0
+
+
+class _Writer(io.RawIOBase):
+    """Standard output or standard error of the commands run by the agent."""
+
+    def __init__(self, out: _Output, kind: bytes, tty: bool):
+        """Initialize the instance.
+
+        :param out: Command output.
+        :param kind: Frame type.
+        :param tty: Whether the stream of the client is a terminal.
+        """
+        super().__init__()
+        self._out = out
+        self._kind = kind
+        self._tty = tty
+
+    def writable(self) -> bool:
+        """Return whether the stream can be written or not.
+
+        :returns: `True`.
+        """
+        return True
+
+    def isatty(self) -> bool:
+        """Return whether the stream is a terminal or not.
+
+        :returns: Whether the stream of the client is a terminal.
+        """
+        return self._tty
+
+    def write(self, b: bytes) -> int:
+        """Write data.
+
+        :param b: Data.
+        :returns: Number of bytes written.
+        """
+        self._out.add(self._kind, b)
+        return len(b)
+
+
+def _text_stream(raw: io.RawIOBase, writable: bool) -> io.TextIOWrapper:
+    """Get a UTF-8 text stream of a raw stream.
+
+    :param raw: Raw stream.
+    :param writable: Whether the stream is for writing or for reading.
+    :returns: Text stream.
+    """
+    buf = io.BufferedWriter(raw) if writable else io.BufferedReader(raw)
+    return io.TextIOWrapper(buf, encoding="utf-8")
+
+
+def _get_mtime() -> Optional[int]:
+    """Get the modification time of the settings file.
+
+    :returns: Modification time (nanoseconds) or `None` if the file doesn't
+    exist.
+    """
+    try:
+        return os.stat(settings.settings_path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _get_hidden_input(prompt: str = "Password: ", stream=None) -> str:
+    """Read hidden input (replacement of `getpass.getpass` in the agent).
+
+    The agent process has no terminal to disable the echo of the input on, so
+    the input would be echoed by the client. A `NeedsInput` exception is
+    always raised instead, so the command is run locally.
+
+    :param prompt: Prompt.
+    :param stream: Stream to write the prompt to.
+    """
+    raise NeedsInput()
+
+
+def _get_request_count() -> int:
+    """Get the number of API requests sent by the agent process.
+
+    :returns: Number of requests.
+    """
+    m = sys.modules.get("notelist_cli.transport")
+    return m.get_request_count() if m is not None else 0
+
+
+def _reset_state():
+    """Reset the state of the modules set by the global options of a command.
+
+    Only the modules that have been imported are reset.
+    """
+    output.fmt = "table"
+    m = sys.modules
+
+    if "notelist_cli.cache" in m:
+        m["notelist_cli.cache"].enabled = True
+
+    if "notelist_cli.tracing" in m:
+        m["notelist_cli.tracing"].enabled = False
+
+    if "notelist_cli.profiling" in m:
+        m["notelist_cli.profiling"].mode = None
+
+    if "notelist_cli.transport" in m:
+        m["notelist_cli.transport"].reset_retry_count()
+
+
+def run_command(
+    conn: socket.socket, args: list[str], cwd: str,
+    tty: tuple[bool, bool, bool] = (False, False, False)
+):
+    """Run a command and send its output and exit status to the client.
+
+    :param conn: Client connection.
+    :param args: Command arguments.
+    :param cwd: Working directory of the client.
+    :param tty: Whether the standard input, standard output and standard
+    error of the client are terminals.
+    """
+    from notelist_cli.app import cli
+
+    out = _Output(conn)
+    watcher = _Watcher(conn)
+    streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdin = _text_stream(_Input(out, watcher, tty[0]), False)
+    sys.stdout = _text_stream(_Writer(out, stdout_frame, tty[1]), True)
+    sys.stderr = _text_stream(_Writer(out, stderr_frame, tty[2]), True)
+    get_pass = getpass.getpass
+    getpass.getpass = _get_hidden_input
+    status = 0
+    watcher.start()
+
+    try:
+        os.chdir(cwd)
+        cli.main(args, prog_name="notelist-cli")
+    except SystemExit as e:
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            sys.stderr.write(f"{e.code}\n")
+            status = 1
+    except NeedsInput:
+        # The client runs the command
+        status = None
+    except KeyboardInterrupt:
+        sys.stderr.write("\nAborted!\n")
+        status = 1
+    except Exception:
+        traceback.print_exc()
+        status = 1
+    finally:
+        watcher.stop()
+        getpass.getpass = get_pass
+
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            _reset_state()
+
+    try:
+        if status is None:
+            send_frame(conn, fallback_frame)
+        else:
+            out.send()
+            send_frame(conn, exit_frame, str(status).encode())
+    finally:
+        # The watcher stops when the connection is shut down
+        try:
+            conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+        watcher.join()
+
+
+def serve(idle: int):
+    """Run the agent until it's stopped or it's idle for some time.
+
+    :param idle: Idle time (minutes) after which the agent stops (0 for no
+    limit).
+    """
+    if client.connect() is not None:
+        raise Exception("The agent is already running.")
+
+    os.makedirs(settings.app_dir, exist_ok=True)
+
+    if exists(client.socket_path):
+        os.remove(client.socket_path)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    # The socket is only accessible by the user, as the agent runs the
+    # commands with the access token of the user.
+    mask = os.umask(0o177)
+
+    try:
+        sock.bind(client.socket_path)
+    finally:
+        os.umask(mask)
+
+    sock.listen(16)
+    sock.settimeout(idle * 60 if idle > 0 else None)
+
+    h = logging.StreamHandler()
+    h.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    _log.addHandler(h)
+    _log.setLevel(logging.INFO)
+    _log.info("Agent started (PID %d).", os.getpid())
+
+    started = time.time()
+    commands = 0
+    mtime = _get_mtime()
+    running = True
+
+    try:
+        while running:
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                break
+
+            with conn:
+                conn.settimeout(None)
+
+                try:
+                    f = recv_frame(conn)
+
+                    if f is None or f[0] != request_frame:
+                        continue
+
+                    req = json.loads(f[1])
+                    op = req.get("op")
+
+                    if op == "run":
+                        if _get_mtime() != mtime:
+                            settings.load(True)
+
+                            if "notelist_cli.transport" in sys.modules:
+                                sys.modules["notelist_cli.transport"].reset()
+
+                        tty = tuple(req.get("tty", (False, False, False)))
+                        run_command(conn, req["args"], req["cwd"], tty)
+                        commands += 1
+                        mtime = _get_mtime()
+                    else:
+                        res = {
+                            "pid": os.getpid(), "started": started,
+                            "commands": commands
+                        }
+
+                        running = op != "stop"
+                        data = json.dumps(res).encode()
+                        send_frame(conn, response_frame, data)
+                except OSError:
+                    # The client closed the connection
+                    pass
+                except KeyboardInterrupt:
+                    # Interrupt of the client raised after the end of the
+                    # command
+                    pass
+                except (ValueError, KeyError) as e:
+                    _log.warning("Invalid request: %s", e)
+    finally:
+        sock.close()
+        _log.info("Agent stopped.")
+
+        if exists(client.socket_path):
+            os.remove(client.socket_path)
+
+
+def start_process(idle: int) -> int:
+    """Start the agent in a new background process.
+
+    An `Exception` is raised if the agent doesn't start.
+
+    :param idle: Idle time (minutes) after which the agent stops.
+    :returns: Process ID.
+    """
+    os.makedirs(settings.app_dir, exist_ok=True)
+    cmd = [sys.executable, "-m", "notelist_cli", "agent", "serve"]
+    cmd += ["--idle", str(idle)]
+
+    with open(log_path, "ab") as log:
+        p = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=log, stderr=log,
+            cwd=settings.app_dir, start_new_session=True
+        )
+
+    end = time.monotonic() + start_timeout
+
+    while time.monotonic() < end:
+        res = client.call("status")
+
+        if res is not None:
+            return res["pid"]
+
+        if p.poll() is not None:
+            break
+
+        time.sleep(0.05)
+
+    raise Exception(f"The agent didn't start. See {log_path}.")
+
+
+@group()
+def agent():
+    """Manage the background agent.
+
+    The agent is an optional background process that runs the commands,
+    keeping the connections to the API, the settings and the access token
+    between commands, so that each command is run faster.
+    """
+    pass
+
+
+@agent.command()
+@option("--idle", type=int, default=def_idle, help=des_idle)
+def start(idle: int):
+    """Start the agent."""
+    try:
+        if not hasattr(socket, "AF_UNIX") or os.name != "posix":
+            raise Exception("The agent isn't supported on this platform.")
+
+        res = client.call("status")
+
+        if res is not None:
+            pid = res["pid"]
+            raise Exception(f"The agent is already running (PID {pid}).")
+
+        pid = start_process(idle)
+        echo(f"Agent started (PID {pid}).")
+    except Exception as e:
+        sys.exit(f"Error: {e}")
+
+
+@agent.command()
+def stop():
+    """Stop the agent."""
+    res = client.call("stop")
+
+    if res is None:
+        sys.exit(f"Error: {not_running}")
+
+    echo("Agent stopped.")
+
+
+@agent.command()
+def status():
+    """Show the status of the agent."""
+    res = client.call("status")
+
+    if res is None:
+        echo(not_running)
+        return
+
+    started = time.strftime(
+        "%Y-%m-%d %H:%M:%S", time.localtime(res["started"])
+    )
+
+    echo(f"PID: {res['pid']}")
+    echo(f"Started: {started}")
+    echo(f"Commands run: {res['commands']}")
+
+
+@agent.command(name="serve", hidden=True)
+@option("--idle", type=int, default=def_idle, help=des_idle)
+def serve_command(idle: int):
+    """Run the agent in this process."""
+    try:
+        serve(idle)
+    except Exception as e:
+        sys.exit(f"Error: {e}")
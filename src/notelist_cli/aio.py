@@ -0,0 +1,102 @@
+"""Asynchronous requests module.
+
+Asynchronous counterparts of the request functions of the auth module. The
+requests are blocking calls of the shared session of the transport module, run
+in worker threads with `asyncio.to_thread`, so several independent requests
+can be awaited concurrently and the total time is the time of the slowest
+request instead of the sum of the times of all the requests.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Coroutine, Optional
+
+from notelist_cli.auth import ApiResponse, request, check_response
+
+
+# Default values
+def_limit = 8
+
+
+async def arequest(
+    method: str, endpoint: str, auth: bool = False,
+    data: Optional[dict] = None, retry: bool = True,
+    idempotent: Optional[bool] = None
+) -> ApiResponse:
+    """Make a HTTP request asynchronously.
+
+    The access token is refreshed if it's expired, like in `auth.request`.
+
+    :param method: Request method ("GET", "POST", "PUT" or "DELETE").
+    :param endpoint: Relative endpoint URL (e.g. "/users/users").
+    :param auth: Whether the request is authenticated or not.
+    :param data: Request data.
+    :param retry: Whether to retry the request or not if the access token is
+    expired.
+    :param idempotent: Whether the request is idempotent or not.
+    :returns: Request response.
+    """
+    return await asyncio.to_thread(
+        request, method, endpoint, auth, data, retry, idempotent
+    )
+
+
+async def aget_result(
+    method: str, endpoint: str, auth: bool = True,
+    data: Optional[dict] = None
+) -> Any:
+    """Make a HTTP request asynchronously, check it and get its result.
+
+    An `Exception` is raised if there is an error or if the response doesn't
+    contain a result.
+
+    :param method: Request method ("GET", "POST", "PUT" or "DELETE").
+    :param endpoint: Relative endpoint URL (e.g. "/users/users").
+    :param auth: Whether the request is authenticated or not.
+    :param data: Request data.
+    :returns: Response result.
+    """
+    r = await arequest(method, endpoint, auth, data)
+    check_response(r)
+    res = r.result
+
+    if res is None:
+        raise Exception("Data not received.")
+
+    return res
+
+
+async def acall(func: Callable, *args) -> Any:
+    """Call a blocking function asynchronously in a worker thread.
+
+    :param func: Function.
+    :param args: Function arguments.
+    :returns: Function result.
+    """
+    return await asyncio.to_thread(func, *args)
+
+
+async def gather(*aws: Awaitable, limit: int = def_limit) -> list:
+    """Run awaitables concurrently, with a limit of awaitables running at once.
+
+    An exception raised by any of the awaitables is propagated.
+
+    :param aws: Awaitables.
+    :param limit: Maximum number of awaitables running at the same time.
+    :returns: Results, in the same order as the awaitables.
+    """
+    sem = asyncio.Semaphore(max(limit, 1))
+
+    async def run_limited(aw: Awaitable) -> Any:
+        async with sem:
+            return await aw
+
+    return await asyncio.gather(*(run_limited(a) for a in aws))
+
+
+def run(coro: Coroutine) -> Any:
+    """Run a coroutine from synchronous code and get its result.
+
+    :param coro: Coroutine.
+    :returns: Result.
+    """
+    return asyncio.run(coro)
@@ -0,0 +1,93 @@
+"""Application module.
+
+Main group of the CLI commands and global options. This module is imported
+only when a command is run in this process, not when it's forwarded to the
+agent (see the "client" and "agent" modules).
+"""
+
+from typing import Optional
+
+from click import group, option, pass_context, Choice, Context, Path
+
+from notelist_cli import output
+from notelist_cli.lazy import LazyGroup
+
+
+# Option descriptions
+des_no_cache = "Don't use the local cache of notebooks and notes."
+des_format = (
+    'Output format of the listings and the records ("table" for the '
+    "human-readable output)."
+)
+des_trace = (
+    "Print a trace of the API requests (status, size and times) and of the "
+    "retries and token refreshes to the standard error."
+)
+des_trace_file = "Write the trace events to a JSONL file instead."
+des_profile = (
+    'Profile the command ("cpu" for a CPU profile of the functions or "mem" '
+    "for the peak memory and the top memory allocation sites) and print a "
+    "summary to the standard error."
+)
+des_profile_file = (
+    'Pstats file to write the CPU profile to. By default, it\'s '
+    '"notelist_cli.prof".'
+)
+
+# Profiling modes (see the "profiling" module)
+profile_modes = ("cpu", "mem")
+
+# Commands. The command modules are imported only when their commands are
+# invoked (see the "lazy" module).
+commands = {
+    "config": ("notelist_cli.config:config", "Configure CLI."),
+    "admin": ("notelist_cli.admin:admin", "Manage API."),
+    "auth": ("notelist_cli.auth:auth", "Log in/out."),
+    "user": ("notelist_cli.user:user", "Manage user."),
+    "notebook": ("notelist_cli.notebook:notebook", "Manage notebooks."),
+    "note": ("notelist_cli.note:note", "Manage notes."),
+    "search": (
+        "notelist_cli.search:search", "Search for notebooks and notes."
+    ),
+    "sync": ("notelist_cli.sync:sync", "Synchronize the local mirror."),
+    "agent": ("notelist_cli.agent:agent", "Manage the background agent.")
+}
+
+
+@group(cls=LazyGroup, lazy_commands=commands)
+@option("--nocache", is_flag=True, help=des_no_cache)
+@option(
+    "--format", "fmt", type=Choice(output.formats), default="table",
+    help=des_format
+)
+@option("--trace", is_flag=True, help=des_trace)
+@option("--tracefile", type=Path(dir_okay=False), help=des_trace_file)
+@option("--profile", type=Choice(profile_modes), help=des_profile)
+@option("--profilefile", type=Path(dir_okay=False), help=des_profile_file)
+@pass_context
+def cli(
+    ctx: Context, nocache: bool, fmt: str, trace: bool,
+    tracefile: Optional[str], profile: Optional[str],
+    profilefile: Optional[str]
+):
+    """Welcome to Notelist CLI 0.3.0.
+
+    Notelist CLI is a command line interface for the Notelist API.
+    """
+    output.fmt = fmt
+
+    if profile is not None:
+        from notelist_cli import profiling
+        profiling.start(profile, profilefile)
+        ctx.call_on_close(profiling.finish)
+
+    if trace or tracefile is not None:
+        from notelist_cli import tracing
+        tracing.start(tracefile)
+        ctx.call_on_close(tracing.finish)
+
+    if nocache:
+        # The cache module is imported only if it's needed, as it imports the
+        # "requests" package.
+        from notelist_cli import cache
+        cache.enabled = False
@@ -1,22 +1,64 @@
-"""Authentication module."""
+"""Authentication module.
+
+The data of each API response is decoded once, when the response is received,
+into an `ApiResponse` instance. If the "orjson" package is installed, it's used
+to decode the data instead of the "json" module. The responses with a list as
+result can be decoded incrementally instead (see `request_items`).
+
+The "tracing" module isn't imported here: it's only imported by the global
+"--trace" and "--tracefile" options, and the events are recorded only if it
+has been imported and enabled.
+"""
 
 import sys
-from typing import Optional
+import json
+import time
+from base64 import urlsafe_b64decode
+from contextlib import contextmanager
+from os import makedirs
+from os.path import join
+from threading import Lock
+from typing import Any, Iterator, Optional
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import requests as req
 from click import group, option, echo
-from requests.models import Response
-from userconf import Userconf
+
+from notelist_cli import settings
+from notelist_cli.jsonstream import ResultStream
+from notelist_cli.transport import (
+    add_retry, encode_data, get_retry_policy, get_session, get_timings, send,
+    idempotent_methods, retry_codes
+)
 
 
 # Settings
-app_id = "notelist_cli"
 api_url = "api_url"
 user_id = "user_id"
 acc_tok = "access_token"
 ref_tok = "refresh_token"
 
-uc = Userconf(app_id)
+# Size (bytes) of the chunks of the streamed responses
+chunk_size = 65536
+
+# Seconds before the expiration of the access token to refresh it
+refresh_margin = 30
+
+# Lock file to share the token refresh between processes
+refresh_lock_path = join(settings.app_dir, "refresh.lock")
+
+# Lock to share the token refresh between threads
+_refresh_lock = Lock()
 
 # Endpoints
 login_ep = "/auth/login"
@@ -31,6 +73,64 @@ acc_tok_error = f"Access token not found. {login_me}"
 ref_tok_error = f"Refresh token not found. {login_me}"
 
 
+def loads(data: bytes) -> Any:
+    """Decode JSON data.
+
+    A `ValueError` exception is raised if the data isn't valid JSON.
+
+    :param data: JSON data.
+    :returns: Decoded data.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+class ApiResponse:
+    """API response with its data decoded."""
+
+    def __init__(self, response: req.Response):
+        """Initialize the instance and decode the response data.
+
+        A `ValueError` exception is raised if the response data isn't a valid
+        JSON object.
+
+        :param response: HTTP response.
+        """
+        data = loads(response.content)
+
+        if not isinstance(data, dict):
+            raise ValueError("Invalid response data.")
+
+        self.response = response
+        self.status_code = response.status_code
+        self.data = data
+        self.message: Optional[str] = data.get("message")
+        self.message_type: Optional[str] = data.get("message_type")
+        self.result: Any = data.get("result")
+
+
+def _tracing_enabled() -> bool:
+    """Return whether tracing is enabled or not.
+
+    :returns: `True` if the "tracing" module has been imported and it's
+    enabled.
+    """
+    tracing = sys.modules.get("notelist_cli.tracing")
+    return tracing is not None and tracing.enabled
+
+
+def _record(event: str, **fields):
+    """Record a trace event if tracing is enabled.
+
+    :param event: Event type.
+    :param fields: Event fields.
+    """
+    if _tracing_enabled():
+        sys.modules["notelist_cli.tracing"].record(event, **fields)
+
+
 def get_api_url() -> str:
     """Get the API URL.
 
@@ -38,7 +138,7 @@ def get_api_url() -> str:
 
     :returns: API URL.
     """
-    _api_url = uc.get(api_url)
+    _api_url = settings.get(api_url)
 
     if _api_url is None:
         raise Exception(api_url_error)
@@ -53,7 +153,7 @@ def get_user_id() -> str:
 
     :returns: User ID.
     """
-    _id = uc.get(user_id)
+    _id = settings.get(user_id)
 
     if _id is None:
         raise Exception(uid_error)
@@ -68,7 +168,7 @@ def get_acc_tok() -> str:
 
     :returns: Access token.
     """
-    token = uc.get(acc_tok)
+    token = settings.get(acc_tok)
 
     if token is None:
         raise Exception(acc_tok_error)
@@ -83,7 +183,7 @@ def get_ref_tok() -> str:
 
     :returns: Access token.
     """
-    token = uc.get(ref_tok)
+    token = settings.get(ref_tok)
 
     if token is None:
         raise Exception(ref_tok_error)
@@ -91,7 +191,7 @@ def get_ref_tok() -> str:
     return token
 
 
-def refresh_access_token() -> req.Response:
+def refresh_access_token() -> ApiResponse:
     """Update the access token with a new, not fresh, token.
 
     :returns: Request response.
@@ -101,69 +201,338 @@ def refresh_access_token() -> req.Response:
 
     url = f"{_api_url}{refresh_ep}"
     headers = {"Authorization": f"Bearer {ref}"}
-    r = req.get(url, headers=headers)
+    start = time.perf_counter()
+    timeout = get_retry_policy().get_timeout(time.monotonic())
+    r = get_session().get(url, headers=headers, timeout=timeout)
+
+    _record(
+        "refresh", status=r.status_code, total=time.perf_counter() - start
+    )
+
+    r = ApiResponse(r)
 
     # Update access token
     if r.status_code == 200:
-        acc = r.json()["result"]["access_token"]
-        uc.set(acc_tok, acc)
+        settings.update({acc_tok: r.result["access_token"]})
 
     return r
 
 
+def get_token_exp(token: str) -> Optional[float]:
+    """Get the expiration time of a JWT token from its "exp" claim.
+
+    The signature of the token isn't verified.
+
+    :param token: Token.
+    :returns: Expiration time (as a POSIX timestamp) or `None` if the token
+    isn't a valid JWT token or it doesn't have an "exp" claim.
+    """
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+
+        return float(json.loads(urlsafe_b64decode(payload))["exp"])
+    except Exception:
+        return None
+
+
+def is_expiring(token: str) -> bool:
+    """Return whether a token is expired or about to expire.
+
+    :param token: Token.
+    :returns: `True` if the token expires in less than `refresh_margin`
+    seconds or `False` otherwise (or if its expiration time is unknown).
+    """
+    exp = get_token_exp(token)
+    return exp is not None and exp - time.time() < refresh_margin
+
+
+@contextmanager
+def refresh_lock() -> Iterator[None]:
+    """Acquire the token refresh lock, shared by threads and processes.
+
+    The lock is shared between processes through a lock file if the platform
+    supports it (the `fcntl` module is available).
+    """
+    with _refresh_lock:
+        if fcntl is None:
+            yield
+            return
+
+        makedirs(settings.app_dir, exist_ok=True)
+
+        with open(refresh_lock_path, "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def refresh_shared(token: str) -> Optional[ApiResponse]:
+    """Refresh the access token, unless another caller already refreshed it.
+
+    Only one thread of the process and one process at a time can refresh the
+    token. The other callers wait and then use the new token.
+
+    :param token: Current (expiring or expired) access token of the caller.
+    :returns: Refresh request response or `None` if the token was refreshed by
+    another caller.
+    """
+    with refresh_lock():
+        # Get the access token saved by the other processes
+        at = settings.load(reload=True).get(acc_tok)
+
+        if at is not None and at != token and not is_expiring(at):
+            return None
+
+        return refresh_access_token()
+
+
+def get_valid_acc_tok() -> str:
+    """Get the access token, refreshing it before if it's about to expire.
+
+    An `Exception` is raised if the access token is not found.
+
+    :returns: Access token.
+    """
+    at = get_acc_tok()
+
+    if is_expiring(at):
+        refresh_shared(at)
+        at = get_acc_tok()
+
+    return at
+
+
+def send_with_retries(
+    method: str, url: str, idempotent: bool, **kwargs
+) -> ApiResponse:
+    """Make a HTTP request, retrying it if it fails.
+
+    The request is retried, according to the retry policy of the transport
+    module, if there is a connection error, if the response status code is
+    429, 502, 503 or 504 or if the response data isn't valid JSON. If the
+    request can't be retried anymore, the last response is returned or the
+    last error is raised.
+
+    :param method: Request method.
+    :param url: Request URL.
+    :param idempotent: Whether the request is idempotent or not.
+    :param kwargs: Other arguments of the `requests.Session.request` method.
+    :returns: Request response, with its data decoded.
+    """
+    policy = get_retry_policy()
+    start = time.monotonic()
+    attempt = 0
+
+    while True:
+        r = None
+        res = None
+        error = None
+        decode = None
+        t = time.perf_counter()
+
+        try:
+            timeout = policy.get_timeout(start)
+            r = send(method, url, timeout=timeout, **kwargs)
+            total = time.perf_counter() - t
+            res = ApiResponse(r)
+            decode = time.perf_counter() - t - total
+        except (req.ConnectionError, req.Timeout, ValueError) as e:
+            total = time.perf_counter() - t
+            error = e
+
+        if _tracing_enabled():
+            _trace_request(method, url, r, total, decode)
+
+        if error is None and r.status_code not in retry_codes:
+            return res
+
+        d = policy.get_delay(attempt, start, idempotent, r)
+
+        if d is None:
+            if error is not None:
+                raise error
+
+            return res
+
+        reason = str(error) if error is not None else str(r.status_code)
+        _record(
+            "retry", method=method, endpoint=urlsplit(url).path,
+            attempt=attempt + 1, delay=d, reason=reason
+        )
+
+        time.sleep(d)
+        add_retry()
+        attempt += 1
+
+
+def _trace_request(
+    method: str, url: str, r: Optional[req.Response], total: float,
+    decode: Optional[float], size: Optional[int] = None
+):
+    """Record the trace event of a request attempt.
+
+    :param method: Request method.
+    :param url: Request URL.
+    :param r: Request response or `None` if there was a connection error.
+    :param total: Time since the request was sent until the response was
+    received, including the time waited for the limiters.
+    :param decode: JSON decoding time of the response data.
+    :param size: Size of the response data, if the response was streamed.
+    """
+    wait, connect = get_timings()
+    body = r.request.body if r is not None else None
+
+    if size is None:
+        size = len(r.content) if r is not None else 0
+
+    _record(
+        "request", method=method, endpoint=urlsplit(url).path,
+        status=r.status_code if r is not None else None,
+        bytes_out=len(body) if isinstance(body, (bytes, str)) else 0,
+        bytes_in=size,
+        wait=wait, connect=connect,
+        ttfb=r.elapsed.total_seconds() if r is not None else None,
+        decode=decode, total=total - wait
+    )
+
+
 def request(
     method: str, endpoint: str, auth: bool = False,
-    data: Optional[dict] = None, retry: bool = True
-) -> req.Response:
+    data: Optional[dict] = None, retry: bool = True,
+    idempotent: Optional[bool] = None
+) -> ApiResponse:
     """Make a HTTP request.
 
+    Failed requests are retried if they are idempotent (see
+    `send_with_retries`). The response data is decoded only once.
+
     :param method: Request method ("GET", "POST", "PUT" or "DELETE").
     :param endpoint: Relative endpoint URL (e.g. "/users/users").
     :param auth: Whether the request is authenticated or not.
     :param data: Request data.
     :param retry: Whether to retry the request or not if the access token is
     expired.
-    :returns: Request response.
+    :param idempotent: Whether the request is idempotent or not (e.g. a POST
+    request that only gets data). By default, only the GET, PUT and DELETE
+    requests are idempotent.
+    :returns: Request response, with its data decoded.
     """
+    if idempotent is None:
+        idempotent = method in idempotent_methods
+
     _api_url = get_api_url()
     url = f"{_api_url}{endpoint}"
-    args = {}
+    args = {"headers": {}}
 
-    # Headers
+    # Headers. The access token is refreshed before the request if it's about
+    # to expire.
     if auth:
-        at = get_acc_tok()
-        args["headers"] = {"Authorization": f"Bearer {at}"}
+        at = get_valid_acc_tok()
+        args["headers"]["Authorization"] = f"Bearer {at}"
 
-    # Data
+    # Data, compressed if it's large enough (see `transport.encode_data`)
     if data is not None:
-        args["json"] = data
+        args["data"], h = encode_data(data)
+        args["headers"].update(h)
 
     # Make request
-    r = req.request(method, url, **args)
+    r = send_with_retries(method, url, idempotent, **args)
 
-    # If the access token is expired, we make the request again with a new, not
-    # fresh, access token.
-    k = "message_type"
+    # If the access token is expired anyway (e.g. if the expiration time is
+    # unknown), we make the request again with a new, not fresh, access token.
     t = "error_expired_token"
 
-    if r.json().get(k) == t and retry:
-        r = refresh_access_token()
+    if auth and r.message_type == t and retry:
+        ref = refresh_shared(at)
 
-        if r.status_code == 200:
-            r = request(method, endpoint, auth, data, False)
+        if ref is None or ref.status_code == 200:
+            r = request(method, endpoint, auth, data, False, idempotent)
+        else:
+            r = ref
 
     return r
 
 
-def check_response(r: Response):
+def request_items(
+    method: str, endpoint: str, data: Optional[dict] = None,
+    idempotent: Optional[bool] = None
+) -> Iterator[Any]:
+    """Make an authenticated HTTP request and get the items of its result list.
+
+    The response data is read in chunks and the items are returned as they are
+    received (see the "jsonstream" module). If the response status code isn't
+    200 (e.g. if the access token is expired or the API is overloaded), the
+    response is discarded and the request is made again with `request`, which
+    retries it, refreshes the token and gets the whole response data.
+
+    An `Exception` is raised if there is an error or if the response doesn't
+    contain a result list.
+
+    :param method: Request method ("GET", "POST", "PUT" or "DELETE").
+    :param endpoint: Relative endpoint URL (e.g. "/notes/notes/<id>").
+    :param data: Request data.
+    :param idempotent: Whether the request is idempotent or not.
+    :returns: Iterator of the items of the result list.
+    """
+    url = f"{get_api_url()}{endpoint}"
+    at = get_valid_acc_tok()
+    timeout = get_retry_policy().get_timeout(time.monotonic())
+
+    args = {
+        "headers": {"Authorization": f"Bearer {at}"}, "stream": True,
+        "timeout": timeout
+    }
+
+    if data is not None:
+        args["data"], h = encode_data(data)
+        args["headers"].update(h)
+
+    t = time.perf_counter()
+
+    try:
+        r = send(method, url, **args)
+    except (req.ConnectionError, req.Timeout):
+        r = None
+
+    if r is None or r.status_code != 200:
+        if r is not None:
+            r.close()
+
+        res = request(method, endpoint, True, data, idempotent=idempotent)
+        check_response(res)
+
+        if not isinstance(res.result, list):
+            raise Exception("Data not received.")
+
+        yield from res.result
+        return
+
+    s = ResultStream(r.iter_content(chunk_size))
+
+    try:
+        yield from s
+    finally:
+        r.close()
+
+        if _tracing_enabled():
+            total = time.perf_counter() - t
+            _trace_request(method, url, r, total, None, s.size)
+
+    if not s.found:
+        raise Exception("Data not received.")
+
+
+def check_response(r: ApiResponse):
     """Check a response and quit the application if there is an error.
 
     :param r: Request response.
     """
-    data = r.json()
-
-    m = data.get("message")
-    t = data.get("message_type")
+    m = r.message
+    t = r.message_type
 
     if r.status_code not in (200, 201):
         if t in ("error_expired_token", "error_not_fresh_token"):
@@ -189,16 +558,22 @@ def login(username: str, password: str):
         url = f"{_api_url}{login_ep}"
 
         data = {"username": username, "password": password}
-        r = req.post(url, json=data)
-        d = r.json()
-        res = d.get("result")
-        m = d.get("message")
+        timeout = get_retry_policy().get_timeout(time.monotonic())
+        r = ApiResponse(get_session().post(url, json=data, timeout=timeout))
+        res = r.result
+        m = r.message
 
         if res is not None:
             # Save credentials
-            uc.set(user_id, res["user_id"])
-            uc.set(acc_tok, res["access_token"])
-            uc.set(ref_tok, res["refresh_token"])
+            settings.update({
+                user_id: res["user_id"],
+                acc_tok: res["access_token"],
+                ref_tok: res["refresh_token"]
+            })
+
+            # Remove the cached records of the previous session
+            from notelist_cli import cache
+            cache.clear()
 
         # Print response message
         if m is not None:
@@ -215,15 +590,19 @@ def logout():
         _api_url = get_api_url()
         url = f"{_api_url}{logout_ep}"
 
-        at = uc.get(acc_tok)
+        at = settings.get(acc_tok)
         headers = {"Authorization": f"Bearer {at}"}
 
-        r = req.get(url, headers=headers)
-        m = r.json().get("message")
+        timeout = get_retry_policy().get_timeout(time.monotonic())
+        r = get_session().get(url, headers=headers, timeout=timeout)
+        r = ApiResponse(r)
+        m = r.message
+
+        # Delete credentials and cached records
+        settings.delete(user_id, acc_tok, ref_tok)
 
-        # Delete credentials
-        for i in (user_id, acc_tok, ref_tok):
-            uc.delete(i)
+        from notelist_cli import cache
+        cache.clear()
 
         # Print response message
         if m is not None:
@@ -0,0 +1,431 @@
+"""Cache module.
+
+Notebook, note and user records received from the API are cached on disk, in
+the "cache" directory inside the application directory, with one file per
+record. Each API URL and user has its own subdirectory, so the records of an
+account are never used for another account, and the whole cache is removed
+when the user logs in or out. Each cached record expires after a period of time
+(TTL) and the number of cached records is limited: when the limit is exceeded,
+the least recently used records are removed.
+
+A cached record is removed when the record is updated or deleted through the
+CLI. When a list received from the API (e.g. by the "notebook ls" command)
+shows that the "last_modified" value of a record has changed, the cached
+record expires.
+
+The expired records aren't removed until they're evicted, as they're the last
+version of the records seen by the client. As the API doesn't support
+conditional updates, the update commands request the current data of the
+records to update to the API by default, so that the changes made by other
+clients aren't overwritten with out of date cached values. With the
+"--usecache" option, a cached record that hasn't expired is used instead,
+which saves a request per update. The "--onconflict" option of these commands
+compares the "last_modified" value of the current record with the last
+version seen to detect if the record has been modified by another client, and
+the "--ifunmodsince" option compares it with a given date-time. Both options
+need the current record, so they always request it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime
+from os.path import exists, join
+from typing import Iterable, Optional
+
+from notelist_cli import settings
+from notelist_cli.auth import api_url, user_id, request, check_response
+from notelist_cli.models import Record, parse_datetime
+
+
+# Settings
+cache_ttl = "cache_ttl"
+cache_size = "cache_size"
+
+# Default values
+def_cache_ttl = 300
+def_cache_size = 1000
+
+# Record kinds and their endpoints
+endpoints = {
+    "notebook": "/notebooks/notebook",
+    "note": "/notes/note",
+    "user": "/users/user"
+}
+
+# Conflict strategies
+conflict_strategies = ("fail", "merge")
+
+# Date-time formats of the "--ifunmodsince" option of the update commands
+since_formats = (
+    "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d %H:%M:%S.%f",
+    "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%d"
+)
+
+# Descriptions of the conflict options of the update commands
+des_if_unmod_since = (
+    "Cancel the update if the record has been modified after this date-time "
+    '(e.g. "2021-05-01 10:00:00", like the dates printed by the "get" '
+    "commands)."
+)
+des_use_cache = (
+    "Use the cached record, if it hasn't expired, as the current data of the "
+    "record instead of getting it from the API. It's faster, but the changes "
+    "made by other clients since the record was cached can be overwritten. "
+    'It\'s ignored with "--ifunmodsince" and "--onconflict".'
+)
+des_on_conflict = (
+    "Check if the record has been modified by another client since the last "
+    'version seen by this client (e.g. with the "get" command). "fail" '
+    'cancels the update and "merge" only cancels it if the other client has '
+    "changed any of the fields to update."
+)
+
+# Error messages
+conflict_error = "The {} has been modified by another client ({})."
+merge_error = "The {} has been modified by another client ({}): {}."
+unknown_error = (
+    "The last version of the {} seen by this client is unknown. Get the {} "
+    'first (e.g. with the "get" command) or use "--ifunmodsince".'
+)
+
+# Root directory of the cache
+cache_root = join(settings.app_dir, "cache")
+
+# Fraction of the size limit to keep when the least recently used records are
+# removed. Some room is left so that the records aren't removed on each write.
+evict_ratio = 0.9
+
+# Whether the cache is enabled or not
+enabled = True
+
+_id_re = re.compile(r"[a-zA-Z0-9_-]+$")
+
+# Number of records of each cache directory, counted the first time that a
+# record is written to the directory by the process.
+_counts: dict[str, int] = {}
+
+
+def get_dir() -> str:
+    """Get the cache directory of the current API URL and user.
+
+    :returns: Directory path.
+    """
+    key = f"{settings.get(api_url, '')}\n{settings.get(user_id, '')}"
+    return join(cache_root, hashlib.sha256(key.encode()).hexdigest()[:16])
+
+
+def _get_path(kind: str, _id: str) -> Optional[str]:
+    """Get the path of the cache file of a record.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :returns: File path or `None` if the ID can't be used in a file name.
+    """
+    if not isinstance(_id, str) or _id_re.match(_id) is None:
+        return None
+
+    return join(get_dir(), f"{kind}_{_id}.json")
+
+
+def _scan(directory: str) -> list[tuple[float, str]]:
+    """Get the record files of a cache directory.
+
+    :param directory: Directory path.
+    :returns: Access time and path of each file.
+    """
+    files = []
+
+    with os.scandir(directory) as it:
+        for i in it:
+            if i.name.endswith(".json"):
+                files.append((i.stat().st_mtime, i.path))
+
+    return files
+
+
+def _evict(directory: str):
+    """Remove the least recently used records if the size limit is exceeded.
+
+    The directory is only scanned if the number of records, as counted by the
+    process, exceeds the limit. Then, the records are removed until the number
+    is the size limit multiplied by `evict_ratio`.
+
+    :param directory: Directory path.
+    """
+    size = int(settings.get(cache_size, def_cache_size))
+
+    if _counts[directory] <= size:
+        return
+
+    files = _scan(directory)
+    files.sort()
+    keep = int(size * evict_ratio)
+
+    for _, p in files[:max(len(files) - keep, 0)]:
+        try:
+            os.remove(p)
+        except OSError:
+            pass
+
+    _counts[directory] = min(len(files), keep)
+
+
+def _read(kind: str, _id: str) -> Optional[dict]:
+    """Read a cache file.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :returns: File data or `None` if the file doesn't exist or it's invalid.
+    """
+    path = _get_path(kind, _id)
+
+    if path is None or not exists(path):
+        return None
+
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        return data if "cached" in data and "record" in data else None
+    except (OSError, ValueError):
+        return None
+
+
+def get(kind: str, _id: str) -> Optional[dict]:
+    """Get a cached record.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :returns: Record data or `None` if the record isn't cached or it's
+    expired.
+    """
+    data = _read(kind, _id) if enabled else None
+
+    if data is None:
+        return None
+
+    ttl = int(settings.get(cache_ttl, def_cache_ttl))
+
+    # The expired record is kept as the last version seen
+    if time.time() - data["cached"] > ttl:
+        return None
+
+    # Update the access time of the file for the LRU eviction
+    try:
+        os.utime(_get_path(kind, _id))
+    except OSError:
+        pass
+
+    return data["record"]
+
+
+def _write(
+    kind: str, record: dict, cached: float, seen: Optional[str] = None
+):
+    """Write a cache file.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param record: Record data (a dictionary or a record object).
+    :param cached: Time when the record was cached (0 to expire it).
+    :param seen: Last "last_modified" value seen of the record, if it's
+    different than the value of `record`.
+    """
+    path = _get_path(kind, record.get("id"))
+
+    if not enabled or path is None:
+        return
+
+    if isinstance(record, Record):
+        record = record.to_dict()
+
+    data = {"cached": cached, "record": record}
+
+    if seen is not None:
+        data["seen"] = seen
+
+    try:
+        directory = get_dir()
+        os.makedirs(directory, exist_ok=True)
+
+        if directory not in _counts:
+            _counts[directory] = len(_scan(directory))
+
+        new = not exists(path)
+        tmp = f"{path}.{os.getpid()}.tmp"
+
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+        os.replace(tmp, path)
+
+        if new:
+            _counts[directory] += 1
+            _evict(directory)
+    except OSError:
+        pass
+
+
+def put(kind: str, record: dict):
+    """Cache a record.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param record: Record data (a dictionary or a record object).
+    """
+    _write(kind, record, time.time())
+
+
+def delete(kind: str, _id: str):
+    """Remove a record from the cache.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    """
+    path = _get_path(kind, _id)
+
+    try:
+        if path is not None and exists(path):
+            os.remove(path)
+    except OSError:
+        pass
+
+
+def clear():
+    """Remove all the records from the cache, of all the API URLs and users."""
+    shutil.rmtree(cache_root, ignore_errors=True)
+    _counts.clear()
+
+
+def validate(kind: str, records: Iterable[dict]):
+    """Expire the cached records that have been modified.
+
+    The "last_modified" value of each modified record is kept as the last
+    version seen.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param records: Up to date data of the records (e.g. the records of a list
+    received from the API). Only the "id" and "last_modified" fields are used.
+    """
+    for r in records:
+        data = _read(kind, r.get("id"))
+
+        if data is None:
+            continue
+
+        last_mod = r.get("last_modified")
+
+        if data.get("seen", data["record"].get("last_modified")) != last_mod:
+            _write(kind, data["record"], 0, last_mod)
+
+
+def _request(kind: str, _id: str) -> dict:
+    """Get a record from the API and cache it.
+
+    An `Exception` is raised if the record can't be received.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :returns: Record data.
+    """
+    r = request("GET", f"{endpoints[kind]}/{_id}", True)
+    check_response(r)
+    record = r.result
+
+    if record is None:
+        raise Exception("Data not received.")
+
+    put(kind, record)
+    return record
+
+
+def fetch(kind: str, _id: str) -> dict:
+    """Get a record from the cache or, if it isn't cached, from the API.
+
+    An `Exception` is raised if the record can't be received.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :returns: Record data.
+    """
+    record = get(kind, _id)
+    return _request(kind, _id) if record is None else record
+
+
+def fetch_for_update(
+    kind: str, _id: str, since: Optional[datetime] = None,
+    on_conflict: Optional[str] = None, changes: Optional[dict] = None,
+    use_cache: bool = False
+) -> dict:
+    """Get the current data of a record to update it.
+
+    The record is got from the API, as the cached record could be out of date
+    and its values would overwrite the changes made by other clients, unless
+    `use_cache` is `True` and the record is cached and it hasn't expired. An
+    `Exception` is raised if the record has been modified after `since`.
+
+    If `on_conflict` is not `None`, the "last_modified" value of the record is
+    compared with the last version seen by the client, and an `Exception` is
+    raised if the last version seen is unknown. If the record has been
+    modified, an `Exception` is raised if `on_conflict` is "fail" or, if it's
+    "merge", if another client has changed any of the fields of `changes` to
+    a different value. Otherwise, the fields that aren't updated keep the
+    values set by the other client.
+
+    :param kind: Record kind ("notebook", "note" or "user").
+    :param _id: Record ID.
+    :param since: Date-time, in the time zone of the API.
+    :param on_conflict: Conflict strategy ("fail" or "merge").
+    :param changes: New values of the fields to update ("" to remove a value),
+    for the "merge" strategy.
+    :param use_cache: Whether to use the cached record or not, if `since` and
+    `on_conflict` are `None`.
+    :returns: Record data.
+    """
+    if use_cache and since is None and on_conflict is None:
+        record = get(kind, _id)
+
+        if record is not None:
+            return record
+
+    seen = _read(kind, _id) if enabled else None
+    record = _request(kind, _id)
+    last_mod = record.get("last_modified")
+    modified = last_mod.replace("T", " ") if last_mod is not None else ""
+
+    if (
+        since is not None and last_mod is not None and
+        parse_datetime(last_mod) > since
+    ):
+        raise Exception(conflict_error.format(kind, modified))
+
+    if on_conflict is None:
+        return record
+
+    if seen is None:
+        raise Exception(unknown_error.format(kind, kind))
+
+    base = seen["record"]
+
+    if seen.get("seen", base.get("last_modified")) == last_mod:
+        return record
+
+    if on_conflict == "fail":
+        raise Exception(conflict_error.format(kind, modified))
+
+    # Fields to update that the other client has changed to another value
+    fields = []
+
+    for k, v in (changes or {}).items():
+        v = None if v == "" else v
+        current = record.get(k)
+
+        if current != base.get(k) and current != v:
+            fields.append(k)
+
+    if len(fields) > 0:
+        raise Exception(merge_error.format(kind, modified, ", ".join(fields)))
+
+    return record
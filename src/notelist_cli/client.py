@@ -0,0 +1,265 @@
+"""Client module.
+
+Thin client of the background agent (see the "agent" module). If the agent is
+running, the command arguments are sent to it through a Unix socket in the
+application directory and the agent runs the command with its warm state
+(imported modules, settings, connection pool and access token). The output
+and the exit status of the command are received back and written by the
+client, so the command behaves as if it had been run locally.
+
+This module is imported before any command module, so it only imports
+lightweight modules of the standard library.
+
+The messages are frames with a type (1 byte), a size (4 bytes, big-endian)
+and the data. The client sends a request frame with a JSON object that
+contains the operation ("run", "status" or "stop") and, for "run", the command
+arguments, the working directory and whether the standard streams are
+terminals. The agent responds with output frames (standard output and
+standard error data), followed by an exit status frame or by a fallback
+frame, if the command can't be run by the agent and must be run locally
+(e.g. because it reads the input before doing anything). If the command asks
+for input after it has done something (e.g. a confirmation after getting the
+notes to change), the agent sends an input frame with the maximum size of the
+data to read and the client responds with a data frame with the data read
+from its standard input (empty at the end of the input). If the client is
+interrupted (Ctrl-C), it sends an interrupt frame and the agent stops the
+command.
+"""
+
+import json
+import os
+import socket
+import struct
+import sys
+from os.path import join
+from typing import Any, Optional
+
+from notelist_cli import settings
+
+
+# Unix socket of the agent
+socket_path = join(settings.app_dir, "agent.sock")
+
+# Frame types
+request_frame = b"r"
+stdout_frame = b"o"
+stderr_frame = b"e"
+exit_frame = b"x"
+fallback_frame = b"f"
+response_frame = b"s"
+input_frame = b"i"
+data_frame = b"d"
+interrupt_frame = b"c"
+
+# Global options of the application (see the "app" module) that take a value
+value_options = ("--format", "--tracefile", "--profile", "--profilefile")
+
+_header = struct.Struct("!cI")
+
+
+def send_frame(sock: socket.socket, kind: bytes, data: bytes = b""):
+    """Send a frame.
+
+    :param sock: Socket.
+    :param kind: Frame type.
+    :param data: Frame data.
+    """
+    sock.sendall(_header.pack(kind, len(data)) + data)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Receive an exact number of bytes.
+
+    :param sock: Socket.
+    :param size: Number of bytes.
+    :returns: Data or `None` if the connection was closed before.
+    """
+    buf = bytearray()
+
+    while len(buf) < size:
+        c = sock.recv(size - len(buf))
+
+        if not c:
+            return None
+
+        buf += c
+
+    return bytes(buf)
+
+
+def recv_frame(sock: socket.socket) -> Optional[tuple[bytes, bytes]]:
+    """Receive a frame.
+
+    :param sock: Socket.
+    :returns: Tuple containing the frame type and the frame data, or `None`
+    if the connection was closed.
+    """
+    h = _recv_exact(sock, _header.size)
+
+    if h is None:
+        return None
+
+    kind, size = _header.unpack(h)
+    data = _recv_exact(sock, size) if size > 0 else b""
+
+    return None if data is None else (kind, data)
+
+
+def connect() -> Optional[socket.socket]:
+    """Connect to the agent.
+
+    :returns: Connected socket or `None` if the agent isn't running.
+    """
+    if not hasattr(socket, "AF_UNIX") or not os.path.exists(socket_path):
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+
+    return sock
+
+
+def call(op: str) -> Optional[dict]:
+    """Send an operation to the agent and get its response.
+
+    :param op: Operation ("status" or "stop").
+    :returns: Response data or `None` if the agent isn't running.
+    """
+    sock = connect()
+
+    if sock is None:
+        return None
+
+    with sock:
+        send_frame(sock, request_frame, json.dumps({"op": op}).encode())
+        f = recv_frame(sock)
+
+    if f is None or f[0] != response_frame:
+        return None
+
+    return json.loads(f[1])
+
+
+def get_command(args: list[str]) -> Optional[str]:
+    """Get the name of the command of some arguments.
+
+    The command is the first argument that isn't a global option or the value
+    of a global option.
+
+    :param args: Command arguments.
+    :returns: Command name or `None` if there isn't any command.
+    """
+    i = 0
+
+    while i < len(args):
+        a = args[i]
+
+        if a == "--":
+            i += 1
+            break
+
+        if not a.startswith("-"):
+            break
+
+        i += 2 if a in value_options else 1
+
+    return args[i] if i < len(args) else None
+
+
+def _isatty(stream: Any) -> bool:
+    """Return whether a stream is a terminal or not.
+
+    :param stream: Stream (e.g. `sys.stdout`), which can be `None`.
+    :returns: `True` if the stream is a terminal or `False` otherwise.
+    """
+    try:
+        return stream is not None and stream.isatty()
+    except (AttributeError, ValueError):
+        return False
+
+
+def forward(args: list[str]) -> Optional[int]:
+    """Run a command in the agent, if it's running.
+
+    The "agent" commands aren't forwarded.
+
+    :param args: Command arguments.
+    :returns: Exit status of the command or `None` if the command wasn't run
+    by the agent and must be run locally.
+    """
+    if get_command(args) == "agent":
+        return None
+
+    sock = connect()
+
+    if sock is None:
+        return None
+
+    req = {
+        "op": "run", "args": args, "cwd": os.getcwd(),
+        "tty": [_isatty(s) for s in (sys.stdin, sys.stdout, sys.stderr)]
+    }
+
+    out = sys.stdout.buffer
+    err = sys.stderr.buffer
+    received = False
+
+    with sock:
+        try:
+            send_frame(sock, request_frame, json.dumps(req).encode())
+
+            while True:
+                f = recv_frame(sock)
+
+                if f is None:
+                    raise ConnectionResetError()
+
+                kind, data = f
+                received = True
+
+                if kind == stdout_frame:
+                    out.write(data)
+                elif kind == stderr_frame:
+                    out.flush()
+                    err.write(data)
+                    err.flush()
+                elif kind == exit_frame:
+                    out.flush()
+                    return int(data)
+                elif kind == fallback_frame:
+                    return None
+                elif kind == input_frame:
+                    out.flush()
+                    err.flush()
+                    size = int(data)
+                    data = b""
+
+                    if sys.stdin is not None:
+                        data = sys.stdin.buffer.readline(size)
+
+                    send_frame(sock, data_frame, data)
+        except KeyboardInterrupt:
+            # The agent stops the command when it receives the interrupt
+            # frame or when the connection is closed.
+            try:
+                send_frame(sock, interrupt_frame)
+            except OSError:
+                pass
+
+            out.flush()
+            err.write(b"\nAborted!\n")
+            return 1
+        except ConnectionError:
+            if not received:
+                # The agent closed the connection before running the command
+                return None
+
+            # The agent closed the connection before sending the exit status
+            out.flush()
+            err.write(b"Error: The agent connection was closed.\n")
+            return 1
@@ -1,21 +1,131 @@
 """Configuration module."""
 
-from click import command, option
-from userconf import Userconf
+from typing import Optional
+
+from click import command, option, prompt, Choice
+
+from notelist_cli import settings
 
 
 # Option descriptions
 des_api_url = "Notelist API URL."
+des_pool_size = "Maximum number of connections to keep open to the API."
+des_pool_retries = "Number of retries for connection errors."
+des_keep_alive = "Whether to keep the connections to the API open or not."
+des_rate_limit = "Maximum number of requests per second (0 for no limit)."
+des_rate_burst = "Maximum number of requests in a burst over the rate limit."
+des_adaptive = (
+    "Whether to adapt the number of concurrent requests to the API load or "
+    "not."
+)
+des_max_concurrency = "Maximum number of concurrent requests."
+des_latency_factor = (
+    "Latency rise, relative to the average latency of each endpoint, that "
+    "decreases the number of concurrent requests."
+)
+des_retries = "Maximum number of retries of a failed request."
+des_retry_backoff = "Delay (seconds) before the first retry."
+des_retry_max_backoff = "Maximum delay (seconds) between retries."
+des_retry_deadline = (
+    "Maximum time (seconds) since the first attempt of a request to retry it."
+)
+des_retry_post = (
+    "Whether to retry the POST requests (e.g. note creation) or not. They "
+    "can create duplicates if the API received the failed request."
+)
+des_compress = (
+    'Compression of the request data ("none", "gzip" or "deflate"). The API '
+    "must support compressed requests."
+)
+des_compress_min_size = "Minimum size (bytes) of the request data to compress."
+des_accept_encoding = (
+    "Whether to ask the API for compressed responses or not."
+)
+des_cache_ttl = "Seconds that the cached notebooks and notes are valid."
+des_cache_size = "Maximum number of cached notebooks and notes."
+
+# Compression methods of the request data
+compress_methods = ("none", "gzip", "deflate")
 
 # Settings
-app_id = "notelist_cli"
 _api_url = "api_url"
-
-uc = Userconf(app_id)
+_pool_size = "pool_size"
+_pool_retries = "pool_retries"
+_keep_alive = "keep_alive"
+_rate_limit = "rate_limit"
+_rate_burst = "rate_burst"
+_adaptive = "adaptive"
+_max_concurrency = "max_concurrency"
+_latency_factor = "latency_factor"
+_retries = "retries"
+_retry_backoff = "retry_backoff"
+_retry_max_backoff = "retry_max_backoff"
+_retry_deadline = "retry_deadline"
+_retry_post = "retry_post"
+_compress = "compress"
+_compress_min_size = "compress_min_size"
+_accept_encoding = "accept_encoding"
+_cache_ttl = "cache_ttl"
+_cache_size = "cache_size"
 
 
 @command()
-@option("--apiurl", prompt=True, help=des_api_url)
-def config(apiurl: str):
+@option("--apiurl", help=des_api_url)
+@option("--poolsize", type=int, help=des_pool_size)
+@option("--poolretries", type=int, help=des_pool_retries)
+@option("--keepalive", type=bool, help=des_keep_alive)
+@option("--ratelimit", type=float, help=des_rate_limit)
+@option("--rateburst", type=int, help=des_rate_burst)
+@option("--adaptive", type=bool, help=des_adaptive)
+@option("--maxconcurrency", type=int, help=des_max_concurrency)
+@option("--latencyfactor", type=float, help=des_latency_factor)
+@option("--retries", type=int, help=des_retries)
+@option("--retrybackoff", type=float, help=des_retry_backoff)
+@option("--retrymaxbackoff", type=float, help=des_retry_max_backoff)
+@option("--retrydeadline", type=float, help=des_retry_deadline)
+@option("--retrypost", type=bool, help=des_retry_post)
+@option("--compress", type=Choice(compress_methods), help=des_compress)
+@option("--compressminsize", type=int, help=des_compress_min_size)
+@option("--acceptencoding", type=bool, help=des_accept_encoding)
+@option("--cachettl", type=int, help=des_cache_ttl)
+@option("--cachesize", type=int, help=des_cache_size)
+def config(
+    apiurl: Optional[str], poolsize: Optional[int],
+    poolretries: Optional[int], keepalive: Optional[bool],
+    ratelimit: Optional[float], rateburst: Optional[int],
+    adaptive: Optional[bool], maxconcurrency: Optional[int],
+    latencyfactor: Optional[float], retries: Optional[int],
+    retrybackoff: Optional[float], retrymaxbackoff: Optional[float],
+    retrydeadline: Optional[float], retrypost: Optional[bool],
+    compress: Optional[str], compressminsize: Optional[int],
+    acceptencoding: Optional[bool], cachettl: Optional[int],
+    cachesize: Optional[int]
+):
     """Configure CLI."""
-    uc.set(_api_url, apiurl)
+    values = {
+        _pool_size: poolsize,
+        _pool_retries: poolretries,
+        _keep_alive: keepalive,
+        _rate_limit: ratelimit,
+        _rate_burst: rateburst,
+        _adaptive: adaptive,
+        _max_concurrency: maxconcurrency,
+        _latency_factor: latencyfactor,
+        _retries: retries,
+        _retry_backoff: retrybackoff,
+        _retry_max_backoff: retrymaxbackoff,
+        _retry_deadline: retrydeadline,
+        _retry_post: retrypost,
+        _compress: compress,
+        _compress_min_size: compressminsize,
+        _accept_encoding: acceptencoding,
+        _cache_ttl: cachettl,
+        _cache_size: cachesize
+    }
+
+    # If no option is specified, the API URL is prompted
+    if apiurl is None and all(v is None for v in values.values()):
+        apiurl = prompt("Apiurl")
+
+    values[_api_url] = apiurl
+    settings.update({k: v for k, v in values.items() if v is not None})
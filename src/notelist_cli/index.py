@@ -0,0 +1,158 @@
+"""Index module.
+
+Inverted index of the words of the notebooks (name) and notes (title, body and
+tags) of the local mirror, stored in the mirror database. The index is updated
+when the mirror records are inserted, updated or deleted, so it's built
+incrementally by the "sync" command. It's used by the "search --local"
+command.
+"""
+
+import json
+import re
+import sqlite3
+from collections import Counter
+from math import log
+from typing import Iterable
+
+
+# Index version. If the index of the mirror database has a different version,
+# it's built again.
+version = "1"
+
+# Index schema
+schema = """
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, kind, id)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS terms_kind_id ON terms (kind, id);
+"""
+
+_word_re = re.compile(r"\w+")
+
+# Upper bound of the terms that start with a prefix
+_max_char = "\U0010ffff"
+
+
+def tokenize(text: str) -> list[str]:
+    """Get the terms (lowercase words) of a text.
+
+    :param text: Text.
+    :returns: Terms.
+    """
+    return _word_re.findall(text.lower())
+
+
+def _put(con: sqlite3.Connection, kind: str, _id: str, texts: Iterable[str]):
+    """Index a record, replacing its previous terms.
+
+    :param con: Database connection.
+    :param kind: Record kind ("notebook" or "note").
+    :param _id: Record ID.
+    :param texts: Texts of the record.
+    """
+    remove(con, kind, _id)
+    terms = Counter()
+
+    for t in texts:
+        if t is not None:
+            terms.update(tokenize(t))
+
+    con.executemany(
+        "INSERT INTO terms (term, kind, id, tf) VALUES (?, ?, ?, ?)",
+        [(t, kind, _id, c) for t, c in terms.items()]
+    )
+
+
+def put_notebook(con: sqlite3.Connection, notebook: dict):
+    """Index a notebook.
+
+    :param con: Database connection.
+    :param notebook: Notebook data.
+    """
+    _put(con, "notebook", notebook["id"], [notebook.get("name")])
+
+
+def put_note(con: sqlite3.Connection, note: dict):
+    """Index a note.
+
+    :param con: Database connection.
+    :param note: Note data.
+    """
+    texts = [note.get("title"), note.get("body")] + (note.get("tags") or [])
+    _put(con, "note", note["id"], texts)
+
+
+def remove(con: sqlite3.Connection, kind: str, _id: str):
+    """Remove a record from the index.
+
+    :param con: Database connection.
+    :param kind: Record kind ("notebook" or "note").
+    :param _id: Record ID.
+    """
+    con.execute("DELETE FROM terms WHERE kind = ? AND id = ?", (kind, _id))
+
+
+def rebuild(con: sqlite3.Connection):
+    """Build the index again from the mirror records.
+
+    :param con: Database connection.
+    """
+    con.execute("DELETE FROM terms")
+
+    for i, name in con.execute("SELECT id, name FROM notebooks").fetchall():
+        put_notebook(con, {"id": i, "name": name})
+
+    q = "SELECT id, title, body, tags FROM notes"
+
+    for i, title, body, tags in con.execute(q).fetchall():
+        tags = json.loads(tags) if tags is not None else []
+        put_note(con, {"id": i, "title": title, "body": body, "tags": tags})
+
+
+def find(con: sqlite3.Connection, text: str) -> list[tuple[str, str]]:
+    """Find the records that contain all the words of a text.
+
+    Each word of the text matches the terms that start with it (e.g. "note"
+    matches "notes"). The records are ranked by the sum of the TF-IDF scores
+    of their matching terms.
+
+    :param con: Database connection.
+    :param text: Text.
+    :returns: List of tuples containing the kind ("notebook" or "note") and
+    the ID of each record found, from the highest to the lowest score.
+    """
+    words = list(dict.fromkeys(tokenize(text)))
+
+    if len(words) == 0:
+        return []
+
+    # Number of records
+    n = sum(
+        con.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
+        for t in ("notebooks", "notes")
+    )
+
+    q = "SELECT kind, id, SUM(tf) FROM terms WHERE term >= ? AND term < ? "
+    q += "GROUP BY kind, id"
+
+    scores = None
+
+    for w in words:
+        rows = con.execute(q, (w, w + _max_char)).fetchall()
+        idf = log(1 + n / max(len(rows), 1))
+        s = {(k, i): tf * idf for k, i, tf in rows}
+
+        if scores is None:
+            scores = s
+        else:
+            scores = {k: v + s[k] for k, v in scores.items() if k in s}
+
+        if len(scores) == 0:
+            break
+
+    return sorted(scores, key=lambda k: (-scores[k], k))
@@ -0,0 +1,161 @@
+"""JSON streaming module.
+
+Incremental parser of the API responses that contain a list as result (e.g.
+the response of the note list endpoint). The response data is read in chunks
+and the items of the "result" list are decoded and returned one at a time, as
+they are received, so the whole response data and the whole list are never
+held in memory at the same time.
+"""
+
+import codecs
+import json
+from typing import Any, Iterable, Iterator
+
+
+# Whitespace characters of JSON
+_ws = " \t\n\r"
+
+_decoder = json.JSONDecoder()
+
+
+class ResultStream:
+    """Incremental parser of an API response with a list as result."""
+
+    def __init__(self, chunks: Iterable[bytes]):
+        """Initialize the instance.
+
+        :param chunks: Chunks of the response data (UTF-8 JSON).
+        """
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+
+        # Number of bytes read
+        self.size = 0
+
+        # Fields of the response object other than "result" (e.g. "message"),
+        # as they are parsed.
+        self.fields = {}
+
+        # Whether the response contains a "result" list or not. It's known
+        # when the iteration ends.
+        self.found = False
+
+    def _read(self) -> bool:
+        """Read the next chunk of data into the buffer.
+
+        The part of the buffer that has already been parsed is discarded.
+
+        :returns: `True` if there was data to read or `False` otherwise.
+        """
+        if self._eof:
+            return False
+
+        c = next(self._chunks, None)
+
+        if c is None:
+            self._eof = True
+            t = self._text.decode(b"", True)
+        else:
+            self.size += len(c)
+            t = self._text.decode(c)
+
+        self._buf = self._buf[self._pos:] + t
+        self._pos = 0
+
+        return c is not None
+
+    def _peek(self) -> str:
+        """Skip the whitespace and get the next character, without parsing it.
+
+        A `ValueError` exception is raised if there is no more data.
+
+        :returns: Character.
+        """
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _ws:
+                self._pos += 1
+
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+
+            if not self._read():
+                raise ValueError("Incomplete response data.")
+
+    def _expect(self, chars: str) -> str:
+        """Parse the next character, which must be one of some characters.
+
+        A `ValueError` exception is raised if it's another character.
+
+        :param chars: Expected characters.
+        :returns: Character.
+        """
+        c = self._peek()
+
+        if c not in chars:
+            raise ValueError(f"Invalid response data at '{c}'.")
+
+        self._pos += 1
+        return c
+
+    def _value(self) -> Any:
+        """Parse the next JSON value.
+
+        More data is read until the value is complete. A value that ends at
+        the end of the buffer (e.g. a number) is parsed again with more data,
+        as it could continue in the next chunk.
+
+        :returns: Value.
+        """
+        self._peek()
+
+        while True:
+            try:
+                v, end = _decoder.raw_decode(self._buf, self._pos)
+
+                if end < len(self._buf) or self._eof:
+                    self._pos = end
+                    return v
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+
+            self._read()
+
+    def __iter__(self) -> Iterator[Any]:
+        """Parse the response data and get the items of the result list.
+
+        A `ValueError` exception is raised if the data isn't a valid JSON
+        object.
+
+        :returns: Iterator of the items.
+        """
+        self._expect("{")
+
+        if self._peek() == "}":
+            self._pos += 1
+            return
+
+        while True:
+            key = self._value()
+            self._expect(":")
+
+            if key == "result" and self._peek() == "[":
+                self.found = True
+                self._pos += 1
+
+                if self._peek() == "]":
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+
+                        if self._expect(",]") == "]":
+                            break
+            else:
+                self.fields[key] = self._value()
+
+            if self._expect(",}") == "}":
+                return
@@ -0,0 +1,69 @@
+"""Lazy command group module.
+
+The command modules import heavy dependencies (e.g. `requests`), so they are
+imported only when one of their commands is invoked instead of when the
+application starts.
+"""
+
+from importlib import import_module
+from typing import Optional
+
+from click import Command, Context, Group, HelpFormatter
+
+
+class LazyGroup(Group):
+    """Command group that imports its subcommands when they are needed."""
+
+    def __init__(self, *args, lazy_commands: dict = None, **kwargs):
+        """Initialize the instance.
+
+        :param lazy_commands: Subcommands. Each key is a subcommand name and
+        each value is a tuple containing the import path of the subcommand
+        object (e.g. "notelist_cli.note:note") and its short help text, which
+        is shown by the "--help" option without importing the subcommand.
+        """
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx: Context) -> list[str]:
+        """Get the subcommand names.
+
+        :param ctx: Context.
+        :returns: Subcommand names.
+        """
+        names = set(super().list_commands(ctx)) | set(self.lazy_commands)
+        return sorted(names)
+
+    def get_command(self, ctx: Context, name: str) -> Optional[Command]:
+        """Get a subcommand, importing it if it's a lazy subcommand.
+
+        :param ctx: Context.
+        :param name: Subcommand name.
+        :returns: Subcommand or `None` if it doesn't exist.
+        """
+        if name in self.lazy_commands and name not in self.commands:
+            mod, attr = self.lazy_commands[name][0].split(":")
+            self.add_command(getattr(import_module(mod), attr), name)
+
+        return super().get_command(ctx, name)
+
+    def format_commands(self, ctx: Context, formatter: HelpFormatter):
+        """Write the subcommands section of the help without importing them.
+
+        :param ctx: Context.
+        :param formatter: Help formatter.
+        """
+        rows = []
+
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+
+                if not cmd.hidden:
+                    rows.append((name, cmd.get_short_help_str()))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+
+        if len(rows) > 0:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
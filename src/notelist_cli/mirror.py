@@ -0,0 +1,352 @@
+"""Mirror module.
+
+The mirror is a local copy of the notebooks and notes of the current user,
+stored in the "mirror.db" SQLite database of the application directory. It's
+updated by the "sync" command and read by the commands run with the "--local"
+option. The database contains the full-text index of the records too (see the
+"index" module).
+
+The mirror belongs to the API URL and the user that it was synchronized with.
+It can't be read if the current API URL or user are different.
+"""
+
+import json
+import sqlite3
+from os import makedirs
+from os.path import exists, join
+from typing import Iterator, Optional
+
+from notelist_cli import index, settings
+
+
+# Settings and metadata keys
+api_url = "api_url"
+user_id = "user_id"
+
+# Database file
+db_path = join(settings.app_dir, "mirror.db")
+
+# Database schema
+schema = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS notebooks (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    tag_colors TEXT,
+    created TEXT,
+    last_modified TEXT
+);
+
+CREATE TABLE IF NOT EXISTS notes (
+    id TEXT PRIMARY KEY,
+    notebook_id TEXT NOT NULL,
+    archived INTEGER NOT NULL,
+    title TEXT,
+    body TEXT,
+    tags TEXT,
+    created TEXT,
+    last_modified TEXT
+);
+
+CREATE INDEX IF NOT EXISTS notes_notebook_id ON notes (notebook_id);
+"""
+
+# Columns
+notebook_cols = ("id", "name", "tag_colors", "created", "last_modified")
+note_cols = (
+    "id", "notebook_id", "archived", "title", "body", "tags", "created",
+    "last_modified"
+)
+
+# Error messages
+not_found_error = 'Local mirror not found. Please run "notelist-cli sync".'
+owner_error = (
+    "The local mirror belongs to another user or API URL. Please run "
+    '"notelist-cli sync".'
+)
+
+
+def connect(create: bool = False) -> sqlite3.Connection:
+    """Open the mirror database.
+
+    An `Exception` is raised if the database doesn't exist and `create` is
+    `False` or if `create` is `False` and the mirror belongs to another user or
+    API URL.
+
+    :param create: Whether to create the database if it doesn't exist or not.
+    If it's `True`, the database is opened to synchronize it and its owner
+    isn't checked.
+    :returns: Database connection.
+    """
+    if not create and not exists(db_path):
+        raise Exception(not_found_error)
+
+    makedirs(settings.app_dir, exist_ok=True)
+    con = sqlite3.connect(db_path)
+    con.executescript(schema)
+    con.executescript(index.schema)
+
+    # Mirrors created by a previous version don't have the index
+    if get_meta(con, "index_version") != index.version:
+        index.rebuild(con)
+        set_meta(con, "index_version", index.version)
+        con.commit()
+
+    if not create and (
+        get_meta(con, api_url) != settings.get(api_url) or
+        get_meta(con, user_id) != settings.get(user_id)
+    ):
+        con.close()
+        raise Exception(owner_error)
+
+    return con
+
+
+def get_meta(con: sqlite3.Connection, key: str) -> Optional[str]:
+    """Get a metadata value of the mirror.
+
+    :param con: Database connection.
+    :param key: Metadata key.
+    :returns: Value or `None` if the key doesn't exist.
+    """
+    r = con.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return None if r is None else r[0]
+
+
+def set_meta(con: sqlite3.Connection, key: str, value: str):
+    """Set a metadata value of the mirror.
+
+    :param con: Database connection.
+    :param key: Metadata key.
+    :param value: Value.
+    """
+    con.execute(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+    )
+
+
+def clear(con: sqlite3.Connection):
+    """Delete all the notebooks and notes of the mirror.
+
+    :param con: Database connection.
+    """
+    con.execute("DELETE FROM notes")
+    con.execute("DELETE FROM notebooks")
+    con.execute("DELETE FROM terms")
+
+
+def _get_notebook(row: tuple) -> dict:
+    """Get the data of a notebook from a database row.
+
+    :param row: Row.
+    :returns: Notebook data.
+    """
+    nb = dict(zip(notebook_cols, row))
+
+    if nb["tag_colors"] is None:
+        nb.pop("tag_colors")
+    else:
+        nb["tag_colors"] = json.loads(nb["tag_colors"])
+
+    return nb
+
+
+def _get_note(row: tuple, cols: tuple[str] = note_cols) -> dict:
+    """Get the data of a note from a database row.
+
+    :param row: Row.
+    :param cols: Row columns.
+    :returns: Note data.
+    """
+    n = dict(zip(cols, row))
+    n["archived"] = bool(n["archived"])
+
+    for k in ("title", "body"):
+        if k in n and n[k] is None:
+            n.pop(k)
+
+    if n["tags"] is None:
+        n.pop("tags")
+    else:
+        n["tags"] = json.loads(n["tags"])
+
+    return n
+
+
+def get_notebooks(con: sqlite3.Connection) -> list[dict]:
+    """Get all the notebooks.
+
+    :param con: Database connection.
+    :returns: Notebooks, sorted by name.
+    """
+    q = f"SELECT {', '.join(notebook_cols)} FROM notebooks ORDER BY name"
+    return [_get_notebook(r) for r in con.execute(q)]
+
+
+def get_notebook(con: sqlite3.Connection, _id: str) -> Optional[dict]:
+    """Get a notebook.
+
+    :param con: Database connection.
+    :param _id: Notebook ID.
+    :returns: Notebook data or `None` if the notebook isn't found.
+    """
+    q = f"SELECT {', '.join(notebook_cols)} FROM notebooks WHERE id = ?"
+    r = con.execute(q, (_id,)).fetchone()
+
+    return None if r is None else _get_notebook(r)
+
+
+def get_notes(
+    con: sqlite3.Connection, notebook_id: str,
+    archived: Optional[bool] = None, tags: Optional[list[str]] = None,
+    no_tags: bool = False, last_mod: bool = True, asc: bool = False
+) -> Iterator[dict]:
+    """Get the notes of a notebook that match a filter, without their body.
+
+    The filter works like the filter of the API note list endpoint.
+
+    :param con: Database connection.
+    :param notebook_id: Notebook ID.
+    :param archived: State of the notes (archived or active). If it's `None`,
+    the notes aren't filtered by their state.
+    :param tags: If it's not `None`, only the notes that have any of these
+    tags are returned.
+    :param no_tags: If `tags` is not `None`, whether to return the notes that
+    have no tags too or not.
+    :param last_mod: Whether to sort the notes by their last modified
+    date-time or by their created date-time.
+    :param asc: Whether the order is ascending or descending.
+    :returns: Iterator of notes.
+    """
+    cols = tuple(c for c in note_cols if c != "body")
+    q = f"SELECT {', '.join(cols)} FROM notes WHERE notebook_id = ?"
+    args = [notebook_id]
+
+    if archived is not None:
+        q += " AND archived = ?"
+        args.append(int(archived))
+
+    o = "last_modified" if last_mod else "created"
+    d = "ASC" if asc else "DESC"
+    q += f" ORDER BY {o} {d}"
+
+    tags = set(tags) if tags is not None else None
+
+    for r in con.execute(q, args):
+        n = _get_note(r, cols)
+
+        if tags is not None:
+            if len(n.get("tags") or []) == 0:
+                if not no_tags:
+                    continue
+            elif len(tags.intersection(n["tags"])) == 0:
+                continue
+
+        yield n
+
+
+def get_note(
+    con: sqlite3.Connection, _id: str, body: bool = True
+) -> Optional[dict]:
+    """Get a note.
+
+    :param con: Database connection.
+    :param _id: Note ID.
+    :param body: Whether to get the note body or not.
+    :returns: Note data or `None` if the note isn't found.
+    """
+    cols = note_cols if body else tuple(c for c in note_cols if c != "body")
+    q = f"SELECT {', '.join(cols)} FROM notes WHERE id = ?"
+    r = con.execute(q, (_id,)).fetchone()
+
+    return None if r is None else _get_note(r, cols)
+
+
+def get_versions(
+    con: sqlite3.Connection, table: str, notebook_id: Optional[str] = None
+) -> dict[str, str]:
+    """Get the "last_modified" value of each notebook or note.
+
+    :param con: Database connection.
+    :param table: "notebooks" or "notes".
+    :param notebook_id: If `table` is "notes", notebook ID of the notes.
+    :returns: Dictionary with the IDs as keys and the "last_modified" values
+    as values.
+    """
+    q = f"SELECT id, last_modified FROM {table}"
+    args = []
+
+    if notebook_id is not None:
+        q += " WHERE notebook_id = ?"
+        args.append(notebook_id)
+
+    return dict(con.execute(q, args).fetchall())
+
+
+def put_notebook(con: sqlite3.Connection, notebook: dict):
+    """Insert or update a notebook.
+
+    :param con: Database connection.
+    :param notebook: Notebook data.
+    """
+    tc = notebook.get("tag_colors")
+    values = dict(notebook, tag_colors=None if tc is None else json.dumps(tc))
+    q = (
+        f"INSERT OR REPLACE INTO notebooks ({', '.join(notebook_cols)}) "
+        f"VALUES ({', '.join('?' * len(notebook_cols))})"
+    )
+
+    con.execute(q, [values.get(c) for c in notebook_cols])
+    index.put_notebook(con, notebook)
+
+
+def put_note(con: sqlite3.Connection, note: dict):
+    """Insert or update a note.
+
+    :param con: Database connection.
+    :param note: Note data, including its body.
+    """
+    tags = note.get("tags")
+
+    values = dict(
+        note, archived=int(note.get("archived", False)),
+        tags=None if tags is None else json.dumps(tags)
+    )
+
+    q = (
+        f"INSERT OR REPLACE INTO notes ({', '.join(note_cols)}) "
+        f"VALUES ({', '.join('?' * len(note_cols))})"
+    )
+
+    con.execute(q, [values.get(c) for c in note_cols])
+    index.put_note(con, note)
+
+
+def delete_notebook(con: sqlite3.Connection, _id: str):
+    """Delete a notebook and its notes.
+
+    :param con: Database connection.
+    :param _id: Notebook ID.
+    """
+    q = "SELECT id FROM notes WHERE notebook_id = ?"
+
+    for (i,) in con.execute(q, (_id,)).fetchall():
+        index.remove(con, "note", i)
+
+    index.remove(con, "notebook", _id)
+    con.execute("DELETE FROM notes WHERE notebook_id = ?", (_id,))
+    con.execute("DELETE FROM notebooks WHERE id = ?", (_id,))
+
+
+def delete_note(con: sqlite3.Connection, _id: str):
+    """Delete a note.
+
+    :param con: Database connection.
+    :param _id: Note ID.
+    """
+    index.remove(con, "note", _id)
+    con.execute("DELETE FROM notes WHERE id = ?", (_id,))
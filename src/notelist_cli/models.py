@@ -0,0 +1,180 @@
+"""Models module.
+
+The notes, notebooks and users received from the API are held as compact
+record objects, with `__slots__`, instead of dictionaries. A dictionary keeps
+a hash table per record with the same keys in each one, so a large listing
+(e.g. the result of "note ls" for a notebook of 100000 notes) takes several
+times the memory of the same listing as record objects.
+
+The records are built from the decoded API data. The values are kept as they
+are received and they are only decoded further when they are used: the
+"created" and "last_modified" date-times are kept as text, which is what the
+printers show, and they are parsed into `datetime` objects only when they are
+compared (see `parse_datetime`). The bodies are JSON strings, so they are
+decoded with the rest of the response; the listings (e.g. "note ls") don't
+include them, so only the commands that show or export the bodies decode
+them.
+
+The fields that aren't in the API data aren't set, so a record has the same
+fields as the data it was built from. The fields of the API data that the
+record class doesn't define (e.g. the fields of a newer API version) are kept
+in a dictionary, so that the record keeps all the data it was built from
+(e.g. for the "json" output format).
+
+The records can be read like dictionaries (e.g. `note["id"]` or
+`note.get("title")`), so the printers and the cache work with both records and
+dictionaries.
+"""
+
+from datetime import datetime, timezone
+from typing import Any, Optional, Type
+
+
+def parse_datetime(value: str) -> datetime:
+    """Parse a date-time value of the API.
+
+    The date-times with a time zone are converted to UTC, without the time
+    zone, so that they can be compared with the date-times without a time
+    zone.
+
+    :param value: ISO 8601 date-time (e.g. "2021-05-01T10:00:00").
+    :returns: Date-time.
+    """
+    dt = datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+    return dt
+
+
+class Record:
+    """Record of the API."""
+
+    # Fields of the API data that aren't fields of the record, or `None` if
+    # there aren't any.
+    __slots__ = ("_extra",)
+
+    def __init__(self, data: dict):
+        """Initialize the instance.
+
+        :param data: Record data.
+        """
+        fields = self.__slots__
+        extra = None
+
+        for k, v in data.items():
+            if k in fields:
+                setattr(self, k, v)
+            else:
+                if extra is None:
+                    extra = {}
+
+                extra[k] = v
+
+        self._extra = extra
+
+    def __repr__(self) -> str:
+        """Get the representation of the record.
+
+        :returns: Representation.
+        """
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+    def __getitem__(self, key: str) -> Any:
+        """Get the value of a field.
+
+        A `KeyError` exception is raised if the field isn't set.
+
+        :param key: Field name.
+        :returns: Value.
+        """
+        if key in self.__slots__:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        elif self._extra is not None and key in self._extra:
+            return self._extra[key]
+
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        """Return whether a field is set or not.
+
+        :param key: Field name.
+        :returns: `True` if the field is set or `False` otherwise.
+        """
+        if key in self.__slots__:
+            return hasattr(self, key)
+
+        return self._extra is not None and key in self._extra
+
+    def get(self, key: str, default: Optional[Any] = None) -> Optional[Any]:
+        """Get the value of a field or a default value if it isn't set.
+
+        :param key: Field name.
+        :param default: Value to return if the field isn't set.
+        :returns: Field value if the field is set or `default` otherwise.
+        """
+        if key in self.__slots__:
+            return getattr(self, key, default)
+
+        if self._extra is not None:
+            return self._extra.get(key, default)
+
+        return default
+
+    def to_dict(self) -> dict:
+        """Get the data of the record.
+
+        :returns: Dictionary with the fields that are set, including the
+        fields of the API data that the record class doesn't define.
+        """
+        d = {k: getattr(self, k) for k in self.__slots__ if hasattr(self, k)}
+
+        if self._extra is not None:
+            d.update(self._extra)
+
+        return d
+
+
+class Note(Record):
+    """Note."""
+
+    __slots__ = (
+        "id", "notebook_id", "archived", "title", "body", "tags", "created",
+        "last_modified"
+    )
+
+
+class Notebook(Record):
+    """Notebook."""
+
+    __slots__ = ("id", "name", "tag_colors", "created", "last_modified")
+
+
+class User(Record):
+    """User."""
+
+    __slots__ = (
+        "id", "username", "admin", "enabled", "name", "email", "created",
+        "last_modified"
+    )
+
+
+def to_records(cls: Type[Record], data: list[dict]) -> list[Record]:
+    """Replace the items of a list of dictionaries by records.
+
+    The list is changed in place, so each dictionary can be released as soon
+    as its record is built and both representations of the whole list aren't
+    held in memory at the same time.
+
+    :param cls: Record class.
+    :param data: List of dictionaries.
+    :returns: The same list, with records as items.
+    """
+    for i, d in enumerate(data):
+        data[i] = cls(d)
+
+    return data
@@ -1,23 +1,50 @@
 """Note module."""
 
 import sys
-from typing import Optional
-
-from click import group, option, confirmation_option, echo
+import csv
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime
+from os.path import exists, realpath, splitext
+from typing import Callable, Iterable, Iterator, Optional
+
+from click import (
+    group, option, confirmation_option, confirm, echo, open_file, Abort,
+    Choice, DateTime, Path
+)
 
-from notelist_cli.auth import request, check_response
+from notelist_cli import cache, mirror, output
+from notelist_cli.aio import acall, aget_result, gather, run
+from notelist_cli.auth import (
+    ApiResponse, request, request_items, check_response
+)
+from notelist_cli.models import Note, to_records
+from notelist_cli.output import (
+    Column, note_fields, print_record, print_records, print_table
+)
+from notelist_cli.transport import FileText, get_retry_text
+from notelist_cli.workers import def_workers, imap
 
 
 # Endpoints
-notebook_ep = "/notebooks/notebook"
 notes_ep = "/notes/notes"
 note_ep = "/notes/note"
 
 # Option descriptions
 des_notebook = "Notebook ID."
 des_note = "Note ID."
+des_get_note = "Note ID. It can be specified more than once."
 des_title = "Title."
 des_body = "Body."
+des_body_file = (
+    'UTF-8 file to read the body from ("-" for stdin), instead of "--body". '
+    "The file is sent without loading it into memory at once."
+)
 des_tags = 'Comma separated tags. E.g. "tag1,tag2".'
 des_asc = "Whether the order is ascending or descending."
 des_arc = "Whether the note is archived or not."
@@ -33,9 +60,44 @@ des_ls_last_mod = (
     "Whether to sort the notes by their Last Modified date-time or by their "
     "Created date-time."
 )
+des_local = (
+    'Get the data from the local mirror (see "notelist-cli sync") instead of '
+    "from the API."
+)
+des_imp_file = 'JSONL or CSV file to import the notes from ("-" for stdin).'
+des_imp_type = (
+    'File type ("jsonl" or "csv"). By default, it\'s deduced from the file '
+    'extension.'
+)
+des_imp_nid = "Notebook ID of the notes that don't have a notebook ID."
+des_workers = "Maximum number of concurrent requests."
+des_imp_failures = (
+    "File to write the notes that couldn't be imported to, in JSONL format. "
+    'It can be imported again with "notelist-cli note import". By default, '
+    'it\'s the import file path followed by ".failures.jsonl" and, if all '
+    "the notes are imported, the file of a previous import is removed."
+)
+des_blk_arc = (
+    "Filter notes by their state (archived/active). By default, the notes "
+    "aren't filtered by their state."
+)
+des_blk_dry_run = "Show the notes that would be changed without changing them."
+des_blk_yes = "Don't ask for confirmation."
+des_blk_report = "JSONL file to write the result of each note to."
+des_blk_add_tags = 'Comma separated tags to add. E.g. "tag1,tag2".'
+des_blk_rm_tags = 'Comma separated tags to remove. E.g. "tag1,tag2".'
+des_blk_to = "Destination notebook ID."
+
+# Import file fields
+imp_fields = ("notebook_id", "title", "body", "tags", "archived")
 
 # Messages
 del_confirm = "Are you sure that you want to delete the note?"
+not_changed = "Note not changed."
+
+# Error messages
+body_error = '"--body" and "--bodyfile" can\'t be used together.'
+failures_error = '"--failures" can\'t be the import file.'
 
 
 def get_ls_header() -> str:
@@ -46,37 +108,22 @@ def get_ls_header() -> str:
     return "ID" + (" " * 31) + "| Title" + (" " * 36) + "| Tags\n"
 
 
-def get_ls_note_line(note: dict) -> str:
-    """Get a string representing a note in the Note Ls command.
+def get_tags(note: dict) -> Optional[str]:
+    """Get the tags of a note as a comma separated string.
 
     :param note: Note data.
-    :returns: Note string.
+    :returns: Tags or `None` if the note doesn't have the "tags" field.
     """
-    line = note["id"] + " | "
-    title = note.get("title", "Untitled")
     tags = note.get("tags")
+    return None if tags is None else ", ".join(tags)
 
-    c = len(title)
-
-    if c <= 40:
-        title = title + (" " * (40 - c))
-    else:
-        title = f"{title[:37]}..."
 
-    line += title + " | "
-
-    if tags is not None:
-        tags = ", ".join(tags)
-        c = len(tags)
-
-        if c <= 40:
-            tags = tags + (" " * (40 - c))
-        else:
-            tags = f"{tags[:37]}..."
-
-        line += tags
-
-    return line
+# Note Ls command columns
+ls_columns = [
+    Column(lambda n: n["id"]),
+    Column(lambda n: n.get("title", "Untitled"), 40),
+    Column(get_tags, 40)
+]
 
 
 @group()
@@ -85,15 +132,60 @@ def note():
     pass
 
 
-def print_notes(notes: list[dict]):
+def print_notes(notes: Iterable[dict]) -> int:
     """Print a note list.
 
     :param notes: Notes.
+    :returns: Number of notes printed.
     """
-    echo(get_ls_header())
+    return print_table(get_ls_header(), ls_columns, notes)
 
-    for n in notes:
-        echo(get_ls_note_line(n))
+
+def get_local_notes(nid: str, data: dict) -> Iterator[dict]:
+    """Get the notes of a notebook that match a filter from the local mirror.
+
+    An `Exception` is raised if the notebook isn't found.
+
+    :param nid: Notebook ID.
+    :param data: Filter, with the same fields as the API request data.
+    :returns: Iterator of notes.
+    """
+    con = mirror.connect()
+
+    try:
+        if mirror.get_notebook(con, nid) is None:
+            raise Exception("Notebook not found in the local mirror.")
+    except Exception:
+        con.close()
+        raise
+
+    # The database connection is closed when the notes have been read
+    def get_notes() -> Iterator[dict]:
+        with closing(con):
+            yield from mirror.get_notes(
+                con, nid, data["archived"], data.get("tags"),
+                data.get("no_tags", False), data["last_mod"], data["asc"]
+            )
+
+    return get_notes()
+
+
+def get_api_notes(ep: str, data: dict) -> Iterator[Note]:
+    """Get the notes of a notebook that match a filter from the API.
+
+    The notes are returned as they are received, so they can be printed
+    before the whole response is received. The cached notes that have been
+    modified are removed from the cache.
+
+    :param ep: Note list endpoint of the notebook.
+    :param data: Filter.
+    :returns: Iterator of notes.
+    """
+    for n in request_items("POST", ep, data, True):
+        n = Note(n)
+        cache.validate("note", (n,))
+
+        yield n
 
 
 @note.command()
@@ -103,9 +195,10 @@ def print_notes(notes: list[dict]):
 @option("--notags", default=False, help=des_ls_no_tags)
 @option("--lastmod", default=True, help=des_ls_last_mod)
 @option("--asc", default=False, help=des_asc)
+@option("--local", is_flag=True, help=des_local)
 def ls(
     nid: str, archived: bool, tags: Optional[str], notags: bool, lastmod: bool,
-    asc: bool
+    asc: bool, local: bool
 ):
     """List all the notes of a notebook that match a filter."""
     ep = f"{notes_ep}/{nid}"
@@ -124,19 +217,18 @@ def ls(
         data["no_tags"] = notags
 
     try:
-        r = request("POST", ep, True, data=data)
-        check_response(r)
-
-        d = r.json()
-        notes = d.get("result")
+        if local:
+            notes = get_local_notes(nid, data)
+        else:
+            notes = get_api_notes(ep, data)
 
-        if notes is None:
-            raise Exception("Data not received.")
+        if output.fmt != "table":
+            print_records(notes, note_fields)
+            return
 
-        c = len(notes)
+        c = print_notes(notes)
 
         if c > 0:
-            print_notes(notes)
             echo()
 
         s = "s" if c != 1 else ""
@@ -145,77 +237,131 @@ def ls(
         sys.exit(f"Error: {e}")
 
 
-@note.command()
-@option("--id", required=True, help=des_note)
-def get(id: str):
-    """Get a note."""
-    try:
-        # Get note
-        ep = f"{note_ep}/{id}"
-        r = request("GET", ep, True)
-        check_response(r)
+def print_note(note: dict, nb_name: str):
+    """Print a note.
+
+    :param note: Note data.
+    :param nb_name: Notebook name.
+    """
+    _id = note["id"]
+    nb_id = note["notebook_id"]
+    archived = "Yes" if note["archived"] else "No"
+    title = note.get("title")
+    tags = note.get("tags")
+    created = note["created"].replace("T", " ")
+    last_mod = note["last_modified"].replace("T", " ")
+    body = note.get("body")
 
-        d = r.json()
-        res = d.get("result")
+    echo("ID:" + (" " * 12) + _id)
+    echo("Notebook ID:" + (" " * 3) + nb_id)
+    echo(f"Notebook name: {nb_name}")
+    echo("Archived:" + (" " * 6) + archived)
 
-        if res is None:
-            raise Exception("Data not received.")
+    if title is not None:
+        echo("Title:" + (" " * 9) + title)
 
-        _id = res["id"]
-        nb_id = res["notebook_id"]
-        archived = "Yes" if res["archived"] else "No"
-        title = res.get("title")
-        tags = res.get("tags")
-        created = res["created"].replace("T", " ")
-        last_mod = res["last_modified"].replace("T", " ")
-        body = res.get("body")
+    if tags is not None:
+        tags = ", ".join(tags)
+        echo("Tags:" + (" " * 10) + tags)
 
-        # Get notebook name
-        ep = f"{notebook_ep}/{nb_id}"
-        r = request("GET", ep, True)
-        check_response(r)
+    echo("Created:" + (" " * 7) + created)
+    echo(f"Last modified: {last_mod}")
 
-        d = r.json()
-        res = d.get("result")
+    if body is not None:
+        echo("\n" + body)
 
-        if res is None:
-            raise Exception("Data not received.")
 
-        nb_name = res["name"]
+async def get_notes(ids: tuple[str]) -> list[tuple[dict, str]]:
+    """Get some notes and the names of their notebooks concurrently.
 
-        # Print note
-        echo("ID:" + (" " * 12) + _id)
-        echo("Notebook ID:" + (" " * 3) + nb_id)
-        echo(f"Notebook name: {nb_name}")
-        echo("Archived:" + (" " * 6) + archived)
+    :param ids: Note IDs.
+    :returns: List of tuples containing the data and the notebook name of each
+    note.
+    """
+    notes = await gather(*(aget_result("GET", f"{note_ep}/{i}") for i in ids))
+    to_records(Note, notes)
+
+    for n in notes:
+        cache.put("note", n)
+
+    # Get the names of the notebooks (each notebook only once)
+    nb_ids = list(dict.fromkeys(n["notebook_id"] for n in notes))
+    nbs = await gather(*(acall(cache.fetch, "notebook", i) for i in nb_ids))
+    names = {i: nb["name"] for i, nb in zip(nb_ids, nbs)}
+
+    return [(n, names[n["notebook_id"]]) for n in notes]
 
-        if title is not None:
-            echo("Title:" + (" " * 9) + title)
 
-        if tags is not None:
-            tags = ", ".join(tags)
-            echo("Tags:" + (" " * 10) + tags)
+def get_local_notes_by_id(ids: tuple[str]) -> list[tuple[dict, str]]:
+    """Get some notes and the names of their notebooks from the local mirror.
+
+    An `Exception` is raised if any note isn't found.
+
+    :param ids: Note IDs.
+    :returns: List of tuples containing the data and the notebook name of each
+    note.
+    """
+    notes = []
 
-        echo("Created:" + (" " * 7) + created)
-        echo(f"Last modified: {last_mod}")
+    with closing(mirror.connect()) as con:
+        for i in ids:
+            n = mirror.get_note(con, i)
 
-        if body is not None:
-            echo("\n" + body)
+            if n is None:
+                raise Exception("Note not found in the local mirror.")
+
+            nb = mirror.get_notebook(con, n["notebook_id"])
+            notes.append((n, nb["name"] if nb is not None else ""))
+
+    return notes
+
+
+@note.command()
+@option("--id", required=True, multiple=True, help=des_get_note)
+@option("--local", is_flag=True, help=des_local)
+def get(id: tuple[str], local: bool):
+    """Get one or more notes.
+
+    In the "json" format, a single note is printed as an object and several
+    notes as an array.
+    """
+    try:
+        if local:
+            notes = get_local_notes_by_id(id)
+        else:
+            notes = run(get_notes(id))
+
+        # A single note is printed as an object and several notes as a list
+        if output.fmt != "table" and len(notes) == 1:
+            print_record(notes[0][0], note_fields)
+            return
+
+        if output.fmt != "table":
+            print_records([n for n, _ in notes], note_fields)
+            return
+
+        for i, (n, nb_name) in enumerate(notes):
+            if i > 0:
+                echo()
+
+            print_note(n, nb_name)
     except Exception as e:
         sys.exit(f"Error: {e}")
 
 
-@note.command()
-@option("--nid", required=True, help=des_notebook)
-@option("--archived", type=bool, help=des_arc)
-@option("--title", help=des_title)
-@option("--body", help=des_body)
-@option("--tags", help=des_tags)
-def create(
-    nid: str, archived: bool, title: Optional[str], body: Optional[str],
-    tags: Optional[str]
-):
-    """Create a note."""
+def get_create_data(
+    nid: str, archived: Optional[bool] = None, title: Optional[str] = None,
+    body: Optional[str] = None, tags: Optional[str] = None
+) -> dict:
+    """Get the request data to create a note.
+
+    :param nid: Notebook ID.
+    :param archived: Whether the note is archived or not.
+    :param title: Title.
+    :param body: Body.
+    :param tags: Comma separated tags.
+    :returns: Request data.
+    """
     data = {"notebook_id": nid}
 
     if archived is not None:
@@ -231,11 +377,66 @@ def create(
         tags = tags.replace(" ", "").split(",")
         data["tags"] = tags
 
+    return data
+
+
+@contextmanager
+def open_body_file(path: Optional[str]) -> Iterator[Optional[FileText]]:
+    """Open a body file.
+
+    The standard input is copied to a temporary file first, so the body can
+    be read more than once (e.g. if the request is retried).
+
+    :param path: File path ("-" for stdin) or `None`.
+    :returns: Body text or `None` if `path` is `None`.
+    """
+    if path is None:
+        yield None
+    elif path == "-":
+        with tempfile.TemporaryFile() as f:
+            shutil.copyfileobj(sys.stdin.buffer, f)
+            yield FileText(f)
+    else:
+        with open(path, "rb") as f:
+            yield FileText(f)
+
+
+def get_body_hash(body: Optional[str]) -> str:
+    """Get the SHA-256 hash of a note body.
+
+    :param body: Body.
+    :returns: Hexadecimal hash, as in `FileText.get_hash`.
+    """
+    return hashlib.sha256((body or "").encode("utf-8")).hexdigest()
+
+
+@note.command()
+@option("--nid", required=True, help=des_notebook)
+@option("--archived", type=bool, help=des_arc)
+@option("--title", help=des_title)
+@option("--body", help=des_body)
+@option("--bodyfile", type=Path(dir_okay=False), help=des_body_file)
+@option("--tags", help=des_tags)
+def create(
+    nid: str, archived: bool, title: Optional[str], body: Optional[str],
+    bodyfile: Optional[str], tags: Optional[str]
+):
+    """Create a note."""
+    if body is not None and bodyfile is not None:
+        sys.exit(f"Error: {body_error}")
+
+    data = get_create_data(nid, archived, title, body, tags)
+
     try:
-        r = request("POST", note_ep, True, data)
+        with open_body_file(bodyfile) as text:
+            if text is not None:
+                data["body"] = text
+
+            r = request("POST", note_ep, True, data)
+
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -249,12 +450,32 @@ def create(
 @option("--archived", type=bool, help=des_arc)
 @option("--title", help=des_title)
 @option("--body", help=des_body)
+@option("--bodyfile", type=Path(dir_okay=False), help=des_body_file)
 @option("--tags", help=des_tags)
+@option(
+    "--ifunmodsince", type=DateTime(cache.since_formats),
+    help=cache.des_if_unmod_since
+)
+@option(
+    "--onconflict", type=Choice(cache.conflict_strategies),
+    help=cache.des_on_conflict
+)
+@option("--usecache", is_flag=True, help=cache.des_use_cache)
 def update(
     id: str, nid: str, archived: Optional[bool], title: Optional[str],
-    body: Optional[str], tags: Optional[str]
+    body: Optional[str], bodyfile: Optional[str], tags: Optional[str],
+    ifunmodsince: Optional[datetime], onconflict: Optional[str],
+    usecache: bool
 ):
-    """Update a note."""
+    """Update a note.
+
+    If the body is read from a file and neither the body nor any other field
+    would change, the note isn't updated. The body is compared through its
+    hash.
+    """
+    if body is not None and bodyfile is not None:
+        sys.exit(f"Error: {body_error}")
+
     data = {}
 
     if nid is not None:
@@ -274,32 +495,18 @@ def update(
         data["tags"] = tags
 
     try:
-        if len(data) == 0:
-            raise Exception("No options specified. At least one is required.")
+        with open_body_file(bodyfile) as text:
+            r = update_note_data(
+                id, data, text, ifunmodsince, onconflict, usecache
+            )
 
-        # Get current data
-        ep = f"{note_ep}/{id}"
+        if r is None:
+            echo(not_changed)
+            return
 
-        r = request("GET", ep, True)
         check_response(r)
-        note = r.json().get("result")
-
-        if note is None:
-            raise Exception("Data not received.")
 
-        # Get the fields that won't be updated. For the API update request, all
-        # fields are required.
-        for k in ("notebook_id", "archived", "title", "body", "tags"):
-            if k in data and data[k] == "":
-                data.pop(k)
-            elif k not in data and k in note:
-                data[k] = note[k]
-
-        # Update note
-        r = request("PUT", ep, True, data)
-        check_response(r)
-
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -307,6 +514,88 @@ def update(
         sys.exit(f"Error: {e}")
 
 
+def is_unchanged(note: dict, data: dict) -> bool:
+    """Return whether an update would leave a note unchanged or not.
+
+    The tags are compared regardless of their order and duplicates.
+
+    :param note: Current note data.
+    :param data: New values of the fields ("" to remove the value).
+    :returns: `True` if the note wouldn't change or `False` otherwise.
+    """
+    for k, v in data.items():
+        current = note.get(k)
+
+        if k == "tags":
+            v = sorted(set(v or []))
+            current = sorted(set(current or []))
+        elif v == "":
+            v = None
+
+        if v != current:
+            return False
+
+    return True
+
+
+def update_note_data(
+    _id: str, data: dict, text: Optional[FileText],
+    since: Optional[datetime] = None, on_conflict: Optional[str] = None,
+    use_cache: bool = False
+) -> Optional[ApiResponse]:
+    """Update a note with the values of the options of the Update command.
+
+    :param _id: Note ID.
+    :param data: New values of the fields ("" to remove the value).
+    :param text: New body, read from a file, or `None`.
+    :param since: Date-time for the "--ifunmodsince" option.
+    :param on_conflict: Conflict strategy for the "--onconflict" option.
+    :param use_cache: Whether to use the cached note as the current data of
+    the note or not ("--usecache" option).
+    :returns: Request response or `None` if the note wasn't updated because
+    it wouldn't change.
+    """
+    keys = ("notebook_id", "archived", "title", "body", "tags")
+
+    if text is not None:
+        data["body"] = text if text.get_size() > 0 else ""
+
+    if len(data) == 0:
+        raise Exception("No options specified. At least one is required.")
+
+    # Get current data, from the API unless "--usecache" is set (see
+    # `cache.fetch_for_update`)
+    note = cache.fetch_for_update(
+        "note", _id, since, on_conflict, data, use_cache
+    )
+
+    # If the body file has the current body, the current body is sent instead
+    # of the file.
+    if isinstance(data.get("body"), FileText):
+        if text.get_hash() == get_body_hash(note.get("body")):
+            data["body"] = note.get("body")
+
+    # If the body is read from a file, the note isn't updated if nothing
+    # changes.
+    if text is not None and not isinstance(data.get("body"), FileText):
+        if is_unchanged(note, data):
+            return None
+
+    # Get the fields that won't be updated. For the API update request, all
+    # fields are required.
+    for k in keys:
+        if k in data and data[k] == "":
+            data.pop(k)
+        elif k not in data and k in note:
+            data[k] = note[k]
+
+    # Update note
+    r = request("PUT", f"{note_ep}/{_id}", True, data)
+    cache.delete("note", _id)
+
+    return r
+
+
 @note.command()
 @option("--id", required=True, help=des_note)
 @confirmation_option(prompt=del_confirm)
@@ -315,11 +604,457 @@ def delete(id: str):
     try:
         ep = f"{note_ep}/{id}"
         r = request("DELETE", ep, True)
+        cache.delete("note", id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
     except Exception as e:
         sys.exit(f"Error: {e}")
+
+
+def read_import_file(path: str, _type: str) -> Iterator[tuple[int, object]]:
+    """Read the records of a note import file lazily.
+
+    :param path: File path ("-" for stdin).
+    :param _type: File type ("jsonl" or "csv").
+    :returns: Iterator of tuples containing the line (JSONL) or row (CSV)
+    number and the record (a string for JSONL or a dictionary for CSV).
+    """
+    with open_file(path, encoding="utf-8") as f:
+        if _type == "csv":
+            yield from enumerate(csv.DictReader(f), 1)
+        else:
+            for i, line in enumerate(f, 1):
+                if line.strip() != "":
+                    yield i, line
+
+
+def get_import_data(record: object, nid: Optional[str] = None) -> dict:
+    """Get the request data to create a note from an import file record.
+
+    An `Exception` is raised if the record is invalid.
+
+    :param record: Record (a JSON string or a dictionary).
+    :param nid: Notebook ID to use if the record doesn't have one.
+    :returns: Request data.
+    """
+    if isinstance(record, str):
+        record = json.loads(record)
+
+    if not isinstance(record, dict):
+        raise Exception("Invalid record.")
+
+    # Empty values (e.g. empty CSV cells) are considered as not set
+    rec = {
+        k: record[k] for k in imp_fields
+        if record.get(k) is not None and record[k] != ""
+    }
+
+    nid = rec.get("notebook_id", nid)
+
+    if nid is None:
+        raise Exception("Notebook ID not found.")
+
+    archived = rec.get("archived")
+
+    if isinstance(archived, str):
+        v = archived.strip().lower()
+
+        if v not in ("true", "false", "yes", "no", "1", "0"):
+            raise Exception(f'"archived" is invalid: {archived}.')
+
+        archived = v in ("true", "yes", "1")
+
+    tags = rec.get("tags")
+
+    # The tags of a CSV record can be a JSON array, like in the CSV output
+    if isinstance(tags, str) and tags.lstrip().startswith("["):
+        try:
+            tags = json.loads(tags)
+        except ValueError:
+            raise Exception(f'"tags" is invalid: {tags}.')
+
+        if not isinstance(tags, list):
+            raise Exception(f'"tags" is invalid: {tags}.')
+
+    if isinstance(tags, list):
+        tags = ",".join(tags)
+
+    return get_create_data(
+        nid, archived, rec.get("title"), rec.get("body"), tags
+    )
+
+
+@note.command("import")
+@option("--file", "path", required=True, help=des_imp_file)
+@option("--type", "_type", type=Choice(("jsonl", "csv")), help=des_imp_type)
+@option("--nid", help=des_imp_nid)
+@option("--workers", type=int, default=def_workers, help=des_workers)
+@option("--failures", type=Path(dir_okay=False), help=des_imp_failures)
+def import_(
+    path: str, _type: Optional[str], nid: Optional[str], workers: int,
+    failures: Optional[str]
+):
+    """Import notes from a JSONL or CSV file.
+
+    Each record can have the "notebook_id", "title", "body", "tags" and
+    "archived" fields. In CSV files, the first row contains the field names and
+    the tags are comma separated or a JSON array (like in the CSV output).
+    """
+    if _type is None:
+        _type = "csv" if splitext(path)[1].lower() == ".csv" else "jsonl"
+
+    # The failures file of a previous import is only removed if it's the
+    # default one, as the "--failures" file could contain other data.
+    default = failures is None
+
+    if default:
+        failures = "import" if path == "-" else path
+        failures += ".failures.jsonl"
+    elif path != "-" and realpath(failures) == realpath(path):
+        sys.exit(f"Error: {failures_error}")
+
+    def create_note(item: tuple[int, object]):
+        data = get_import_data(item[1], nid)
+        r = request("POST", note_ep, True, data)
+        check_response(r)
+
+    try:
+        start = time.perf_counter()
+        records = read_import_file(path, _type)
+        imported = 0
+        failed = 0
+        f = None
+
+        try:
+            for (i, rec), _, e in imap(create_note, records, workers):
+                if e is None:
+                    imported += 1
+                    continue
+
+                failed += 1
+
+                if not isinstance(rec, dict):
+                    try:
+                        rec = json.loads(rec)
+                    except ValueError:
+                        rec = {"raw": rec.rstrip("\n")}
+
+                    if not isinstance(rec, dict):
+                        rec = {"raw": rec}
+
+                if f is None:
+                    f = open(failures, "w", encoding="utf-8")
+
+                rec = dict(rec, line=i, error=str(e))
+                f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+        finally:
+            if f is not None:
+                f.close()
+
+        # Remove the failures of a previous import, which are no longer valid
+        if f is None and default and exists(failures):
+            os.remove(failures)
+
+        # Summary
+        t = time.perf_counter() - start
+        rate = imported / t if t > 0 else 0
+        s = "s" if imported != 1 else ""
+
+        echo(
+            f"{imported} note{s} imported, {failed} failed{get_retry_text()} "
+            f"in {t:.2f} seconds ({rate:.1f} notes/second)"
+        )
+
+        if failed > 0:
+            s = "s" if failed != 1 else ""
+            raise Exception(
+                f'{failed} note{s} not imported. See "{failures}".'
+            )
+    except Exception as e:
+        sys.exit(f"Error: {e}")
+
+
+@note.group()
+def bulk():
+    """Change all the notes of a notebook that match a filter."""
+    pass
+
+
+def bulk_options(func: Callable) -> Callable:
+    """Add the common options of the Bulk commands to a command function.
+
+    :param func: Command function.
+    :returns: Command function.
+    """
+    options = [
+        option("--nid", required=True, help=des_notebook),
+        option("--archived", type=bool, help=des_blk_arc),
+        option("--tags", help=des_ls_tags),
+        option("--notags", default=False, help=des_ls_no_tags),
+        option("--dryrun", is_flag=True, help=des_blk_dry_run),
+        option("--yes", is_flag=True, help=des_blk_yes),
+        option("--workers", type=int, default=def_workers, help=des_workers),
+        option("--report", type=Path(dir_okay=False), help=des_blk_report)
+    ]
+
+    for o in reversed(options):
+        func = o(func)
+
+    return func
+
+
+def get_tag_list(tags: str) -> list[str]:
+    """Get the tags of a comma separated list.
+
+    :param tags: Comma separated tags.
+    :returns: Tags.
+    """
+    tags = tags.replace(" ", "")
+    return tags.split(",") if tags != "" else []
+
+
+def get_bulk_notes(
+    nid: str, archived: Optional[bool], tags: Optional[str], notags: bool
+) -> list[dict]:
+    """Get the notes of a notebook that match a filter, without their body.
+
+    :param nid: Notebook ID.
+    :param archived: State of the notes. If it's `None`, the notes aren't
+    filtered by their state.
+    :param tags: Comma separated tags to filter the notes with.
+    :param notags: Whether to get the notes with no tags too or not.
+    :returns: Notes.
+    """
+    data = {"last_mod": True, "asc": False}
+
+    if archived is not None:
+        data["archived"] = archived
+
+    if tags is not None:
+        data["tags"] = get_tag_list(tags)
+        data["no_tags"] = notags
+
+    r = request("POST", f"{notes_ep}/{nid}", True, data, idempotent=True)
+    check_response(r)
+    notes = r.result
+
+    if notes is None:
+        raise Exception("Data not received.")
+
+    to_records(Note, notes)
+
+    # The cached notes that have been modified are removed, so the rest of the
+    # cached notes can be used as the current data of the notes to update.
+    cache.validate("note", notes)
+
+    return notes
+
+
+def update_note(_id: str, changes: dict):
+    """Update some fields of a note.
+
+    :param _id: Note ID.
+    :param changes: New values of the fields.
+    """
+    # Unlike the Update command (see `cache.fetch_for_update`), the cached
+    # note can be used here: `get_bulk_notes` has just received the
+    # "last_modified" value of each note from the API and `cache.validate`
+    # has expired the cached notes that don't match it, so a cached note that
+    # hasn't expired is as up to date as the list. A note modified by another
+    # client after the list was received would be overwritten with a GET
+    # request too, as the API doesn't support conditional updates.
+    note = cache.fetch("note", _id)
+    keys = ("notebook_id", "archived", "title", "body", "tags")
+    data = {k: note[k] for k in keys if k in note}
+    data.update(changes)
+
+    r = request("PUT", f"{note_ep}/{_id}", True, data)
+    cache.delete("note", _id)
+    check_response(r)
+
+
+def delete_note(_id: str, changes: dict):
+    """Delete a note.
+
+    :param _id: Note ID.
+    :param changes: Not used.
+    """
+    r = request("DELETE", f"{note_ep}/{_id}", True)
+    cache.delete("note", _id)
+    check_response(r)
+
+
+def run_bulk(
+    verb: str, get_changes: Callable[[dict], Optional[dict]], nid: str,
+    archived: Optional[bool], tags: Optional[str], notags: bool,
+    dryrun: bool, yes: bool, workers: int, report: Optional[str],
+    func: Callable[[str, dict], None] = update_note
+):
+    """Run a Bulk command.
+
+    The notes that match the filter and that would be changed are printed if
+    `dryrun` is `True`. Otherwise, they are changed concurrently after asking
+    for confirmation, the progress is printed to the standard error (if it's a
+    terminal) and the result of each note is written to the report file.
+
+    :param verb: Past participle of the action (e.g. "archived").
+    :param get_changes: Function that gets the new values of the fields of a
+    note or `None` if the note wouldn't be changed.
+    :param nid: Notebook ID.
+    :param archived: State filter.
+    :param tags: Tag filter.
+    :param notags: No tags filter.
+    :param dryrun: Whether to only print the notes that would be changed.
+    :param yes: Whether to skip the confirmation or not.
+    :param workers: Maximum number of concurrent requests.
+    :param report: Report file path.
+    :param func: Function that changes a note given its ID and the changes.
+    """
+    try:
+        notes = []
+
+        for n in get_bulk_notes(nid, archived, tags, notags):
+            changes = get_changes(n)
+
+            if changes is not None:
+                notes.append((n, changes))
+
+        c = len(notes)
+        s = "s" if c != 1 else ""
+
+        if dryrun:
+            if output.fmt != "table":
+                print_records([n for n, _ in notes], note_fields)
+                return
+
+            if print_notes(n for n, _ in notes) > 0:
+                echo()
+
+            echo(f"{c} note{s} would be {verb}")
+            return
+
+        if c == 0:
+            echo(f"0 notes {verb}")
+            return
+
+        if not yes:
+            confirm(f"{c} note{s} will be {verb}. Continue?", abort=True)
+
+        start = time.perf_counter()
+        progress = sys.stderr.isatty()
+        done = 0
+        failed = 0
+        f = open(report, "w", encoding="utf-8") if report else None
+
+        try:
+            items = [(n["id"], ch) for n, ch in notes]
+
+            for (i, _), _, e in imap(lambda x: func(*x), items, workers):
+                done += 1
+
+                if e is not None:
+                    failed += 1
+
+                if f is not None:
+                    rec = {"id": i, "result": "ok" if e is None else "error"}
+
+                    if e is not None:
+                        rec["error"] = str(e)
+
+                    f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+                if progress:
+                    echo(f"\r{done}/{c}", nl=False, err=True)
+        finally:
+            if progress:
+                echo(err=True)
+
+            if f is not None:
+                f.close()
+
+        # Summary
+        t = time.perf_counter() - start
+        ok = done - failed
+        s = "s" if ok != 1 else ""
+
+        echo(
+            f"{ok} note{s} {verb}, {failed} failed{get_retry_text()} in "
+            f"{t:.2f} seconds"
+        )
+
+        if failed > 0:
+            s = "s" if failed != 1 else ""
+            m = f"{failed} note{s} not {verb}."
+
+            if report:
+                m += f' See "{report}".'
+
+            raise Exception(m)
+    except Abort:
+        raise
+    except Exception as e:
+        sys.exit(f"Error: {e}")
+
+
+@bulk.command()
+@bulk_options
+def archive(**kwargs):
+    """Archive the notes of a notebook that match a filter."""
+    run_bulk(
+        "archived", lambda n: None if n["archived"] else {"archived": True},
+        **kwargs
+    )
+
+
+@bulk.command()
+@bulk_options
+def unarchive(**kwargs):
+    """Unarchive the notes of a notebook that match a filter."""
+    run_bulk(
+        "unarchived",
+        lambda n: {"archived": False} if n["archived"] else None, **kwargs
+    )
+
+
+@bulk.command("delete")
+@bulk_options
+def delete_(**kwargs):
+    """Delete the notes of a notebook that match a filter."""
+    run_bulk("deleted", lambda n: {}, func=delete_note, **kwargs)
+
+
+@bulk.command()
+@option("--addtags", help=des_blk_add_tags)
+@option("--rmtags", help=des_blk_rm_tags)
+@bulk_options
+def retag(addtags: Optional[str], rmtags: Optional[str], **kwargs):
+    """Add or remove tags to the notes of a notebook that match a filter."""
+    add = get_tag_list(addtags) if addtags is not None else []
+    rm = set(get_tag_list(rmtags)) if rmtags is not None else set()
+
+    if len(add) == 0 and len(rm) == 0:
+        sys.exit('Error: "--addtags" or "--rmtags" is required.')
+
+    def get_changes(note: dict) -> Optional[dict]:
+        tags = [t for t in note.get("tags", []) if t not in rm]
+        tags += [t for t in add if t not in tags]
+
+        return {"tags": tags} if tags != note.get("tags", []) else None
+
+    run_bulk("retagged", get_changes, **kwargs)
+
+
+@bulk.command()
+@option("--to", required=True, help=des_blk_to)
+@bulk_options
+def move(to: str, **kwargs):
+    """Move the notes of a notebook that match a filter to another notebook."""
+    run_bulk(
+        "moved",
+        lambda n: {"notebook_id": to} if n["notebook_id"] != to else None,
+        **kwargs
+    )
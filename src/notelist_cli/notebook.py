@@ -1,21 +1,46 @@
 """Notebook module."""
 
 import sys
-from typing import Optional
-
-from click import group, option, confirmation_option, echo
-
-from notelist_cli.auth import request, check_response
+import json
+import os
+from contextlib import closing, contextmanager
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, TextIO
+
+from click import (
+    group, option, confirmation_option, echo, open_file, Choice, DateTime,
+    Path
+)
+
+from notelist_cli import cache, mirror, output
+from notelist_cli.aio import aget_result, gather, run
+from notelist_cli.auth import request, request_items, check_response
+from notelist_cli.models import Notebook, to_records
+from notelist_cli.output import (
+    Column, notebook_fields, print_record, print_records, print_table
+)
+from notelist_cli.transport import get_retry_text
+from notelist_cli.workers import def_workers, imap
 
 
 # Endpoints
 notebooks_ep = "/notebooks/notebooks"
 notebook_ep = "/notebooks/notebook"
+notes_ep = "/notes/notes"
+note_ep = "/notes/note"
 
 # Option descriptions
 des_notebook = "Notebook ID."
+des_get_notebook = "Notebook ID. It can be specified more than once."
 des_name = "Name."
 des_tag_colors = 'Tag colors. E.g. "tag1=color1,tag2=color2".'
+des_exp_all = "Export all the notebooks of the current user."
+des_exp_output = 'Output JSONL file ("-" for stdout).'
+des_workers = "Maximum number of concurrent requests."
+des_local = (
+    'Get the data from the local mirror (see "notelist-cli sync") instead of '
+    "from the API."
+)
 
 # Messages
 del_confirm = "Are you sure that you want to delete the notebook?"
@@ -29,21 +54,11 @@ def get_ls_header() -> str:
     return "ID" + (" " * 31) + "| Name\n"
 
 
-def get_ls_notebook_line(notebook: dict) -> str:
-    """Get a string representing a notebook in the Notebook Ls command.
-
-    :param notebook: Notebook data.
-    :returns: Notebook string.
-    """
-    line = notebook["id"] + " | "
-    name = notebook.get("name")
-    c = len(name)
-
-    if c > 40:
-        name = f"{name[:37]}..."
-
-    line += name
-    return line
+# Notebook Ls command columns
+ls_columns = [
+    Column(lambda n: n["id"]),
+    Column(lambda n: n.get("name"), 40, False)
+]
 
 
 @group()
@@ -52,34 +67,42 @@ def notebook():
     pass
 
 
-def print_notebooks(notebooks: list[dict]):
+def print_notebooks(notebooks: Iterable[dict]) -> int:
     """Print a notebook list.
 
     :param notebooks: Notebooks.
+    :returns: Number of notebooks printed.
     """
-    echo(get_ls_header())
-
-    for n in notebooks:
-        echo(get_ls_notebook_line(n))
+    return print_table(get_ls_header(), ls_columns, notebooks)
 
 
 @notebook.command()
-def ls():
+@option("--local", is_flag=True, help=des_local)
+def ls(local: bool):
     """List all the notebooks of the current user."""
     try:
-        r = request("GET", notebooks_ep, True)
-        check_response(r)
+        if local:
+            with closing(mirror.connect()) as con:
+                notebooks = mirror.get_notebooks(con)
+        else:
+            r = request("GET", notebooks_ep, True)
+            check_response(r)
+
+            notebooks = r.result
 
-        d = r.json()
-        notebooks = d.get("result")
+            if notebooks is None:
+                raise Exception("Data not received.")
 
-        if notebooks is None:
-            raise Exception("Data not received.")
+            to_records(Notebook, notebooks)
+            cache.validate("notebook", notebooks)
 
-        c = len(notebooks)
+        if output.fmt != "table":
+            print_records(notebooks, notebook_fields)
+            return
+
+        c = print_notebooks(notebooks)
 
         if c > 0:
-            print_notebooks(notebooks)
             echo()
 
         s = "s" if c != 1 else ""
@@ -88,40 +111,88 @@ def ls():
         sys.exit(f"Error: {e}")
 
 
-@notebook.command()
-@option("--id", required=True, help=des_notebook)
-def get(id: str):
-    """Get a notebook."""
-    try:
-        ep = f"{notebook_ep}/{id}"
-        r = request("GET", ep, True)
-        check_response(r)
+def print_notebook(notebook: dict):
+    """Print a notebook.
+
+    :param notebook: Notebook data.
+    """
+    _id = notebook["id"]
+    name = notebook["name"]
+    tag_colors = notebook.get("tag_colors")
+    created = notebook["created"].replace("T", " ")
+    last_mod = notebook["last_modified"].replace("T", " ")
 
-        d = r.json()
-        res = d.get("result")
+    if tag_colors is not None:
+        tag_colors = [f"{i}={v}" for i, v in tag_colors.items()]
+        tag_colors = ", ".join(tag_colors)
 
-        if res is None:
-            raise Exception("Data not received.")
+    echo("ID:" + (" " * 12) + _id)
+    echo(f"Name:" + (" " * 10) + name)
 
-        # Notebook data
-        _id = res["id"]
-        name = res["name"]
-        tag_colors = res.get("tag_colors")
-        created = res["created"].replace("T", " ")
-        last_mod = res["last_modified"].replace("T", " ")
+    if tag_colors is not None:
+        echo(f"Tag colors:" + (" " * 4) + tag_colors)
 
-        if tag_colors is not None:
-            tag_colors = [f"{i}={v}" for i, v in tag_colors.items()]
-            tag_colors = ", ".join(tag_colors)
+    echo("Created:" + (" " * 7) + created)
+    echo(f"Last modified: {last_mod}")
 
-        echo("ID:" + (" " * 12) + _id)
-        echo(f"Name:" + (" " * 10) + name)
 
-        if tag_colors is not None:
-            echo(f"Tag colors:" + (" " * 4) + tag_colors)
+def get_local_notebooks(ids: tuple[str]) -> list[dict]:
+    """Get some notebooks from the local mirror.
 
-        echo("Created:" + (" " * 7) + created)
-        echo(f"Last modified: {last_mod}")
+    An `Exception` is raised if any notebook isn't found.
+
+    :param ids: Notebook IDs.
+    :returns: Notebooks.
+    """
+    notebooks = []
+
+    with closing(mirror.connect()) as con:
+        for i in ids:
+            nb = mirror.get_notebook(con, i)
+
+            if nb is None:
+                raise Exception("Notebook not found in the local mirror.")
+
+            notebooks.append(nb)
+
+    return notebooks
+
+
+@notebook.command()
+@option("--id", required=True, multiple=True, help=des_get_notebook)
+@option("--local", is_flag=True, help=des_local)
+def get(id: tuple[str], local: bool):
+    """Get one or more notebooks.
+
+    In the "json" format, a single notebook is printed as an object and several
+    notebooks as an array.
+    """
+    try:
+        if local:
+            res = get_local_notebooks(id)
+        else:
+            eps = [f"{notebook_ep}/{i}" for i in id]
+            res = run(gather(*(aget_result("GET", ep) for ep in eps)))
+            to_records(Notebook, res)
+
+            for nb in res:
+                cache.put("notebook", nb)
+
+        # A single notebook is printed as an object and several notebooks as
+        # a list
+        if output.fmt != "table" and len(res) == 1:
+            print_record(res[0], notebook_fields)
+            return
+
+        if output.fmt != "table":
+            print_records(res, notebook_fields)
+            return
+
+        for i, nb in enumerate(res):
+            if i > 0:
+                echo()
+
+            print_notebook(nb)
     except Exception as e:
         sys.exit(f"Error: {e}")
 
@@ -151,7 +222,7 @@ def create(name: str, tagcolors: Optional[str]):
         r = request("POST", notebook_ep, True, data)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -163,7 +234,20 @@ def create(name: str, tagcolors: Optional[str]):
 @option("--id", required=True, help=des_notebook)
 @option("--name", help=des_name)
 @option("--tagcolors", help=des_tag_colors)
-def update(id: str, name: Optional[str], tagcolors: Optional[str]):
+@option(
+    "--ifunmodsince", type=DateTime(cache.since_formats),
+    help=cache.des_if_unmod_since
+)
+@option(
+    "--onconflict", type=Choice(cache.conflict_strategies),
+    help=cache.des_on_conflict
+)
+@option("--usecache", is_flag=True, help=cache.des_use_cache)
+def update(
+    id: str, name: Optional[str], tagcolors: Optional[str],
+    ifunmodsince: Optional[datetime], onconflict: Optional[str],
+    usecache: bool
+):
     """Update a notebook."""
     data = {}
 
@@ -190,14 +274,9 @@ def update(id: str, name: Optional[str], tagcolors: Optional[str]):
             raise Exception("No options specified. At least one is required.")
 
         # Get current data
-        ep = f"{notebook_ep}/{id}"
-
-        r = request("GET", ep, True)
-        check_response(r)
-        notebook = r.json().get("result")
-
-        if notebook is None:
-            raise Exception("Data not received.")
+        notebook = cache.fetch_for_update(
+            "notebook", id, ifunmodsince, onconflict, data, usecache
+        )
 
         # Prepare new data
         for k in ("name", "tag_colors"):
@@ -207,10 +286,12 @@ def update(id: str, name: Optional[str], tagcolors: Optional[str]):
                 data[k] = notebook[k]
 
         # Update notebook
+        ep = f"{notebook_ep}/{id}"
         r = request("PUT", ep, True, data)
+        cache.delete("notebook", id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -226,11 +307,135 @@ def delete(id: str):
     try:
         ep = f"{notebook_ep}/{id}"
         r = request("DELETE", ep, True)
+        cache.delete("notebook", id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
     except Exception as e:
         sys.exit(f"Error: {e}")
+
+
+def get_notebook_ids() -> list[str]:
+    """Get the IDs of all the notebooks of the current user.
+
+    :returns: Notebook IDs.
+    """
+    r = request("GET", notebooks_ep, True)
+    check_response(r)
+    notebooks = r.result
+
+    if notebooks is None:
+        raise Exception("Data not received.")
+
+    return [n["id"] for n in notebooks]
+
+
+def get_note_ids(notebook_ids: list[str]) -> Iterator[str]:
+    """Get the IDs of all the notes (active and archived) of some notebooks.
+
+    The notes of each notebook are requested only when the notes of the
+    previous notebook have been consumed, and they are returned as they are
+    received (see `request_items`), so the whole list of notes of a notebook
+    isn't held in memory.
+
+    :param notebook_ids: Notebook IDs.
+    :returns: Iterator of note IDs.
+    """
+    for i in notebook_ids:
+        for n in request_items("POST", f"{notes_ep}/{i}", {}, True):
+            yield n["id"]
+
+
+@contextmanager
+def open_output(path: str) -> Iterator[TextIO]:
+    """Open an output file for writing.
+
+    The data is written to a temporary file, which replaces the output file
+    when it's closed. If there is an error, the temporary file is removed and
+    the output file isn't changed.
+
+    :param path: File path ("-" for stdout).
+    :returns: Text file.
+    """
+    if path == "-":
+        with open_file(path, "w", encoding="utf-8") as f:
+            yield f
+
+        return
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            yield f
+
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+        raise
+
+
+def get_note(_id: str) -> dict:
+    """Get the full data of a note, including its body.
+
+    :param _id: Note ID.
+    :returns: Note data.
+    """
+    r = request("GET", f"{note_ep}/{_id}", True)
+    check_response(r)
+    note = r.result
+
+    if note is None:
+        raise Exception("Data not received.")
+
+    return note
+
+
+@notebook.command()
+@option("--id", help=des_notebook)
+@option("--all", "_all", is_flag=True, help=des_exp_all)
+@option(
+    "--output", "path", type=Path(dir_okay=False), default="-",
+    help=des_exp_output
+)
+@option("--workers", type=int, default=def_workers, help=des_workers)
+def export(id: Optional[str], _all: bool, path: str, workers: int):
+    """Export the notes of a notebook to JSONL.
+
+    Each line contains the full data of a note. The notes are written as they
+    are received, in the same order as in the notebook. The output file is
+    written to a temporary file first, which replaces the output file when all
+    the notes have been exported, so the output file isn't left incomplete if
+    a note can't be exported.
+    """
+    try:
+        if id is None and not _all:
+            raise Exception('Either "--id" or "--all" is required.')
+
+        if id is not None and _all:
+            raise Exception('"--id" and "--all" can\'t be used together.')
+
+        notebook_ids = get_notebook_ids() if _all else [id]
+        note_ids = get_note_ids(notebook_ids)
+        c = 0
+
+        with open_output(path) as f:
+            for _, note, e in imap(get_note, note_ids, workers):
+                if e is not None:
+                    raise e
+
+                f.write(json.dumps(note, ensure_ascii=False) + "\n")
+                c += 1
+
+        if path != "-":
+            s = "s" if c != 1 else ""
+            echo(f"{c} note{s} exported{get_retry_text()}")
+    except Exception as e:
+        sys.exit(f"Error: {e}")
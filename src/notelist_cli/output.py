@@ -0,0 +1,252 @@
+"""Output module.
+
+Tables (e.g. the output of the "note ls" command) are written through a buffer
+instead of writing each row separately, and the formatting functions of the
+columns are built once per table instead of once per row.
+
+Instead of tables, the commands can print the API results in a
+machine-readable format (JSON, JSONL, CSV or TSV), selected with the global
+"--format" option.
+
+The rows and the records can be dictionaries or record objects (see the
+"models" module).
+"""
+
+import csv
+import json
+import sys
+from typing import Any, Callable, Iterable, Optional
+
+from click import echo
+
+from notelist_cli.models import Record
+
+
+# Maximum number of characters to buffer before writing them
+buffer_size = 65536
+
+# Output formats. "table" is the human-readable format of each command and the
+# other formats are machine-readable serializations of the API results.
+formats = ("table", "json", "jsonl", "csv", "tsv")
+
+# Current output format
+fmt = "table"
+
+# CSV/TSV fields of each record type
+note_fields = [
+    "id", "notebook_id", "archived", "title", "tags", "body", "created",
+    "last_modified"
+]
+
+notebook_fields = ["id", "name", "tag_colors", "created", "last_modified"]
+
+user_fields = [
+    "id", "username", "admin", "enabled", "name", "email", "created",
+    "last_modified"
+]
+
+
+class Column:
+    """Table column."""
+
+    def __init__(
+        self, value: Callable[[dict], Optional[str]],
+        width: Optional[int] = None, pad: bool = True
+    ):
+        """Initialize the instance.
+
+        :param value: Function that gets the column value (a string or `None`
+        for an empty value) from a row.
+        :param width: Column width. Longer values are truncated with "..." at
+        the end. If it's `None`, the values aren't truncated.
+        :param pad: Whether to pad the values with spaces up to the column
+        width or not.
+        """
+        self.value = value
+        self.width = width
+        self.pad = pad
+
+    def get_formatter(self) -> Callable[[dict], str]:
+        """Get a function that formats the column value of a row.
+
+        :returns: Function.
+        """
+        value = self.value
+        width = self.width
+
+        if width is None:
+            return lambda r: value(r) or ""
+
+        cut = width - 3
+        pad = self.pad
+
+        def format_value(r: dict) -> str:
+            v = value(r)
+
+            if v is None:
+                return ""
+
+            if len(v) > width:
+                return f"{v[:cut]}..."
+
+            return v.ljust(width) if pad else v
+
+        return format_value
+
+
+class Writer:
+    """Buffered writer of the standard output."""
+
+    def __init__(self):
+        """Initialize the instance."""
+        self._buf = []
+        self._size = 0
+
+    def write(self, text: str):
+        """Write text.
+
+        The text is written to the standard output when the buffer is full.
+
+        :param text: Text.
+        """
+        self._buf.append(text)
+        self._size += len(text)
+
+        if self._size >= buffer_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered text to the standard output."""
+        if len(self._buf) > 0:
+            sys.stdout.write("".join(self._buf))
+            self._buf.clear()
+            self._size = 0
+
+        sys.stdout.flush()
+
+
+def print_table(
+    header: str, columns: list[Column], rows: Iterable[dict],
+    sep: str = " | "
+) -> int:
+    """Print a table.
+
+    The rows are consumed and printed as they are produced, so `rows` can be
+    any iterable (e.g. a generator). Nothing is printed if there are no rows.
+    If `rows` raises an exception, the rows produced before are printed
+    before the exception is propagated.
+
+    :param header: Header line.
+    :param columns: Columns.
+    :param rows: Rows.
+    :param sep: Column separator.
+    :returns: Number of rows printed.
+    """
+    formatters = [c.get_formatter() for c in columns]
+    w = Writer()
+    c = 0
+
+    try:
+        for r in rows:
+            if c == 0:
+                w.write(header + "\n")
+
+            w.write(sep.join([f(r) for f in formatters]) + "\n")
+            c += 1
+    finally:
+        w.flush()
+
+    return c
+
+
+def get_cell(value: Any) -> str:
+    """Get the CSV/TSV cell value of a field value.
+
+    The lists and dictionaries are JSON encoded.
+
+    :param value: Field value.
+    :returns: Cell value.
+    """
+    if value is None:
+        return ""
+
+    if isinstance(value, bool):
+        return "true" if value else "false"
+
+    # The lists (e.g. the tags) are JSON arrays, so an item that contains the
+    # separator can't be confused with two items.
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, ensure_ascii=False)
+
+    return str(value)
+
+
+def to_dict(record: Any) -> dict:
+    """Get the data of a record as a dictionary.
+
+    :param record: Record object or dictionary.
+    :returns: Dictionary.
+    """
+    return record.to_dict() if isinstance(record, Record) else record
+
+
+def print_records(records: Iterable[dict], fields: list[str]) -> int:
+    """Print records in the current machine-readable format.
+
+    The records are serialized as they are produced: "json" prints an array,
+    "jsonl" prints one object per line and "csv" and "tsv" print a header row
+    with the field names followed by one row per record. If `records` raises
+    an exception, the records produced before are printed before the
+    exception is propagated.
+
+    :param records: Records.
+    :param fields: Field names for the CSV and TSV formats. In the JSON
+    formats, all the fields of the records are printed.
+    :returns: Number of records printed.
+    """
+    w = Writer()
+    c = 0
+
+    try:
+        if fmt in ("csv", "tsv"):
+            d = "\t" if fmt == "tsv" else ","
+            cw = csv.writer(w, delimiter=d, lineterminator="\n")
+            cw.writerow(fields)
+
+            for r in records:
+                cw.writerow([get_cell(r.get(f)) for f in fields])
+                c += 1
+        elif fmt == "jsonl":
+            for r in records:
+                w.write(json.dumps(to_dict(r), ensure_ascii=False) + "\n")
+                c += 1
+        else:
+            w.write("[")
+
+            for r in records:
+                if c > 0:
+                    w.write(",")
+
+                w.write("\n" + json.dumps(to_dict(r), ensure_ascii=False))
+                c += 1
+
+            w.write("\n]\n" if c > 0 else "]\n")
+    finally:
+        w.flush()
+
+    return c
+
+
+def print_record(record: dict, fields: list[str]):
+    """Print a record in the current machine-readable format.
+
+    In the "json" format, the record is printed as an object (not as an array)
+    and in the other formats it's printed like a list of one record.
+
+    :param record: Record.
+    :param fields: Field names for the CSV and TSV formats.
+    """
+    if fmt == "json":
+        echo(json.dumps(to_dict(record), ensure_ascii=False))
+    else:
+        print_records([record], fields)
@@ -0,0 +1,110 @@
+"""Profiling module.
+
+When profiling is enabled (with the global "--profile" option), the command is
+run with a CPU profiler (cProfile) or with memory allocation tracing
+(tracemalloc). At the end of the command, the CPU profile is written to a
+pstats file and the functions with the highest cumulative time are printed to
+the standard error, or the peak memory and the lines that allocated the most
+memory are printed to the standard error.
+
+The CPU profiler only profiles the main thread (where the commands and the
+asyncio request engine run), not the worker threads of the bulk commands.
+"""
+
+import cProfile
+import pstats
+import sys
+import tracemalloc
+from typing import Optional
+
+
+# Default pstats file of the CPU profile
+def_path = "notelist_cli.prof"
+
+# Number of functions or allocation sites to print
+top = 20
+
+# Number of frames to store of each memory allocation
+frames = 1
+
+# Current profiling mode. If it's `None`, profiling is disabled.
+mode: Optional[str] = None
+
+# Pstats file to write the CPU profile to
+path = def_path
+
+_profile: Optional[cProfile.Profile] = None
+
+
+def start(profile_mode: str, file_path: Optional[str] = None):
+    """Enable profiling.
+
+    :param profile_mode: Profiling mode ("cpu" or "mem").
+    :param file_path: Pstats file to write the CPU profile to.
+    """
+    global mode, path, _profile
+
+    mode = profile_mode
+    path = file_path or def_path
+
+    if mode == "cpu":
+        _profile = cProfile.Profile()
+        _profile.enable()
+    else:
+        tracemalloc.start(frames)
+
+
+def _mb(size: int) -> str:
+    """Format a size in megabytes.
+
+    :param size: Size in bytes.
+    :returns: Formatted size.
+    """
+    return f"{size / 1048576:.1f} MB"
+
+
+def finish_cpu():
+    """Stop the CPU profiler, write the profile and print the summary."""
+    _profile.disable()
+    _profile.dump_stats(path)
+
+    s = pstats.Stats(_profile, stream=sys.stderr)
+    s.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    sys.stderr.write(f"CPU profile written to {path}\n")
+    sys.stderr.flush()
+
+
+def finish_mem():
+    """Stop the memory allocation tracing and print the summary."""
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    # Exclude the allocations of the tracing itself
+    snapshot = snapshot.filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+    ))
+
+    lines = ["Top allocation sites (memory still allocated):"]
+
+    for s in snapshot.statistics("lineno")[:top]:
+        f = s.traceback[0]
+
+        lines.append(
+            f"{f.filename}:{f.lineno} | {s.size / 1024:.1f} KB | "
+            f"{s.count} blocks"
+        )
+
+    lines.append(f"Peak memory: {_mb(peak)}, current memory: {_mb(current)}")
+
+    sys.stderr.write("\n".join(lines) + "\n")
+    sys.stderr.flush()
+
+
+def finish():
+    """Print the profiling summary, if profiling is enabled."""
+    if mode == "cpu":
+        finish_cpu()
+    elif mode == "mem":
+        finish_mem()
@@ -1,10 +1,18 @@
 """Search module."""
 
 import sys
+import json
+from contextlib import closing
+from itertools import chain
 
 from click import command, option, echo
 
+from notelist_cli import cache, index, mirror, output
 from notelist_cli.auth import request, check_response
+from notelist_cli.models import Note, Notebook, to_records
+from notelist_cli.output import (
+    note_fields, notebook_fields, print_records, to_dict
+)
 from notelist_cli.notebook import print_notebooks
 from notelist_cli.note import print_notes
 
@@ -14,26 +22,90 @@ search_ep = "/search"
 
 # Option descriptions
 des_search = "Search text."
+des_local = (
+    "Search in the local mirror (see the \"sync\" command) instead of the "
+    "API. The results are ranked by relevance and each word of the text "
+    "matches the words that start with it."
+)
+
+# CSV/TSV fields. The "type" field is "notebook" or "note".
+search_fields = ["type"] + list(dict.fromkeys(notebook_fields + note_fields))
+
+
+def print_result(notebooks: list[dict], notes: list[dict]):
+    """Print a search result in the current machine-readable format.
+
+    In the "json" format, the result is printed as an object with the
+    "notebooks" and "notes" lists. In the other formats, the notebooks and the
+    notes are printed as records with a "type" field.
+
+    :param notebooks: Notebooks found.
+    :param notes: Notes found.
+    """
+    if output.fmt == "json":
+        res = {
+            "notebooks": [to_dict(n) for n in notebooks],
+            "notes": [to_dict(n) for n in notes]
+        }
+
+        echo(json.dumps(res, ensure_ascii=False))
+    else:
+        records = chain(
+            ({"type": "notebook", **to_dict(n)} for n in notebooks),
+            ({"type": "note", **to_dict(n)} for n in notes)
+        )
+
+        print_records(records, search_fields)
+
+
+def get_local_result(s: str) -> tuple[list[dict], list[dict]]:
+    """Search for notebooks and notes in the local mirror.
+
+    :param s: Search text.
+    :returns: Tuple containing the notebooks and the notes (without their
+    body) found, sorted by relevance.
+    """
+    notebooks = []
+    notes = []
+
+    with closing(mirror.connect()) as con:
+        for k, i in index.find(con, s):
+            if k == "notebook":
+                notebooks.append(mirror.get_notebook(con, i))
+            else:
+                notes.append(mirror.get_note(con, i, False))
+
+    return notebooks, notes
 
 
 @command()
 @option("--s", required=True, help=des_search)
-def search(s: str):
+@option("--local", is_flag=True, help=des_local)
+def search(s: str, local: bool):
     """Search for notebooks and notes."""
     try:
-        ep = f"{search_ep}/{s}"
-        r = request("GET", ep, True)
-        check_response(r)
+        if local:
+            notebooks, notes = get_local_result(s)
+        else:
+            ep = f"{search_ep}/{s}"
+            r = request("GET", ep, True)
+            check_response(r)
+
+            res = r.result
+
+            if res is None:
+                raise Exception("Data not received.")
 
-        d = r.json()
-        res = d.get("result")
+            # Result
+            notebooks = to_records(Notebook, res["notebooks"])
+            notes = to_records(Note, res["notes"])
 
-        if res is None:
-            raise Exception("Data not received.")
+            cache.validate("notebook", notebooks)
+            cache.validate("note", notes)
 
-        # Result
-        notebooks = res["notebooks"]
-        notes = res["notes"]
+        if output.fmt != "table":
+            print_result(notebooks, notes)
+            return
 
         # Print notebooks found
         c = len(notebooks)
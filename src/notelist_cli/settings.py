@@ -0,0 +1,114 @@
+"""Settings module.
+
+The settings are stored in the "settings.json" file of the application
+directory (inside the home directory of the user). The file is read only once
+per process, the first time that a setting is needed, and the settings are kept
+in memory. The file is written only when a setting value changes, and all the
+changes made at once are written with a single atomic file replacement.
+"""
+
+import json
+import os
+from os.path import exists, join
+from pathlib import Path
+from threading import RLock
+from typing import Any, Optional
+
+
+# Application
+app_id = "notelist_cli"
+app_dir = join(str(Path.home()), f".{app_id}")
+settings_path = join(app_dir, "settings.json")
+
+_data: Optional[dict] = None
+_lock = RLock()
+
+
+def _read() -> dict:
+    """Read the settings file.
+
+    :returns: Settings data.
+    """
+    if not exists(settings_path):
+        return {}
+
+    with open(settings_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write(data: dict):
+    """Write the settings file atomically.
+
+    :param data: Settings data.
+    """
+    os.makedirs(app_dir, exist_ok=True)
+    tmp = f"{settings_path}.{os.getpid()}.tmp"
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+    os.replace(tmp, settings_path)
+
+
+def load(reload: bool = False) -> dict:
+    """Get the settings snapshot of the process.
+
+    :param reload: Whether to read the settings file again or not.
+    :returns: Settings data.
+    """
+    global _data
+
+    with _lock:
+        if _data is None or reload:
+            _data = _read()
+
+        return _data
+
+
+def get(_id: str, default: Optional[Any] = None) -> Optional[Any]:
+    """Get a setting value or a default value if it doesn't exist.
+
+    :param _id: Setting ID.
+    :param default: Value to return if the setting doesn't exist.
+    :returns: Setting value if the setting exists or `default` otherwise.
+    """
+    return load().get(_id, default)
+
+
+def update(values: dict):
+    """Set some setting values.
+
+    The settings file is read again before updating it, so that the settings
+    changed by other processes since the snapshot was loaded are kept. The file
+    is written only if any value changes.
+
+    :param values: Setting IDs and values. The values must be JSON
+    serializable.
+    """
+    global _data
+
+    with _lock:
+        data = _read()
+        new = dict(data, **values)
+
+        if new != data:
+            _write(new)
+
+        _data = new
+
+
+def delete(*ids: str):
+    """Delete some settings.
+
+    :param ids: Setting IDs.
+    """
+    global _data
+
+    with _lock:
+        data = _read()
+        new = {k: v for k, v in data.items() if k not in ids}
+
+        if new != data:
+            _write(new)
+
+        _data = new
@@ -0,0 +1,148 @@
+"""Synchronization module."""
+
+import sys
+import time
+from contextlib import closing
+from typing import Any, Optional
+
+from click import command, option, echo
+
+from notelist_cli import mirror
+from notelist_cli.auth import (
+    get_api_url, get_user_id, request, check_response
+)
+from notelist_cli.transport import get_retry_text
+from notelist_cli.workers import def_workers, imap
+
+
+# Endpoints
+notebooks_ep = "/notebooks/notebooks"
+notes_ep = "/notes/notes"
+note_ep = "/notes/note"
+
+# Option descriptions
+des_workers = "Maximum number of concurrent requests."
+des_full = "Download all the notebooks and notes again."
+
+
+def get_result(
+    method: str, endpoint: str, data: Optional[dict] = None
+) -> Any:
+    """Make an authenticated request and get its result.
+
+    An `Exception` is raised if there is an error.
+
+    :param method: Request method.
+    :param endpoint: Relative endpoint URL.
+    :param data: Request data.
+    :returns: Response result.
+    """
+    # All the requests of the command only get data, so they can be retried
+    r = request(method, endpoint, True, data, idempotent=True)
+    check_response(r)
+    res = r.result
+
+    if res is None:
+        raise Exception("Data not received.")
+
+    return res
+
+
+@command()
+@option("--workers", type=int, default=def_workers, help=des_workers)
+@option("--full", is_flag=True, help=des_full)
+def sync(workers: int, full: bool):
+    """Synchronize the local mirror of notebooks and notes.
+
+    Only the notebooks and notes that have changed since the last
+    synchronization are downloaded, and the ones that have been deleted are
+    removed from the mirror. The mirror is used by the commands run with the
+    "--local" option.
+    """
+    try:
+        start = time.perf_counter()
+        uid = get_user_id()
+        url = get_api_url()
+
+        with closing(mirror.connect(True)) as con:
+            # If the mirror belongs to another user or API, we download
+            # everything again
+            if (
+                full or mirror.get_meta(con, mirror.user_id) != uid or
+                mirror.get_meta(con, mirror.api_url) != url
+            ):
+                mirror.clear(con)
+                mirror.set_meta(con, mirror.user_id, uid)
+                mirror.set_meta(con, mirror.api_url, url)
+
+            # Notebooks
+            notebooks = get_result("GET", notebooks_ep)
+            local = mirror.get_versions(con, "notebooks")
+            nb_updated = 0
+            nb_deleted = 0
+
+            for nb in notebooks:
+                if local.get(nb["id"]) != nb["last_modified"]:
+                    mirror.put_notebook(con, nb)
+                    nb_updated += 1
+
+            remote = {nb["id"] for nb in notebooks}
+
+            for i in local:
+                if i not in remote:
+                    mirror.delete_notebook(con, i)
+                    nb_deleted += 1
+
+            con.commit()
+
+            # Notes of each notebook
+            c = 0
+            updated = 0
+            deleted = 0
+
+            def get_note(_id: str) -> dict:
+                return get_result("GET", f"{note_ep}/{_id}")
+
+            for nb in notebooks:
+                notes = get_result("POST", f"{notes_ep}/{nb['id']}", {})
+                local = mirror.get_versions(con, "notes", nb["id"])
+                c += len(notes)
+
+                changed = [
+                    n["id"] for n in notes
+                    if local.get(n["id"]) != n["last_modified"]
+                ]
+
+                for _, note, e in imap(get_note, changed, workers):
+                    if e is not None:
+                        raise e
+
+                    mirror.put_note(con, note)
+                    updated += 1
+
+                remote = {n["id"] for n in notes}
+
+                for i in local:
+                    if i not in remote:
+                        mirror.delete_note(con, i)
+                        deleted += 1
+
+                con.commit()
+
+            now = time.strftime("%Y-%m-%dT%H:%M:%S")
+            mirror.set_meta(con, "last_sync", now)
+            con.commit()
+
+        # Summary
+        t = time.perf_counter() - start
+        s1 = "s" if len(notebooks) != 1 else ""
+        s2 = "s" if c != 1 else ""
+
+        echo(
+            f"{len(notebooks)} notebook{s1} ({nb_updated} updated, "
+            f"{nb_deleted} deleted) and {c} note{s2} ({updated} updated, "
+            f"{deleted} deleted) synchronized{get_retry_text()} in {t:.2f} "
+            "seconds"
+        )
+    except Exception as e:
+        sys.exit(f"Error: {e}")
@@ -0,0 +1,144 @@
+"""Tracing module.
+
+When tracing is enabled (with the global "--trace" or "--tracefile" options),
+an event is recorded for each API request (method, endpoint, status code,
+bytes sent and received and connection, time to first byte, JSON decoding and
+total times), for each retry and for each access token refresh. At the end of
+the command, a summary of the events is printed to the standard error or the
+events are written to a JSONL file.
+"""
+
+import json
+import sys
+import time
+from threading import Lock
+from typing import Optional
+
+
+# Whether tracing is enabled or not
+enabled = False
+
+# JSONL file to write the events to. If it's `None`, the summary is printed to
+# the standard error.
+path: Optional[str] = None
+
+_events = []
+_start = time.perf_counter()
+_lock = Lock()
+
+
+def start(file_path: Optional[str] = None):
+    """Enable tracing.
+
+    :param file_path: JSONL file to write the events to.
+    """
+    global enabled, path, _start
+
+    enabled = True
+    path = file_path
+    _start = time.perf_counter()
+    _events.clear()
+
+
+def record(event: str, **fields):
+    """Record an event if tracing is enabled.
+
+    :param event: Event type ("request", "retry" or "refresh").
+    :param fields: Event fields. The times are in seconds.
+    """
+    if not enabled:
+        return
+
+    e = {"event": event, "time": time.perf_counter() - _start, **fields}
+
+    with _lock:
+        _events.append(e)
+
+
+def get_events() -> list[dict]:
+    """Get the recorded events.
+
+    :returns: Events.
+    """
+    with _lock:
+        return list(_events)
+
+
+def _ms(seconds: Optional[float]) -> str:
+    """Format a time in milliseconds.
+
+    :param seconds: Time in seconds.
+    :returns: Formatted time.
+    """
+    return "-" if seconds is None else f"{seconds * 1000:.1f} ms"
+
+
+def _kb(size: int) -> str:
+    """Format a size in kilobytes.
+
+    :param size: Size in bytes.
+    :returns: Formatted size.
+    """
+    return f"{size / 1024:.1f} KB"
+
+
+def print_summary():
+    """Print the summary of the recorded events to the standard error."""
+    events = get_events()
+    requests = [e for e in events if e["event"] == "request"]
+    lines = []
+
+    for e in events:
+        if e["event"] == "request":
+            lines.append(
+                f"{e['method']} {e['endpoint']} | {e['status'] or 'error'} | "
+                f"{_kb(e['bytes_in'])} | connect {_ms(e['connect'])} | "
+                f"ttfb {_ms(e['ttfb'])} | decode {_ms(e['decode'])} | "
+                f"total {_ms(e['total'])}"
+            )
+        elif e["event"] == "retry":
+            lines.append(
+                f"Retry {e['attempt']} of {e['method']} {e['endpoint']} in "
+                f"{_ms(e['delay'])} ({e['reason']})"
+            )
+        else:
+            lines.append(
+                f"Token refresh | {e['status'] or 'error'} | "
+                f"total {_ms(e['total'])}"
+            )
+
+    c = len(requests)
+    r = sum(1 for e in events if e["event"] == "retry")
+    f = sum(1 for e in events if e["event"] == "refresh")
+    received = sum(e["bytes_in"] for e in requests)
+    sent = sum(e["bytes_out"] for e in requests)
+    total = sum(e["total"] for e in requests)
+
+    lines.append(
+        f"{c} request{'s' if c != 1 else ''}, {r} retr"
+        f"{'y' if r == 1 else 'ies'}, {f} token refresh"
+        f"{'es' if f != 1 else ''}, {_kb(sent)} sent, {_kb(received)} "
+        f"received, {_ms(total)} in requests, "
+        f"{_ms(time.perf_counter() - _start)} in total"
+    )
+
+    sys.stderr.write("\n".join(lines) + "\n")
+    sys.stderr.flush()
+
+
+def write_events():
+    """Write the recorded events to the JSONL file."""
+    with open(path, "w", encoding="utf-8") as f:
+        for e in get_events():
+            f.write(json.dumps(e) + "\n")
+
+
+def finish():
+    """Print the summary or write the events, if tracing is enabled."""
+    if not enabled:
+        return
+
+    if path is None:
+        print_summary()
+    else:
+        write_events()
@@ -0,0 +1,757 @@
+"""Transport module.
+
+All the HTTP requests of the application are made through a single
+`requests.Session` instance, which keeps a pool of keep-alive connections to
+the API. This way, consecutive requests made in the same process (e.g. the two
+requests of the "note get" command or the requests of a bulk operation) reuse
+the same TCP/TLS connection instead of opening a new one for each request.
+
+The API requests are throttled by a token bucket rate limiter (disabled by
+default) and by an adaptive concurrency limiter, which follows an AIMD
+(additive increase, multiplicative decrease) strategy: the number of
+concurrent requests allowed is halved when the API responds with a 429 or 503
+status code or when the latency rises over the baseline (a moving average of
+the latency of each endpoint), and it's increased slowly while the API
+responds normally. This way, the concurrent commands (e.g. "note import")
+adapt their request rate to the capacity of the API.
+
+The retry policy of the failed requests (connection errors, 429, 502, 503 and
+504 status codes and invalid responses) is defined here too. The requests are
+retried by `auth.request` with an exponential backoff with jitter, until the
+maximum number of retries or the deadline is reached. Each attempt has a
+connection and read timeout derived from the time left until the deadline,
+so a stalled connection doesn't block a command indefinitely.
+
+The session asks the API for gzip or deflate compressed responses. The request
+data (e.g. the body of a note sent by "note create" or "note import") can be
+compressed too, if it's over a size threshold, but it's disabled by default as
+the API must support compressed requests.
+
+A request data field can be the text of a file (e.g. a note body read with the
+"--bodyfile" option). In this case, the request data is encoded while it's
+sent, with chunked transfer encoding, so the file is never loaded into memory
+at once.
+"""
+
+import atexit
+import codecs
+import gzip
+import hashlib
+import json
+import os
+import random
+import time
+import zlib
+from threading import Condition, Lock, local
+from typing import Any, BinaryIO, Iterator, Optional
+from urllib.parse import urlsplit
+
+from requests import Response, Session
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+from notelist_cli import settings
+
+
+# Settings
+pool_size = "pool_size"
+pool_retries = "pool_retries"
+keep_alive = "keep_alive"
+rate_limit = "rate_limit"
+rate_burst = "rate_burst"
+adaptive = "adaptive"
+max_concurrency = "max_concurrency"
+latency_factor = "latency_factor"
+retries = "retries"
+retry_backoff = "retry_backoff"
+retry_max_backoff = "retry_max_backoff"
+retry_deadline = "retry_deadline"
+retry_post = "retry_post"
+compress = "compress"
+compress_min_size = "compress_min_size"
+accept_encoding = "accept_encoding"
+
+# Default values
+def_pool_size = 10
+def_pool_retries = 0
+def_keep_alive = True
+def_rate_limit = 0.0
+def_rate_burst = 10
+def_adaptive = True
+def_max_concurrency = 10
+def_latency_factor = 3.0
+def_retries = 3
+def_retry_backoff = 0.5
+def_retry_max_backoff = 10.0
+def_retry_deadline = 60.0
+def_retry_post = False
+def_compress = "none"
+def_compress_min_size = 1024
+def_accept_encoding = True
+
+# Compression methods of the request data ("none" for no compression)
+compress_methods = ("none", "gzip", "deflate")
+
+# Size (bytes) of the chunks of the files sent as request data fields
+file_chunk_size = 65536
+
+# Status codes of the responses of an overloaded API
+overload_codes = (429, 503)
+
+# Status codes of the responses of the requests to retry
+retry_codes = (429, 502, 503, 504)
+
+# Idempotent methods. The requests with these methods are always retried.
+idempotent_methods = ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+
+# Maximum time (seconds) to wait for a connection to the API
+connect_timeout = 10.0
+
+# Minimum connection and read timeout (seconds) of a request attempt, used
+# when the deadline is reached or near
+min_timeout = 1.0
+
+# Minimum baseline latency (seconds) used to detect a latency rise. It avoids
+# detecting rises caused by the jitter of very fast responses.
+min_baseline = 0.01
+
+# Weight of each new latency in the moving average of the baseline latency
+baseline_weight = 0.1
+
+# Number of responses of an endpoint needed before its latency rises are
+# detected
+baseline_samples = 5
+
+_session: Optional[Session] = None
+_bucket: Optional["TokenBucket"] = None
+_limiter: Optional["AdaptiveLimiter"] = None
+_retry_policy: Optional["RetryPolicy"] = None
+_retry_count = 0
+_request_count = 0
+_lock = Lock()
+
+# Timings of the last request of each thread
+_local = local()
+
+
+class TimedHTTPConnection(HTTPConnection):
+    """HTTP connection that measures its connection time."""
+
+    def connect(self):
+        """Connect to the server."""
+        start = time.perf_counter()
+        super().connect()
+        _local.connect = time.perf_counter() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    """HTTPS connection that measures its connection time.
+
+    The connection time includes the TLS handshake.
+    """
+
+    def connect(self):
+        """Connect to the server."""
+        start = time.perf_counter()
+        super().connect()
+        _local.connect = time.perf_counter() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    """HTTP connection pool with timed connections."""
+
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    """HTTPS connection pool with timed connections."""
+
+    ConnectionCls = TimedHTTPSConnection
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    The bucket is refilled continuously at a given rate, up to its capacity,
+    and each request takes a token from it, waiting if it's empty.
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """Initialize the instance.
+
+        :param rate: Tokens (requests) per second.
+        :param capacity: Maximum number of tokens (burst size).
+        """
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def acquire(self):
+        """Take a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity,
+                    self._tokens + (now - self._last) * self.rate
+                )
+                self._last = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """Adaptive concurrency limiter (AIMD)."""
+
+    def __init__(self, maximum: int, factor: float = def_latency_factor):
+        """Initialize the instance.
+
+        :param maximum: Maximum number of concurrent requests. It's also the
+        initial limit.
+        :param factor: Latency rise factor. A response is considered slow if
+        its latency is greater than the baseline latency of its endpoint
+        multiplied by this factor.
+        """
+        self.maximum = max(maximum, 1)
+        self.factor = factor
+        self.limit = float(self.maximum)
+
+        # Baseline latency (exponentially weighted moving average) and number
+        # of responses of each endpoint
+        self.baselines: dict[str, tuple[float, int]] = {}
+
+        self._active = 0
+        self._decreased = 0.0
+        self._cond = Condition()
+
+    def acquire(self):
+        """Wait until a new request is allowed and register it."""
+        with self._cond:
+            while self._active >= int(self.limit):
+                self._cond.wait()
+
+            self._active += 1
+
+    def release(self, overloaded: bool, latency: float, endpoint: str = ""):
+        """Register the end of a request and update the limit.
+
+        The latency of a response is compared with the baseline of its
+        endpoint, as the endpoints have different latencies (e.g. a large
+        POST request is slower than a GET request). The baseline is a moving
+        average, so it follows the normal changes of the latency.
+
+        :param overloaded: Whether the API responded that it's overloaded or
+        not.
+        :param latency: Request latency in seconds.
+        :param endpoint: Endpoint of the request (e.g. "GET /notes/note").
+        """
+        with self._cond:
+            self._active -= 1
+            baseline, n = self.baselines.get(endpoint, (latency, 0))
+            base = max(baseline, min_baseline)
+            slow = n >= baseline_samples and latency > base * self.factor
+            baseline += (latency - baseline) * baseline_weight
+            self.baselines[endpoint] = (baseline, n + 1)
+            now = time.monotonic()
+
+            if overloaded or slow:
+                # The limit is decreased once per baseline period at most, so
+                # that a group of concurrent failed requests decreases it once.
+                if now - self._decreased > base:
+                    self.limit = max(self.limit / 2, 1.0)
+                    self._decreased = now
+            else:
+                self.limit = min(self.limit + 1 / self.limit, self.maximum)
+
+            self._cond.notify_all()
+
+
+def create_session(
+    size: int = def_pool_size, retries: int = def_pool_retries,
+    alive: bool = def_keep_alive, accept: bool = def_accept_encoding
+) -> Session:
+    """Create a new session with a pool of connections.
+
+    :param size: Maximum number of connections to keep in the pool.
+    :param retries: Number of retries of the HTTP adapter for connection
+    errors.
+    :param alive: Whether to keep the connections alive between requests or
+    not.
+    :param accept: Whether to ask for compressed responses or not.
+    :returns: Session.
+    """
+    s = Session()
+
+    # The adapter retries are only for connection errors (the request didn't
+    # reach the server), so they are safe for any HTTP method.
+    r = Retry(total=retries, read=0, status=0, redirect=0)
+    a = HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=r)
+
+    a.poolmanager.pool_classes_by_scheme = {
+        "http": TimedHTTPConnectionPool,
+        "https": TimedHTTPSConnectionPool
+    }
+
+    s.mount("http://", a)
+    s.mount("https://", a)
+
+    if not alive:
+        s.headers["Connection"] = "close"
+
+    s.headers["Accept-Encoding"] = "gzip, deflate" if accept else "identity"
+
+    return s
+
+
+class RetryPolicy:
+    """Retry policy of the failed requests."""
+
+    def __init__(
+        self, retries: int = def_retries, backoff: float = def_retry_backoff,
+        max_backoff: float = def_retry_max_backoff,
+        deadline: float = def_retry_deadline, post: bool = def_retry_post
+    ):
+        """Initialize the instance.
+
+        :param retries: Maximum number of retries of a request.
+        :param backoff: Base delay (seconds) before the first retry. The delay
+        limit is doubled on each retry and the actual delay is a random value
+        between 0 and the limit (full jitter).
+        :param max_backoff: Maximum delay (seconds) between retries.
+        :param deadline: Maximum time (seconds) since the first attempt after
+        which a request isn't retried.
+        :param post: Whether to retry the non idempotent requests (POST) by
+        default or not.
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.post = post
+
+    def get_delay(
+        self, attempt: int, start: float, idempotent: bool,
+        response: Optional[Response] = None
+    ) -> Optional[float]:
+        """Get the delay before retrying a failed request.
+
+        If the response has a "Retry-After" header with a number of seconds,
+        it's used as the delay.
+
+        :param attempt: Number of the failed attempt (starting at 0).
+        :param start: Time (`time.monotonic`) of the first attempt.
+        :param idempotent: Whether the request is idempotent or not.
+        :param response: Response of the failed attempt, if any.
+        :returns: Delay in seconds or `None` if the request mustn't be
+        retried.
+        """
+        if attempt >= self.retries or not (idempotent or self.post):
+            return None
+
+        limit = min(self.backoff * (2 ** attempt), self.max_backoff)
+        delay = random.uniform(0, limit)
+
+        if response is not None:
+            try:
+                delay = float(response.headers.get("Retry-After", delay))
+            except ValueError:
+                pass
+
+        if time.monotonic() + delay - start > self.deadline:
+            return None
+
+        return delay
+
+    def get_timeout(self, start: float) -> tuple[float, float]:
+        """Get the timeout of a request attempt.
+
+        The read timeout is the time left until the deadline, so an attempt
+        that stalls fails when the request can't be retried anymore.
+
+        :param start: Time (`time.monotonic`) of the first attempt.
+        :returns: Tuple containing the connection timeout and the read
+        timeout (seconds).
+        """
+        left = self.deadline - (time.monotonic() - start)
+        read = max(left, min_timeout)
+
+        return min(read, connect_timeout), read
+
+
+def get_session() -> Session:
+    """Get the shared session of the process.
+
+    The session is created the first time this function is called, using the
+    transport settings ("pool_size", "pool_retries", "keep_alive" and
+    "accept_encoding"), and it is reused by all the following calls.
+
+    :returns: Session.
+    """
+    global _session
+
+    with _lock:
+        if _session is None:
+            _session = create_session(
+                int(settings.get(pool_size, def_pool_size)),
+                int(settings.get(pool_retries, def_pool_retries)),
+                bool(settings.get(keep_alive, def_keep_alive)),
+                bool(settings.get(accept_encoding, def_accept_encoding))
+            )
+
+    return _session
+
+
+def get_limiters() -> tuple[Optional[TokenBucket], Optional[AdaptiveLimiter]]:
+    """Get the shared rate and concurrency limiters of the process.
+
+    The limiters are created the first time this function is called, using
+    the throttling settings ("rate_limit", "rate_burst", "adaptive",
+    "max_concurrency" and "latency_factor").
+
+    :returns: Tuple containing the rate limiter (or `None` if the rate isn't
+    limited) and the concurrency limiter (or `None` if it's disabled).
+    """
+    global _bucket, _limiter
+
+    with _lock:
+        if _bucket is None and _limiter is None:
+            rate = float(settings.get(rate_limit, def_rate_limit))
+
+            if rate > 0:
+                burst = int(settings.get(rate_burst, def_rate_burst))
+                _bucket = TokenBucket(rate, burst)
+
+            if bool(settings.get(adaptive, def_adaptive)):
+                m = int(settings.get(max_concurrency, def_max_concurrency))
+                f = float(settings.get(latency_factor, def_latency_factor))
+                _limiter = AdaptiveLimiter(m, f)
+
+    return _bucket, _limiter
+
+
+def get_retry_policy() -> RetryPolicy:
+    """Get the retry policy of the process.
+
+    The policy is created the first time this function is called, using the
+    retry settings ("retries", "retry_backoff", "retry_max_backoff",
+    "retry_deadline" and "retry_post").
+
+    :returns: Retry policy.
+    """
+    global _retry_policy
+
+    with _lock:
+        if _retry_policy is None:
+            _retry_policy = RetryPolicy(
+                int(settings.get(retries, def_retries)),
+                float(settings.get(retry_backoff, def_retry_backoff)),
+                float(settings.get(retry_max_backoff, def_retry_max_backoff)),
+                float(settings.get(retry_deadline, def_retry_deadline)),
+                bool(settings.get(retry_post, def_retry_post))
+            )
+
+    return _retry_policy
+
+
+def add_retry():
+    """Count a retried request."""
+    global _retry_count
+
+    with _lock:
+        _retry_count += 1
+
+
+def get_retry_count() -> int:
+    """Get the number of requests retried by the process.
+
+    :returns: Number of retries.
+    """
+    return _retry_count
+
+
+def get_retry_text() -> str:
+    """Get the number of retried requests as text for the command summaries.
+
+    :returns: Text (e.g. ", 3 retries") or an empty string if no requests
+    have been retried.
+    """
+    c = get_retry_count()
+
+    if c == 0:
+        return ""
+
+    return f", {c} retr{'y' if c == 1 else 'ies'}"
+
+
+def get_request_count() -> int:
+    """Get the number of requests sent by the process through `send`.
+
+    :returns: Number of requests.
+    """
+    return _request_count
+
+
+def reset_retry_count():
+    """Reset the number of requests retried by the process."""
+    global _retry_count
+
+    with _lock:
+        _retry_count = 0
+
+
+class FileText:
+    """Text of a UTF-8 file, to send as a string field of the request data."""
+
+    def __init__(self, file: BinaryIO):
+        """Initialize the instance.
+
+        :param file: File opened in binary mode. It must be seekable, as it's
+        read again each time that the request is sent.
+        """
+        self.file = file
+
+    def get_size(self) -> int:
+        """Get the size of the file.
+
+        :returns: Size in bytes.
+        """
+        return os.fstat(self.file.fileno()).st_size
+
+    def get_chunks(self) -> Iterator[bytes]:
+        """Read the file in chunks, from the beginning.
+
+        :returns: Iterator of chunks.
+        """
+        self.file.seek(0)
+
+        while True:
+            c = self.file.read(file_chunk_size)
+
+            if not c:
+                return
+
+            yield c
+
+    def get_hash(self) -> str:
+        """Get the SHA-256 hash of the file content.
+
+        :returns: Hexadecimal hash.
+        """
+        h = hashlib.sha256()
+
+        for c in self.get_chunks():
+            h.update(c)
+
+        return h.hexdigest()
+
+    def encode(self) -> Iterator[bytes]:
+        """Encode the text as a JSON string, in chunks.
+
+        :returns: Iterator of chunks.
+        """
+        d = codecs.getincrementaldecoder("utf-8")()
+        yield b'"'
+
+        for c in self.get_chunks():
+            yield json.dumps(d.decode(c))[1:-1].encode()
+
+        yield json.dumps(d.decode(b"", True))[1:-1].encode() + b'"'
+
+
+class StreamData:
+    """Request data encoded while it's sent.
+
+    The instance can be iterated more than once, so the request can be
+    retried.
+    """
+
+    def __init__(self, data: dict, method: str = "none"):
+        """Initialize the instance.
+
+        :param data: Request data. Its values can be `FileText` instances.
+        :param method: Compression method ("none", "gzip" or "deflate").
+        """
+        self.data = data
+        self.method = method
+
+    def encode(self) -> Iterator[bytes]:
+        """Encode the data as JSON, in chunks.
+
+        :returns: Iterator of chunks.
+        """
+        for i, (k, v) in enumerate(self.data.items()):
+            p = "{" if i == 0 else ", "
+            yield f"{p}{json.dumps(k)}: ".encode()
+
+            if isinstance(v, FileText):
+                yield from v.encode()
+            else:
+                yield json.dumps(v, allow_nan=False).encode()
+
+        yield b"}" if len(self.data) > 0 else b"{}"
+
+    def __iter__(self) -> Iterator[bytes]:
+        """Encode the data as JSON, and compress it, in chunks.
+
+        :returns: Iterator of chunks.
+        """
+        if self.method == "none":
+            yield from self.encode()
+            return
+
+        # The "wbits" value selects the gzip or the zlib (deflate) format
+        z = zlib.compressobj(wbits=31 if self.method == "gzip" else 15)
+
+        for c in self.encode():
+            c = z.compress(c)
+
+            if c:
+                yield c
+
+        yield z.flush()
+
+
+def encode_data(data: dict) -> tuple[Any, dict[str, str]]:
+    """Encode the JSON data of a request.
+
+    The data is compressed if it's at least as large as the threshold, using
+    the compression settings ("compress" and "compress_min_size"). If any
+    value of the data is a `FileText` instance, the encoded data is a
+    `StreamData` instance instead of bytes.
+
+    :param data: Request data.
+    :returns: Tuple containing the encoded data and its headers.
+    """
+    headers = {"Content-Type": "application/json"}
+    method = settings.get(compress, def_compress)
+    size = int(settings.get(compress_min_size, def_compress_min_size))
+
+    files = [v for v in data.values() if isinstance(v, FileText)]
+
+    if len(files) > 0:
+        if sum(f.get_size() for f in files) < size:
+            method = "none"
+
+        if method != "none":
+            headers["Content-Encoding"] = method
+
+        return StreamData(data, method), headers
+
+    body = json.dumps(data, allow_nan=False).encode()
+
+    if method == "none" or len(body) < size:
+        return body, headers
+
+    if method == "gzip":
+        body = gzip.compress(body, mtime=0)
+    else:
+        body = zlib.compress(body)
+
+    headers["Content-Encoding"] = method
+    return body, headers
+
+
+def get_timings() -> tuple[float, float]:
+    """Get the timings of the last request made by the current thread.
+
+    :returns: Tuple containing the time waited for the limiters and the time
+    spent opening a new connection (0 if an open connection was reused), in
+    seconds.
+    """
+    return getattr(_local, "wait", 0.0), getattr(_local, "connect", 0.0)
+
+
+def get_endpoint(method: str, url: str) -> str:
+    """Get the endpoint of a request, without its parameter.
+
+    The endpoint is the method and the two segments of the URL path before
+    the last one, which is the parameter of most of the API endpoints (e.g.
+    "PUT /notes/note" for a note update). It's only used to group the
+    requests with similar latencies.
+
+    :param method: Request method.
+    :param url: Request URL.
+    :returns: Endpoint.
+    """
+    path = urlsplit(url).path.strip("/").split("/")
+    return f"{method} /{'/'.join(path[-3:-1])}"
+
+
+def send(method: str, url: str, **kwargs) -> Response:
+    """Make a HTTP request through the shared session and limiters.
+
+    :param method: Request method.
+    :param url: Request URL.
+    :param kwargs: Other arguments of the `requests.Session.request` method.
+    :returns: Request response.
+    """
+    global _request_count
+
+    wait = time.perf_counter()
+    _local.connect = 0.0
+    bucket, limiter = get_limiters()
+
+    if bucket is not None:
+        bucket.acquire()
+
+    if limiter is not None:
+        limiter.acquire()
+
+    start = time.perf_counter()
+    _local.wait = start - wait
+
+    with _lock:
+        _request_count += 1
+
+    if limiter is None:
+        return get_session().request(method, url, **kwargs)
+
+    overloaded = True
+    endpoint = get_endpoint(method, url)
+
+    try:
+        r = get_session().request(method, url, **kwargs)
+        overloaded = r.status_code in overload_codes
+
+        return r
+    finally:
+        limiter.release(overloaded, time.perf_counter() - start, endpoint)
+
+
+def close_session():
+    """Close the shared session of the process and its connections."""
+    global _session
+
+    with _lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def reset():
+    """Close the shared session and discard the limiters and the retry policy.
+
+    They are created again, with the current settings, the next time that
+    they are needed.
+    """
+    global _bucket, _limiter, _retry_policy
+
+    close_session()
+
+    with _lock:
+        _bucket = None
+        _limiter = None
+        _retry_policy = None
+
+
+atexit.register(close_session)
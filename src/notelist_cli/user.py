@@ -1,11 +1,15 @@
 """User module."""
 
 import sys
+from datetime import datetime
 from typing import Optional
 
-from click import group, option, echo
+from click import group, option, echo, Choice, DateTime
 
+from notelist_cli import cache, output
 from notelist_cli.auth import get_user_id, request, check_response
+from notelist_cli.models import User
+from notelist_cli.output import print_record, user_fields
 
 
 # Endpoints
@@ -34,11 +38,18 @@ def get():
         r = request("GET", ep, True)
         check_response(r)
 
-        res = r.json().get("result")
+        res = r.result
 
         if res is None:
             raise Exception("Data not received.")
 
+        res = User(res)
+        cache.put("user", res)
+
+        if output.fmt != "table":
+            print_record(res, user_fields)
+            return
+
         # User data
         _id = res["id"]
         username = res["username"]
@@ -68,13 +79,20 @@ def get():
 
 def put_user(
     password: Optional[str] = None, name: Optional[str] = None,
-    email: Optional[str] = None
+    email: Optional[str] = None, since: Optional[datetime] = None,
+    on_conflict: Optional[str] = None, use_cache: bool = False
 ):
     """Update a user.
 
     :param password: Password.
     :param name: Name.
     :param email: E-mail.
+    :param since: If it's not `None`, the update is cancelled if the user has
+    been modified after this date-time.
+    :param on_conflict: If it's not `None`, conflict strategy ("fail" or
+    "merge") to use if the user has been modified since the last version seen.
+    :param use_cache: Whether to use the cached user as the current data of
+    the user or not.
     """
     data = {}
 
@@ -95,12 +113,9 @@ def put_user(
         _id = get_user_id()
         ep = f"{user_ep}/{_id}"
 
-        r = request("GET", ep, True)
-        check_response(r)
-        user = r.json().get("result")
-
-        if user is None:
-            raise Exception("Data not received.")
+        user = cache.fetch_for_update(
+            "user", _id, since, on_conflict, data, use_cache
+        )
 
         # Prepare new data
         for k in ("name", "email"):
@@ -118,9 +133,10 @@ def put_user(
 
         # Update user
         r = request("PUT", ep, True, data)
+        cache.delete("user", _id)
         check_response(r)
 
-        m = r.json().get("message")
+        m = r.message
 
         if m is not None:
             echo(m)
@@ -131,9 +147,25 @@ def put_user(
 @user.command()
 @option("--name", help=des_name)
 @option("--email", help=des_email)
-def update(name: Optional[str], email: Optional[str]):
+@option(
+    "--ifunmodsince", type=DateTime(cache.since_formats),
+    help=cache.des_if_unmod_since
+)
+@option(
+    "--onconflict", type=Choice(cache.conflict_strategies),
+    help=cache.des_on_conflict
+)
+@option("--usecache", is_flag=True, help=cache.des_use_cache)
+def update(
+    name: Optional[str], email: Optional[str],
+    ifunmodsince: Optional[datetime], onconflict: Optional[str],
+    usecache: bool
+):
     """Update user."""
-    put_user(name=name, email=email)
+    put_user(
+        name=name, email=email, since=ifunmodsince, on_conflict=onconflict,
+        use_cache=usecache
+    )
 
 
 @user.command()
@@ -0,0 +1,59 @@
+"""Workers module.
+
+Functions to run many API requests concurrently over the shared session of the
+transport module.
+"""
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+
+# Default values
+def_workers = 8
+
+
+def _get_result(
+    item: Any, future: Future
+) -> tuple[Any, Any, Optional[Exception]]:
+    """Wait for a task and get its result.
+
+    :param item: Task item.
+    :param future: Task future.
+    :returns: Tuple containing the item, the result (or `None` if there was an
+    error) and the error (or `None` if there wasn't any error).
+    """
+    try:
+        return item, future.result(), None
+    except Exception as e:
+        return item, None, e
+
+
+def imap(
+    func: Callable[[Any], Any], items: Iterable, workers: int = def_workers
+) -> Iterator[tuple[Any, Any, Optional[Exception]]]:
+    """Apply a function to each item of an iterable concurrently.
+
+    The items are consumed lazily and only a bounded number of tasks (twice the
+    number of workers) are pending at any time, so the memory used doesn't
+    depend on the number of items. The results are yielded in the same order
+    as the items.
+
+    :param func: Function to apply to each item.
+    :param items: Items.
+    :param workers: Maximum number of threads.
+    :returns: Iterator of tuples containing each item, its result (or `None`
+    if there was an error) and its error (or `None` if there wasn't any error).
+    """
+    workers = max(workers, 1)
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        for i in items:
+            pending.append((i, ex.submit(func, i)))
+
+            if len(pending) >= workers * 2:
+                yield _get_result(*pending.popleft())
+
+        while len(pending) > 0:
+            yield _get_result(*pending.popleft())